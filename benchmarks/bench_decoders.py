@@ -0,0 +1,55 @@
+"""
+Micro-benchmark: ast.literal_eval vs lib.decoders on recorded API payloads.
+
+Run from the project directory:
+    python -m benchmarks.bench_decoders
+"""
+import ast
+import timeit
+from pathlib import Path
+from lib import decoders
+from lib.exmo import cripto_pair
+
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text()
+
+
+def best_of(func, number: int, repeat: int = 5) -> float:
+    """
+    :return: best time of one call, in microseconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    exmo = read_fixture("exmo_ticker.json")
+    privat = read_fixture("privat_coursid_5.json")
+    forecast = read_fixture("openweather_forecast.json")
+
+    cases = [
+        ("exmo ticker", exmo, 200,
+         lambda: ast.literal_eval(exmo),
+         lambda: decoders.decode_exmo_ticker(exmo, cripto_pair)),
+        ("privat rates", privat, 5000,
+         lambda: ast.literal_eval(privat),
+         lambda: decoders.decode_privat_rates(privat)),
+        ("weather forecast", forecast, 500,
+         lambda: ast.literal_eval(forecast),
+         lambda: decoders.decode_forecast(forecast)),
+    ]
+
+    print(f"JSON backend: {'orjson' if decoders.orjson is not None else 'json'}")
+    print(f"{'payload':<18}{'size, KB':>10}{'baseline, us':>15}{'decoders, us':>15}{'speedup':>10}")
+    for name, payload, number, baseline, decoder in cases:
+        baseline_time = best_of(baseline, number)
+        decoder_time = best_of(decoder, number)
+        print(f"{name:<18}{len(payload) / 1024:>10.1f}{baseline_time:>15.1f}{decoder_time:>15.1f}"
+              f"{baseline_time / decoder_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
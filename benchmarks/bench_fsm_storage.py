@@ -0,0 +1,97 @@
+"""
+Benchmark: per-update overhead of SQLiteStorage (write-behind) vs aiogram MemoryStorage with paced updates,
+steady-state flush cost amortised per update, and check that conversations survive storage restart.
+
+Run from the project directory:
+    python -m benchmarks.bench_fsm_storage
+"""
+import asyncio
+import os
+import tempfile
+import time
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from lib.fsm_storage import SQLiteStorage
+from lib.metrics import get_histogram_summary
+
+CHATS = 50
+UPDATES = 20000
+# Updates come in bursts of CHATS, spread over DURATION seconds, so SQLiteStorage flushes every
+# FLUSH_INTERVAL as in the bot (about 10 flushes per run):
+DURATION = 2.0
+FLUSH_INTERVAL = 0.2
+
+
+async def conversation_step(storage, chat: int, step: int):
+    """
+    Storage calls of one update in the /weather conversation: state lookup, data update, state change
+    """
+    await storage.get_state(chat=chat, user=chat)
+    if step % 3 == 0:
+        await storage.set_state(chat=chat, user=chat, state="StatesWeather:question_of_date")
+    elif step % 3 == 1:
+        await storage.update_data(chat=chat, user=chat, data={"weather_date": "/tomorrow"})
+        await storage.set_state(chat=chat, user=chat, state="StatesWeather:query")
+    else:
+        await storage.get_data(chat=chat, user=chat)
+        await storage.reset_state(chat=chat, user=chat)
+
+
+async def measure(storage) -> dict:
+    """
+    :return: {'update_us': 11.2, 'cpu_us': 25.0, 'flush_ms': 1.4, 'flush_us_per_update': 0.7}
+             update_us - storage calls of one update in the handler,
+             cpu_us - process CPU per update including write-behind flushes in the executor,
+             flush_ms - average flush, flush_us_per_update - all flushes time amortised per update
+    """
+    pause = DURATION / (UPDATES / CHATS)
+    flush_before = get_histogram_summary("tbot_fsm_flush_duration_seconds")
+    handler_time = 0.0
+    cpu_started = time.process_time()
+    for step in range(UPDATES):
+        started = time.perf_counter()
+        await conversation_step(storage, step % CHATS, step // CHATS)
+        handler_time += time.perf_counter() - started
+        if step % CHATS == CHATS - 1:
+            # Event loop is free between bursts, flush task runs here:
+            await asyncio.sleep(pause)
+    await storage.close()
+    await storage.wait_closed()
+    cpu_time = time.process_time() - cpu_started
+    flush_after = get_histogram_summary("tbot_fsm_flush_duration_seconds")
+    flushes = (flush_after[0]["count"] if flush_after else 0) - (flush_before[0]["count"] if flush_before else 0)
+    flush_total = ((flush_after[0]["avg"] * flush_after[0]["count"]) if flush_after else 0.0) - \
+        ((flush_before[0]["avg"] * flush_before[0]["count"]) if flush_before else 0.0)
+    return {"update_us": handler_time / UPDATES * 1e6,
+            "cpu_us": cpu_time / UPDATES * 1e6,
+            "flush_ms": flush_total / flushes * 1000 if flushes else 0.0,
+            "flush_us_per_update": flush_total / UPDATES * 1e6}
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "fsm.sqlite3")
+        print(f"{UPDATES} updates of {CHATS} chats in {DURATION}s, flush interval {FLUSH_INTERVAL}s")
+        print(f"{'storage':<15}{'update, us':>12}{'cpu, us':>10}{'flush, ms':>11}{'flush/update, us':>18}")
+        sqlite = SQLiteStorage(path, flush_interval=FLUSH_INTERVAL)
+        for name, storage in (("MemoryStorage", MemoryStorage()), ("SQLiteStorage", sqlite)):
+            result = await measure(storage)
+            print(f"{name:<15}{result['update_us']:>12.1f}{result['cpu_us']:>10.1f}{result['flush_ms']:>11.2f}"
+                  f"{result['flush_us_per_update']:>18.2f}")
+        print(f"SQLiteStorage stats: {sqlite.get_stats()}")
+
+        # Restart in the middle of conversation:
+        storage = SQLiteStorage(path)
+        await storage.update_data(chat=1, user=1, data={"weather_date": "/today"})
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        await storage.close()
+        await storage.wait_closed()
+        restarted = SQLiteStorage(path)
+        state = await restarted.get_state(chat=1, user=1)
+        data = await restarted.get_data(chat=1, user=1)
+        print(f"after restart: state={state!r}, data={data}")
+        await restarted.close()
+        await restarted.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
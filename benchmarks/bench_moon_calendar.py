@@ -0,0 +1,99 @@
+"""
+Benchmark: "pil" moon calendar renderer vs "pdf" (reportlab -> PDF -> poppler -> PNG) pipeline,
+a burst of concurrent mixed-month requests which has to render every distinct month only once,
+and cold/warm month renders with the grid skeleton cache.
+
+Run from the project directory:
+    python -m benchmarks.bench_moon_calendar
+"""
+import asyncio
+import datetime
+import random
+import tempfile
+import time
+from lib import moon_calendar
+from lib.assets import load_assets
+from lib.calendar_cache import configure_calendar_cache
+from lib.render_executor import start_render_executor, stop_render_executor
+
+
+MONTHS = [datetime.date(2024, month, 1) for month in range(1, 13)]
+
+
+def measure(render, out_dir: str) -> float:
+    """
+    :return: average time of one month render, in milliseconds
+    """
+    started = time.perf_counter()
+    for work_datetime in MONTHS:
+        render(work_datetime, f"{out_dir}/{work_datetime.year}_{work_datetime.month}.png", f"{out_dir}/calendar.pdf")
+    return (time.perf_counter() - started) / len(MONTHS) * 1000
+
+
+def main():
+    load_assets()
+    renderers = {
+        "pil": lambda work_datetime, png, pdf: moon_calendar.render_calendar_pil(work_datetime, png),
+        "pdf": moon_calendar.render_calendar,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name, render in renderers.items():
+            try:
+                results[name] = measure(render, out_dir)
+            except Exception as e:
+                print(f"{name:<5}unavailable: {e!r}")
+                continue
+            print(f"{name:<5}{results[name]:>10.1f} ms/month")
+    if len(results) == 2:
+        print(f"speedup: {results['pdf'] / results['pil']:.1f}x")
+    for renderer in results:
+        skeletons(renderer)
+        asyncio.run(burst(renderer))
+
+
+def skeletons(renderer: str):
+    """
+    Cold - skeleton cache is cleared before every month, warm - all 2024 layouts are in the cache
+    """
+    render = moon_calendar.render_calendar_pil if renderer == "pil" else moon_calendar.render_calendar
+    with tempfile.TemporaryDirectory() as out_dir:
+        def month_render(work_datetime, cold):
+            if cold:
+                moon_calendar.clear_calendar_skeletons()
+            started = time.perf_counter()
+            render(work_datetime, f"{out_dir}/calendar.png")
+            return time.perf_counter() - started
+
+        moon_calendar.clear_calendar_skeletons()
+        for work_datetime in MONTHS:
+            month_render(work_datetime, cold=False)
+        timings = {"cold": [month_render(work_datetime, cold=True) for work_datetime in MONTHS]}
+        for work_datetime in MONTHS:
+            month_render(work_datetime, cold=False)
+        timings["warm"] = [month_render(work_datetime, cold=False) for work_datetime in MONTHS]
+    cold, warm = (sum(timings[name]) / len(MONTHS) * 1000 for name in ("cold", "warm"))
+    print(f"{renderer:<5}skeletons: cold {cold:.1f} ms/month, warm {warm:.1f} ms/month (with PNG encode), "
+          f"{len(set(moon_calendar.month_layout(work_datetime) for work_datetime in MONTHS))} layouts in 2024")
+
+
+async def burst(renderer: str, requests: int = 60, months: int = 5):
+    """
+    Send requests for random months at once, all of them are cache misses at start
+    """
+    requested = [f"2024-{random.randint(1, months)}" for _ in range(requests)]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        configure_calendar_cache(cache_dir, max_size=months)
+        start_render_executor(workers=4, queue_size=requests)
+        before = moon_calendar.get_calendar_render_stats()
+        started = time.perf_counter()
+        paths = await asyncio.gather(*[moon_calendar.main(text, renderer=renderer) for text in requested])
+        elapsed = (time.perf_counter() - started) * 1000
+        await stop_render_executor()
+    renders = moon_calendar.get_calendar_render_stats()["renders"] - before["renders"]
+    print(f"{renderer:<5}burst: {requests} requests, {len(set(requested))} distinct months, "
+          f"{renders} renders, {len(set(paths))} files, {elapsed:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
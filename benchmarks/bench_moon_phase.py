@@ -0,0 +1,77 @@
+"""
+Benchmark: batched moon phase engines vs per-day moonphase(), with day-for-day comparison
+and accuracy report against the reference new/full moon times (fixtures/moon_phases_2024.json, UTC).
+
+Run from the project directory:
+    python -m benchmarks.bench_moon_phase
+"""
+import datetime
+import json
+import os
+import timeit
+from lib import moon_phase
+from lib.moon_calendar import moonphase
+
+REFERENCE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "moon_phases_2024.json")
+
+
+def per_day(start: datetime.date, end: datetime.date) -> list:
+    return [moonphase(start + datetime.timedelta(days=offset)) for offset in range((end - start).days)]
+
+
+def check_full_range():
+    """
+    Compare engines on the whole supported range 1700-01-01 ... 3099-12-31
+    """
+    start, end = datetime.date(1700, 1, 1), datetime.date(3100, 1, 1)
+    expected = per_day(start, end)
+    backends = {"python": lambda: moon_phase._conway_python(start, end)}
+    if moon_phase.numpy is not None:
+        backends["numpy"] = lambda: moon_phase._conway_numpy(start, end).tolist()
+    for backend, engine in backends.items():
+        result = engine()
+        mismatches = sum(1 for a, b in zip(expected, result) if a != b) + abs(len(expected) - len(result))
+        print(f"{backend:<7}{len(expected)} days compared, mismatches: {mismatches}")
+
+
+def check_accuracy():
+    """
+    Meeus engine error in minutes, Conway engine error in days (nearest day with age 0 / 15)
+    """
+    with open(REFERENCE_PATH) as f:
+        reference = [(datetime.datetime.strptime(moment, "%Y-%m-%d %H:%M"), kind) for moment, kind in json.load(f)]
+    start, end = datetime.date(2023, 12, 1), datetime.date(2025, 2, 1)
+    instants = moon_phase.new_full_moons(start, end)
+    conway = moon_phase.conway_phases(start, end)
+    meeus_errors, conway_errors = [], []
+    for moment, kind in reference:
+        nearest = min((abs((instant - moment).total_seconds()) for instant, instant_kind in instants
+                       if instant_kind == kind), default=float("inf"))
+        meeus_errors.append(nearest / 60)
+        age = 0 if kind == "new" else 15
+        days = [offset for offset, phase in enumerate(conway) if phase == age]
+        day = (moment.date() - start).days
+        conway_errors.append(min(abs(offset - day) for offset in days))
+    print(f"reference: {len(reference)} phases")
+    print(f"meeus  error, min: max {max(meeus_errors):.1f}, avg {sum(meeus_errors) / len(meeus_errors):.1f}")
+    print(f"conway error, days: max {max(conway_errors)}, wrong day {sum(1 for e in conway_errors if e)}")
+
+
+def main():
+    check_full_range()
+    check_accuracy()
+    spans = {"month": (datetime.date(2024, 6, 1), datetime.date(2024, 7, 1)),
+             "year": (datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))}
+    print(f"{'span':<8}{'per-day, us':>14}{'batched, us':>14}{'meeus, us':>14}{'illum., us':>14}")
+    for name, (start, end) in spans.items():
+        number = 200
+        timings = [min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6 for func in
+                   (lambda: per_day(start, end),
+                    lambda: moon_phase.conway_phases(start, end),
+                    lambda: moon_phase.meeus_phases(start, end),
+                    lambda: moon_phase.illumination(start, end))]
+        print(f"{name:<8}" + "".join(f"{timing:>14.1f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Local stand-ins for Telegram Bot API (getUpdates/sendMessage/sendPhoto/...), Privatbank, Exmo and OpenWeather.
+Every service has configurable latency, error rate and payload size. Responses are recorded fixtures.
+
+Standalone run, then put printed "api_server" and "upstream_overrides" into the config of the bot:
+    python -m benchmarks.fake_servers --port 9000 --latency exmo=0.3 --error-rate privat=0.05
+
+benchmarks/loadtest.py starts them together with the update replay.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+from aiohttp import web
+
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+SERVICES = ("telegram", "privat", "exmo", "openweather")
+FAKE_TOKEN = "123456:FAKE-load-test-token"
+
+
+class FakeService:
+    """
+    Behaviour of one stand-in
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, payload_scale: int = 1):
+        """
+        :param latency: 0.2 | seconds before the response
+        :param jitter: 0.05 | random extra seconds, 0..jitter
+        :param error_rate: 0.05 | part of requests answered with HTTP 500
+        :param payload_scale: 10 | response is made N times bigger with extra records
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_scale = payload_scale
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self) -> bool:
+        """
+        :return: False - request has to be failed
+        """
+        self.requests += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            return False
+        return True
+
+
+def _read_fixture(name: str):
+    return json.loads((FIXTURES_DIR / name).read_text())
+
+
+def _privat_payload(coursid: str, scale: int) -> str:
+    rates = _read_fixture(f"privat_coursid_{coursid}.json")
+    rates += [{"ccy": f"X{index:02d}", "base_ccy": "UAH", "buy": "1.00000", "sale": "1.10000"}
+              for index in range(len(rates) * (scale - 1))]
+    return json.dumps(rates)
+
+
+def _exmo_payload(scale: int) -> str:
+    ticker = _read_fixture("exmo_ticker.json")
+    original = list(ticker.items())
+    for copy_index in range(1, scale):
+        ticker.update((f"{pair}{copy_index}", data) for pair, data in original)
+    return json.dumps(ticker)
+
+
+def _forecast_payload(scale: int) -> str:
+    forecast = _read_fixture("openweather_forecast.json")
+    # Recorded forecast is moved to today, /today and /tomorrow answers have data:
+    recorded_day = datetime.date.fromtimestamp(forecast["list"][0]["dt"])
+    offset = int((datetime.date.today() - recorded_day).total_seconds())
+    for record in forecast["list"]:
+        record["dt"] += offset
+    forecast["list"] *= scale
+    forecast["cnt"] = len(forecast["list"])
+    return json.dumps(forecast)
+
+
+class FakeTelegram:
+    """
+    Bot API stand-in: updates are put by the replay, bot requests are recorded per chat
+    """
+
+    def __init__(self, service: FakeService):
+        self.service = service
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        # Chat id -> queue of (method, receive time) of bot requests to this chat:
+        self.replies: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.methods: Dict[str, int] = defaultdict(int)
+
+    def put_message(self, chat_id: int, text: Optional[str] = None, location: Optional[Dict[str, float]] = None):
+        """
+        Send message from the fake user to the bot
+        :param text: '/start'
+        :param location: {'latitude': 50.45, 'longitude': 30.52}
+        """
+        update_id = next(self._update_ids)
+        user = {"id": chat_id, "is_bot": False, "first_name": "Load", "username": f"load_{chat_id}"}
+        message = {"message_id": update_id,
+                   "from": user,
+                   "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+                   "date": int(time.time())}
+        if location is not None:
+            message["location"] = location
+        else:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self._updates.append({"update_id": update_id, "message": message})
+        self._new_updates.set()
+
+    async def _get_updates(self, params) -> list:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _message(self, chat_id: int, **content) -> dict:
+        return {"message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                **content}
+
+    def _photo(self, chat_id: int) -> dict:
+        file_id = f"fake-photo-{next(self._message_ids)}"
+        return self._message(chat_id, photo=[{"file_id": file_id, "file_unique_id": file_id, "width": 960,
+                                              "height": 640}])
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post() if request.body_exists else {}
+        if method.lower() == "getupdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+
+        self.methods[method] += 1
+        if not await self.service.delay():
+            return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"},
+                                     status=500)
+        chat_id = int(params["chat_id"]) if params.get("chat_id") else None
+        method_name = method.lower()
+        if method_name == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        elif chat_id is None:
+            result = True
+        elif method_name == "sendphoto":
+            result = self._photo(chat_id)
+        elif method_name == "sendmediagroup":
+            result = [self._photo(chat_id) for _ in json.loads(params["media"])]
+        elif method_name == "senddocument":
+            result = self._message(chat_id, document={"file_id": "fake-document", "file_unique_id": "fake-document"})
+        else:
+            result = self._message(chat_id, text=params.get("text", ""))
+        if chat_id is not None:
+            self.replies[chat_id].put_nowait((method, time.monotonic()))
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_app(services: Dict[str, FakeService]) -> web.Application:
+    """
+    :param services: {'telegram': FakeService(), 'privat': FakeService(latency=0.2), ...}
+    :return: application, its FakeTelegram is app["telegram"]
+    """
+    telegram = FakeTelegram(services["telegram"])
+    payloads = {"privat_5": _privat_payload("5", services["privat"].payload_scale),
+                "privat_11": _privat_payload("11", services["privat"].payload_scale),
+                "exmo": _exmo_payload(services["exmo"].payload_scale),
+                "weather": json.dumps(_read_fixture("openweather_weather.json")),
+                "forecast": _forecast_payload(services["openweather"].payload_scale)}
+
+    def upstream(service: str, payload):
+        async def handler(request: web.Request) -> web.Response:
+            if not await services[service].delay():
+                return web.Response(status=500, text="fake error")
+            return web.Response(text=payloads[payload(request)], content_type="application/json")
+        return handler
+
+    async def public_ip(request: web.Request) -> web.Response:
+        return web.Response(text="127.0.0.1")
+
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app["telegram"] = telegram
+    app["services"] = services
+    app.router.add_route("*", "/bot{token}/{method}", telegram.handle)
+    app.router.add_get("/privat/p24api/pubinfo",
+                       upstream("privat", lambda request: f"privat_{request.query.get('coursid', '5')}"))
+    app.router.add_get("/exmo/v1.1/ticker", upstream("exmo", lambda request: "exmo"))
+    app.router.add_get("/openweather/data/2.5/{kind}",
+                       upstream("openweather", lambda request: request.match_info["kind"]))
+    app.router.add_get("/ip/", public_ip)
+    return app
+
+
+def bot_config(base_url: str) -> dict:
+    """
+    :param base_url: 'http://127.0.0.1:9000'
+    :return: {'api_server': ..., 'upstream_overrides': {...}} | keys of data.yaml
+    """
+    return {"api_server": base_url,
+            "upstream_overrides": {"https://api.privatbank.ua/": f"{base_url}/privat/",
+                                   "https://api.exmo.com/": f"{base_url}/exmo/",
+                                   "http://api.openweathermap.org/": f"{base_url}/openweather/",
+                                   "https://api.ipify.org/": f"{base_url}/ip/",
+                                   "https://ident.me/": f"{base_url}/ip/"}}
+
+
+def parse_service_values(values: Optional[List[str]], cast=float) -> Dict[str, float]:
+    """
+    :param values: ['exmo=0.3', 'privat=0.1'] | ['0.1'] - for all services
+    :return: {'exmo': 0.3, 'privat': 0.1}
+    """
+    result = {}
+    for value in values or []:
+        if "=" in value:
+            service, value = value.split("=", 1)
+            if service not in SERVICES:
+                raise ValueError(f"unknown service '{service}', one of {', '.join(SERVICES)}")
+            result[service] = cast(value)
+        else:
+            result.update((service, cast(value)) for service in SERVICES)
+    return result
+
+
+def add_service_arguments(parser: argparse.ArgumentParser):
+    help_suffix = "SERVICE=VALUE or VALUE for all services, can be repeated"
+    parser.add_argument("--latency", action="append", help=f"seconds, {help_suffix}")
+    parser.add_argument("--jitter", action="append", help=f"random extra seconds, {help_suffix}")
+    parser.add_argument("--error-rate", action="append", help=f"0.05 - 5%% of HTTP 500, {help_suffix}")
+    parser.add_argument("--payload-scale", action="append", help=f"N times bigger responses, {help_suffix}")
+
+
+def services_from_arguments(args: argparse.Namespace) -> Dict[str, FakeService]:
+    latency = parse_service_values(args.latency)
+    jitter = parse_service_values(args.jitter)
+    error_rate = parse_service_values(args.error_rate)
+    payload_scale = parse_service_values(args.payload_scale, cast=int)
+    return {service: FakeService(latency=latency.get(service, 0.0),
+                                 jitter=jitter.get(service, 0.0),
+                                 error_rate=error_rate.get(service, 0.0),
+                                 payload_scale=payload_scale.get(service, 1))
+            for service in SERVICES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    add_service_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(bot_config(f"http://{args.host}:{args.port}"), indent=2))
+    print(f"token for the config: {FAKE_TOKEN}")
+    web.run_app(make_app(services_from_arguments(args)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+End-to-end load test: the real dispatcher from main.py talks to local fake servers (benchmarks/fake_servers.py),
+synthetic conversations from many fake chats are replayed through fake getUpdates in stages with growing
+chat count. Report has throughput, per-command latency percentiles and the saturation point.
+
+Latency of a step is the time from the update being available in getUpdates to the last expected
+bot request for that chat (sendMessage/sendPhoto/...). Fake servers and the replay run in a separate
+process, they don't take CPU time of the bot event loop.
+
+Run from the project directory:
+    python -m benchmarks.loadtest --stages 1,2,4,8,16,32 --stage-seconds 20 --output loadtest.json
+    python -m benchmarks.loadtest --latency openweather=0.3 --error-rate exmo=0.05 --scenario /privat --scenario /exmo
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+import yaml
+from aiohttp import web
+from benchmarks.fake_servers import FAKE_TOKEN, FakeTelegram, add_service_arguments, bot_config, make_app, \
+    services_from_arguments
+
+
+FIRST_CHAT_ID = 100000
+KYIV = {"latitude": 50.4501, "longitude": 30.5234}
+# Throughput growth which is still counted as scaling, smaller growth (or timeouts) means saturation:
+SCALING_GROWTH = 0.1
+SATURATION_TIMEOUTS = 0.01
+
+# Scenario -> steps (label, message for the bot, expected bot requests to the chat):
+Step = Tuple[str, Callable[[random.Random], dict], int]
+SCENARIOS: Dict[str, List[Step]] = {
+    "/start": [("/start", lambda rng: {"text": "/start"}, 2)],
+    "/privat": [("/privat", lambda rng: {"text": "/privat"}, 1)],
+    "/exmo": [("/exmo", lambda rng: {"text": "/exmo"}, 1)],
+    "/weather now": [("/weather", lambda rng: {"text": "/weather"}, 1),
+                     ("/weather /now", lambda rng: {"text": "/now"}, 1),
+                     ("/weather location", lambda rng: {"location": KYIV}, 1)],
+    "/weather forecast": [("/weather", lambda rng: {"text": "/weather"}, 1),
+                          ("/weather /tomorrow", lambda rng: {"text": "/tomorrow"}, 1),
+                          ("/weather location", lambda rng: {"location": KYIV}, 1)],
+    # 24 distinct months: renders first, calendar cache hits later:
+    "/moon_calendar": [("/moon_calendar", lambda rng: {"text": "/moon_calendar"}, 1),
+                       ("/moon_calendar month",
+                        lambda rng: {"text": f"{rng.choice((2024, 2025))}-{rng.randint(1, 12)}"}, 1)],
+    "/bot /info": [("/bot", lambda rng: {"text": "/bot"}, 1),
+                   ("/bot /info", lambda rng: {"text": "/info"}, 1)],
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    :param values: sorted values
+    :param q: 0.95
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """
+    :return: {'p50_ms': 120.0, 'p95_ms': 400.0, 'p99_ms': 900.0, 'max_ms': 1200.0, 'mean_ms': 150.0}
+    """
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {"p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "mean_ms": statistics.mean(latencies) if latencies else 0.0}
+
+
+async def replay_step(telegram: FakeTelegram, chat_id: int, message: dict, expected: int,
+                      timeout: float) -> Optional[float]:
+    """
+    :return: 0.35 | seconds to the last expected bot request | None - timeout
+    """
+    replies = telegram.replies[chat_id]
+    # Late replies of the previous (timed out) step:
+    while not replies.empty():
+        replies.get_nowait()
+    started_at = time.monotonic()
+    telegram.put_message(chat_id, **message)
+    received_at = started_at
+    try:
+        for _ in range(expected):
+            _, received_at = await asyncio.wait_for(replies.get(), timeout - (time.monotonic() - started_at))
+    except asyncio.TimeoutError:
+        return None
+    return received_at - started_at
+
+
+async def run_stage(telegram: FakeTelegram, chat_ids: List[int], scenarios: List[str], seconds: float,
+                    step_timeout: float) -> dict:
+    """
+    Every chat repeats random scenarios until the stage ends, steps of one chat are sequential like a real user
+    """
+    records: List[Tuple[str, Optional[float]]] = []
+    started_at = time.monotonic()
+    deadline = started_at + seconds
+
+    async def chat(chat_id: int):
+        rng = random.Random(chat_id)
+        while time.monotonic() < deadline:
+            for label, message, expected in SCENARIOS[rng.choice(scenarios)]:
+                latency = await replay_step(telegram, chat_id, message(rng), expected, step_timeout)
+                records.append((label, latency))
+                if latency is None:
+                    break
+
+    await asyncio.gather(*(chat(chat_id) for chat_id in chat_ids))
+    elapsed = time.monotonic() - started_at
+
+    by_label: Dict[str, List[Optional[float]]] = defaultdict(list)
+    for label, latency in records:
+        by_label[label].append(latency)
+    done = [latency for _, latency in records if latency is not None]
+    return {"chats": len(chat_ids),
+            "seconds": elapsed,
+            "steps": len(done),
+            "timeouts": len(records) - len(done),
+            "throughput": len(done) / elapsed,
+            **latency_summary(done),
+            "commands": {label: {"count": sum(latency is not None for latency in latencies),
+                                 "timeouts": sum(latency is None for latency in latencies),
+                                 **latency_summary([latency for latency in latencies if latency is not None])}
+                         for label, latencies in sorted(by_label.items())}}
+
+
+def find_saturation(stages: List[dict]) -> Optional[dict]:
+    """
+    :return: {'chats': 16, 'throughput': 40.2, 'reason': '...'} | None - throughput was growing till the last stage
+    """
+    for previous, stage in zip(stages, stages[1:]):
+        timeouts = stage["timeouts"] / max(1, stage["steps"] + stage["timeouts"])
+        growth = stage["throughput"] / previous["throughput"] - 1 if previous["throughput"] else 0
+        if timeouts > SATURATION_TIMEOUTS:
+            reason = f"{timeouts:.1%} of steps timed out with {stage['chats']} chats"
+        elif growth < SCALING_GROWTH:
+            reason = f"throughput grew {growth:+.0%} from {previous['chats']} to {stage['chats']} chats, " \
+                     f"p95 {previous['p95_ms']:.0f}ms -> {stage['p95_ms']:.0f}ms"
+        else:
+            continue
+        return {"chats": previous["chats"], "throughput": previous["throughput"], "reason": reason}
+    return None
+
+
+def print_stage(stage: dict):
+    print(f"{stage['chats']:>5} chats {stage['throughput']:>8.1f} steps/s  p50 {stage['p50_ms']:>7.0f}ms  "
+          f"p95 {stage['p95_ms']:>7.0f}ms  p99 {stage['p99_ms']:>7.0f}ms  timeouts {stage['timeouts']}")
+    for label, command in stage["commands"].items():
+        print(f"      {label:<24}{command['count']:>6}  p50 {command['p50_ms']:>7.0f}ms  "
+              f"p95 {command['p95_ms']:>7.0f}ms  p99 {command['p99_ms']:>7.0f}ms  timeouts {command['timeouts']}")
+
+
+async def drive(options: dict, reports: multiprocessing.Queue, bot_stopped: multiprocessing.Event):
+    services = services_from_arguments(argparse.Namespace(**options))
+    app = make_app(services)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, options["host"], options["port"])
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    reports.put({"ready": f"http://{options['host']}:{port}"})
+
+    telegram: FakeTelegram = app["telegram"]
+    # Startup of the bot: admin notifications, prefetch, pre-render:
+    await asyncio.sleep(options["warmup"])
+    chat_ids = [FIRST_CHAT_ID + index for index in range(max(options["stages"]))]
+    stages = []
+    for chats in options["stages"]:
+        stage = await run_stage(telegram, chat_ids[:chats], options["scenarios"], options["stage_seconds"],
+                                options["step_timeout"])
+        stages.append(stage)
+        print_stage(stage)
+    reports.put({"report": {"stages": stages,
+                            "saturation": find_saturation(stages),
+                            "services": {name: {"requests": service.requests, "errors": service.errors}
+                                         for name, service in services.items()},
+                            "telegram_methods": dict(telegram.methods)}})
+    # Fake services are kept until the bot is stopped, its background tasks still use them:
+    await asyncio.get_event_loop().run_in_executor(None, bot_stopped.wait, 60)
+    await runner.cleanup()
+
+
+def run_driver(options: dict, reports: multiprocessing.Queue, bot_stopped: multiprocessing.Event):
+    asyncio.run(drive(options, reports, bot_stopped))
+
+
+def write_bot_config(options: dict, base_url: str, work_dir: str) -> str:
+    """
+    Config of the bot under test: the project config with fake services, fake admins and temporary files
+    :return: path of the written config
+    """
+    with open(options["config"]) as config_file:
+        config = yaml.safe_load(config_file)
+    config.update(bot_config(base_url))
+    config.update(api_telegram_token=FAKE_TOKEN,
+                  api_openweather="fake",
+                  mode="polling",
+                  admins_ids=[{f"load_{index}": FIRST_CHAT_ID + index} for index in range(max(options["stages"]))])
+    config["access"] = {**config.get("access", {}), "rate": options["user_rate"], "burst": options["user_rate"]}
+    # Port of the real bot can be busy, lag metrics are still collected:
+    config["metrics"] = {**config.get("metrics", {}), "enabled": False}
+    config["fsm_storage"] = {**config.get("fsm_storage", {}), "path": os.path.join(work_dir, "fsm.sqlite3")}
+    config["file_id_cache"] = {**config.get("file_id_cache", {}), "path": os.path.join(work_dir, "file_ids.json")}
+    config["calendar_cache"] = {**config.get("calendar_cache", {}), "path": os.path.join(work_dir, "calendars")}
+    path = os.path.join(work_dir, "data.yaml")
+    with open(path, "w") as config_file:
+        yaml.safe_dump(config, config_file)
+    return path
+
+
+async def run_bot(bot_module, reports: multiprocessing.Queue, relax: float) -> dict:
+    from lib.hendlers import on_startup, on_shutdown
+    dp = bot_module.dp
+    await on_startup(dp)
+    polling = asyncio.ensure_future(dp.start_polling(relax=relax))
+    loop = asyncio.get_event_loop()
+    try:
+        message = await loop.run_in_executor(None, reports.get)
+    finally:
+        # Long getUpdates request isn't waited:
+        dp.stop_polling()
+        polling.cancel()
+        await dp.wait_closed()
+        await on_shutdown(dp)
+        # SQLite storage of on_startup(), executor closes it in the bot:
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        await (await dp.bot.get_session()).close()
+    return message["report"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="data.yaml", help="project config, services and admins are replaced")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="port of fake servers, 0 - any free")
+    parser.add_argument("--stages", default="1,2,4,8,16,32", help="fake chats in every stage")
+    parser.add_argument("--stage-seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5, help="seconds for bot startup before the first stage")
+    parser.add_argument("--step-timeout", type=float, default=30)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), dest="scenarios",
+                        help="run only these scenarios, can be repeated")
+    parser.add_argument("--user-rate", type=float, default=100, help="access throttling of one fake chat, updates/s")
+    parser.add_argument("--relax", type=float, default=0.1, help="pause between getUpdates requests, as in executor")
+    parser.add_argument("--output", help="write report JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logs of the bot")
+    add_service_arguments(parser)
+    args = parser.parse_args()
+    options = {**vars(args),
+               "stages": [int(chats) for chats in args.stages.split(",")],
+               "scenarios": args.scenarios or list(SCENARIOS)}
+
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    bot_stopped = context.Event()
+    driver = context.Process(target=run_driver, args=(options, reports, bot_stopped), daemon=True)
+    driver.start()
+    base_url = reports.get(timeout=60)["ready"]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ["TBOT_CONFIG"] = write_bot_config(options, base_url, work_dir)
+        # The bot is imported only now, main.py reads TBOT_CONFIG on import:
+        import main as bot_module
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        started_at = time.time()
+        try:
+            report = bot_module.loop.run_until_complete(run_bot(bot_module, reports, args.relax))
+        finally:
+            bot_stopped.set()
+    driver.join(timeout=10)
+
+    report = {"environment": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started_at)),
+                              "python": platform.python_version(),
+                              "platform": platform.platform(),
+                              "machine": platform.machine(),
+                              "cpus": os.cpu_count()},
+              "options": {key: value for key, value in options.items() if key not in ("output", "verbose")},
+              **report}
+    saturation = report["saturation"]
+    if saturation:
+        print(f"saturation: ~{saturation['throughput']:.1f} steps/s with {saturation['chats']} chats "
+              f"({saturation['reason']})")
+    else:
+        print("saturation: not reached, add stages with more chats")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"report is written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Offline benchmark suite for parse/format/render paths, driven by recorded API payloads from fixtures/.
+Results are written as JSON, so two commits can be compared:
+
+Run from the project directory:
+    python -m benchmarks.suite --output benchmarks/results/before.json
+    python -m benchmarks.suite --output benchmarks/results/after.json --compare benchmarks/results/before.json
+    python -m benchmarks.suite --compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from lib import decoders, moon_calendar
+from lib.assets import load_assets
+from lib.calendar_cache import configure_calendar_cache, clear_calendar_cache
+from lib.exmo import cripto_pair, parse_exmo_jsons, create_cryptocurrency_message, create_cryptocurrency_image
+from lib.privat import parse_privat_jsons, create_privat_currency_message, create_privat_image
+from lib.render_executor import start_render_executor, stop_render_executor
+from lib.weather import create_weather_message, time_split_weather_message
+
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+# Median slowdown which is reported as regression in compare mode:
+REGRESSION_THRESHOLD = 0.1
+
+# name -> (coroutine function of one call, calls):
+Case = Tuple[Callable[[], Awaitable], int]
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text()
+
+
+def shift_to_today(records: List[decoders.WeatherRecord]) -> List[decoders.WeatherRecord]:
+    """
+    Move recorded forecast to today, so /today and /tomorrow filters select the same records as on the recording day
+    """
+    recorded_day = datetime.date.fromtimestamp(records[0].dt)
+    offset = int((datetime.date.today() - recorded_day).total_seconds())
+    return [record._replace(dt=record.dt + offset) for record in records]
+
+
+async def build_cases(calendar_dir: str) -> Dict[str, Case]:
+    privat_raw = [{"status": 200, "result": read_fixture(name)}
+                  for name in ("privat_coursid_5.json", "privat_coursid_11.json")]
+    exmo_raw = {"status": 200, "result": read_fixture("exmo_ticker.json")}
+    weather_now = decoders.decode_weather(read_fixture("openweather_weather.json"))
+    forecast = shift_to_today(decoders.decode_forecast(read_fixture("openweather_forecast.json")))
+
+    privat_rates = await parse_privat_jsons(privat_raw)
+    exmo_prices = await parse_exmo_jsons(exmo_raw, cripto_pair)
+    privat_text = await create_privat_currency_message(privat_rates, text_for_image=True)
+    exmo_text = await create_cryptocurrency_message(exmo_prices, text_for_image=True)
+
+    async def moon_render():
+        # Empty cache, every call renders the month:
+        configure_calendar_cache(os.path.join(calendar_dir, "render"))
+        clear_calendar_cache()
+        moon_calendar.clear_calendar_skeletons()
+        await moon_calendar.main("2024-6")
+
+    async def moon_cached():
+        configure_calendar_cache(os.path.join(calendar_dir, "cached"))
+        await moon_calendar.main("2024-6")
+
+    return {
+        "parse_privat_jsons": (lambda: parse_privat_jsons(privat_raw), 2000),
+        "parse_exmo_jsons": (lambda: parse_exmo_jsons(exmo_raw, cripto_pair), 200),
+        "create_cryptocurrency_message": (lambda: create_cryptocurrency_message(exmo_prices), 5000),
+        "create_cryptocurrency_message_image": (
+            lambda: create_cryptocurrency_message(exmo_prices, text_for_image=True), 5000),
+        "create_weather_message_now": (lambda: create_weather_message(weather_now, "/now"), 2000),
+        "create_weather_message_tomorrow": (lambda: create_weather_message(forecast, "/tomorrow"), 500),
+        "time_split_weather_message": (lambda: time_split_weather_message(forecast, "/tomorrow"), 1000),
+        "create_privat_image": (lambda: create_privat_image(privat_text), 30),
+        "create_cryptocurrency_image": (lambda: create_cryptocurrency_image(exmo_text), 30),
+        "moon_calendar_main_render": (moon_render, 10),
+        "moon_calendar_main_cached": (moon_cached, 200),
+    }
+
+
+async def measure(call: Callable[[], Awaitable], number: int) -> Dict[str, float]:
+    """
+    :return: {'calls': 200, 'min_us': 10.1, 'median_us': 11.0, 'mean_us': 11.4, 'p95_us': 13.2, 'stdev_us': 0.9}
+    """
+    # Warm up: imports, fonts, skeletons, executor threads:
+    await call()
+    timings = []
+    for _ in range(number):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {"calls": number,
+            "min_us": timings[0],
+            "median_us": statistics.median(timings),
+            "mean_us": statistics.mean(timings),
+            "p95_us": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            "stdev_us": statistics.stdev(timings) if len(timings) > 1 else 0.0}
+
+
+def environment() -> Dict[str, Optional[str]]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "json_backend": "orjson" if decoders.orjson is not None else "json",
+            "phase_engine": moon_calendar.PHASE_ENGINE}
+
+
+async def run(names: Optional[List[str]], scale: float, render_mode: str) -> Dict[str, dict]:
+    load_assets()
+    results = {}
+    with tempfile.TemporaryDirectory() as calendar_dir:
+        cases = await build_cases(calendar_dir)
+        start_render_executor(mode=render_mode, workers=1)
+        try:
+            for name, (call, number) in cases.items():
+                if names and name not in names:
+                    continue
+                results[name] = await measure(call, max(1, int(number * scale)))
+                print(f"{name:<38}{results[name]['median_us']:>14.1f} us (p95 {results[name]['p95_us']:.1f})")
+        finally:
+            await stop_render_executor()
+    return {"environment": {**environment(), "render_mode": render_mode}, "results": results}
+
+
+def compare(base: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """
+    Print median change of every case
+    :return: ['create_privat_image', ...] cases which became slower than threshold
+    """
+    print(f"base {base['environment'].get('commit')} -> current {current['environment'].get('commit')}")
+    print(f"{'case':<38}{'base, us':>14}{'current, us':>14}{'change':>10}")
+    regressions = []
+    for name, result in current["results"].items():
+        base_result = base["results"].get(name)
+        if base_result is None:
+            print(f"{name:<38}{'-':>14}{result['median_us']:>14.1f}{'new':>10}")
+            continue
+        change = result["median_us"] / base_result["median_us"] - 1
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = " <- slower"
+        print(f"{name:<38}{base_result['median_us']:>14.1f}{result['median_us']:>14.1f}{change:>+9.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="with --compare: current results file instead of a new run")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--compare", metavar="BASE", help="results JSON of the base commit")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="median slowdown reported as regression, 0.1 - 10%%")
+    parser.add_argument("--case", action="append", help="run only this case, can be repeated")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of calls count, 0.1 for a quick run")
+    parser.add_argument("--render-mode", default="thread", choices=["thread", "process"])
+    args = parser.parse_args()
+
+    if args.compare and args.files:
+        current = json.loads(Path(args.files[0]).read_text())
+    else:
+        current = asyncio.run(run(args.case, args.scale, args.render_mode))
+        if args.output:
+            Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.output).write_text(json.dumps(current, indent=2))
+            print(f"results are written to {args.output}")
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text()), current, args.threshold)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Tuple, Union
+from PIL import Image, ImageFont
+from .calendar_cache import clear_calendar_cache
+
+
+# Assets locations, related to the project directory:
+TEMPLATES_DIR = "images/background_template"
+TEMPLATES = ("usd.png", "crypto.png", "moon_calendar_exp.png")
+CALENDAR_TEMPLATE = "moon_calendar_exp.png"
+FONT_PATH = "images/fonts/Spartan/static/Spartan-SemiBold.ttf"
+# Font sizes used by renderers:
+FONT_SIZES = (50, 60)
+MOON_DIR = "images/moon"
+MOON_PHASE_ICONS = {
+    "New moon after": "new_moon.png",
+    "Waxing crescent": "waxing_crescent_moon.png",
+    "First quarter": "first_quarter_moon.png",
+    "Waxing gibbous": "waxing_gibbous_moon.png",
+    "Full moon": "full_moon.png",
+    "Waning gibbous": "waning_gibbous_moon.png",
+    "Last quarter": "last_quarter_moon.png",
+    "Waning crescent": "waning_crescent_moon.png",
+    "New moon before": "new_moon.png",
+}
+
+# Decoded assets, see load_assets():
+_images: Dict[str, Image.Image] = {}
+_fonts: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+# File path -> modification time at load moment:
+_mtimes: Dict[str, float] = {}
+
+
+def _load_image(path: str) -> Image.Image:
+    image = Image.open(path)
+    image.load()
+    _images[path] = image
+    _mtimes[path] = os.path.getmtime(path)
+    return image
+
+
+def _load_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    font = ImageFont.truetype(path, size=size)
+    _fonts[(path, size)] = font
+    _mtimes[path] = os.path.getmtime(path)
+    return font
+
+
+def load_assets():
+    """
+    Decode all templates, fonts and moon icons once. Call it from the dispatcher startup hook.
+    """
+    for template in TEMPLATES:
+        _load_image(f"{TEMPLATES_DIR}/{template}")
+    for icon in set(MOON_PHASE_ICONS.values()):
+        _load_image(f"{MOON_DIR}/{icon}")
+    for size in FONT_SIZES:
+        _load_font(FONT_PATH, size)
+
+
+def get_template(name: str) -> Image.Image:
+    """
+    :param name: "usd.png"
+    :return: copy of decoded template, it can be changed by the caller
+    """
+    path = f"{TEMPLATES_DIR}/{name}"
+    image = _images.get(path) or _load_image(path)
+    return image.copy()
+
+
+def get_font(size: int, path: str = FONT_PATH) -> ImageFont.FreeTypeFont:
+    """
+    :param size: 60
+    :param path: "images/fonts/Spartan/static/Spartan-SemiBold.ttf"
+    :return: shared font object
+    """
+    return _fonts.get((path, size)) or _load_font(path, size)
+
+
+def get_moon_icon(phase_name: str) -> Image.Image:
+    """
+    :param phase_name: "Full moon"
+    :return: shared decoded icon, use it as read-only paste source
+    """
+    path = f"{MOON_DIR}/{MOON_PHASE_ICONS[phase_name]}"
+    return _images.get(path) or _load_image(path)
+
+
+def assets_memory_footprint() -> Dict[str, Union[int, Dict[str, int]]]:
+    """
+    Approximate memory used by decoded assets
+    :return: {'images': {'images/moon/full_moon.png': 36864, ...},
+              'fonts': {'images/fonts/.../Spartan-SemiBold.ttf:60': 76824, ...},
+              'total': 5214268}
+    """
+    images = {path: image.width * image.height * len(image.getbands()) for path, image in _images.items()}
+    # FreeType keeps font file in the memory for every size:
+    fonts = {f"{path}:{size}": os.path.getsize(path) for path, size in _fonts}
+    return {"images": images,
+            "fonts": fonts,
+            "total": sum(images.values()) + sum(fonts.values())}
+
+
+def _used_by_calendar(path: str) -> bool:
+    """
+    :param path: "images/moon/full_moon.png"
+    :return: True - moon calendar is drawn with this asset (template, moon icons, any font)
+    """
+    return path == f"{TEMPLATES_DIR}/{CALENDAR_TEMPLATE}" or path.startswith(f"{MOON_DIR}/") or \
+        any(font_path == path for font_path, _ in _fonts)
+
+
+def reload_changed_assets() -> List[str]:
+    """
+    Decode again assets which files were changed after load.
+    Calendar skeletons and rendered calendars are dropped when calendar assets are changed.
+
+    :return: ['images/background_template/usd.png', ...] | []
+    """
+    changed = [path for path, mtime in _mtimes.items()
+               if os.path.exists(path) and os.path.getmtime(path) != mtime]
+    for path in changed:
+        if path in _images:
+            _load_image(path)
+        for font_path, size in [key for key in _fonts if key[0] == path]:
+            _load_font(font_path, size)
+        logging.info(f"asset '{path}' was reloaded")
+    if any(_used_by_calendar(path) for path in changed):
+        # moon_calendar imports this module, so it's imported here:
+        from .moon_calendar import clear_calendar_skeletons
+        clear_calendar_skeletons()
+        removed = clear_calendar_cache()
+        logging.info(f"calendar assets were changed, skeletons and {removed} cached calendar(s) were dropped")
+    return changed
+
+
+async def watch_assets(interval: float = 60):
+    """
+    Endless loop for reload changed assets
+    :param interval: 60 | seconds between files checks
+    """
+    while True:
+        await asyncio.sleep(interval)
+        reload_changed_assets()
+
+
+__all__ = ["load_assets",
+           "get_template",
+           "get_font",
+           "get_moon_icon",
+           "assets_memory_footprint",
+           "reload_changed_assets",
+           "watch_assets"]
@@ -0,0 +1,144 @@
+import glob
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+from .help_functions import create_dir
+
+
+# Default cache params (can be overridden from data.yaml "calendar_cache" section):
+CALENDAR_CACHE_DIR = "images/out/calendars"
+CALENDAR_CACHE_MAX_SIZE = 48
+
+# Calendar key -> PNG file path, the oldest used calendar is first:
+_calendars: "OrderedDict[str, str]" = OrderedDict()
+_cache_dir = CALENDAR_CACHE_DIR
+_cache_max_size = CALENDAR_CACHE_MAX_SIZE
+_stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+
+def configure_calendar_cache(path: str = CALENDAR_CACHE_DIR, max_size: int = CALENDAR_CACHE_MAX_SIZE):
+    """
+    Index calendars rendered before restart. Call it from the dispatcher startup hook.
+
+    :param path: "images/out/calendars"
+    :param max_size: 48 | max count of PNG files in the directory
+    """
+    global _cache_dir, _cache_max_size
+    _cache_dir = path
+    _cache_max_size = max_size
+    create_dir(path)
+    _calendars.clear()
+    # Unfinished writes of the previous process:
+    for tmp_path in glob.glob(os.path.join(path, "*.tmp")):
+        os.remove(tmp_path)
+    for png_path in sorted(glob.glob(os.path.join(path, "*.png")), key=os.path.getmtime):
+        _calendars[os.path.basename(png_path)[:-len(".png")]] = png_path
+    _evict()
+
+
+def calendar_key(year: int, month: Optional[int], hemisphere: str, first_weekday: int, renderer: str, version: int,
+                 engine: str) -> str:
+    """
+    :param month: 6 | None - whole year mosaic
+    :return: '2024_06_north_w0_pil2_conway' | '2024_year_north_w0_pil2_conway'
+             every parameter which changes the picture is a part of the key
+    """
+    period = "year" if month is None else f"{month:02d}"
+    return f"{year}_{period}_{hemisphere}_w{first_weekday}_{renderer}{version}_{engine}"
+
+
+def get_cached_calendar(key: str) -> Optional[str]:
+    """
+    :param key: '2024_06_north_w0_pil2_conway'
+    :return: 'images/out/calendars/2024_06_north_w0_pil2_conway.png' | None
+    """
+    path = _calendars.get(key)
+    if path is None or not os.path.exists(path):
+        _calendars.pop(key, None)
+        _stats["misses"] += 1
+        return None
+    _calendars.move_to_end(key)
+    # Order survives restart, see configure_calendar_cache():
+    os.utime(path)
+    _stats["hits"] += 1
+    return path
+
+
+def is_calendar_cached(key: str) -> bool:
+    """
+    The same check as get_cached_calendar() but without touching LRU order and stats
+    """
+    return key in _calendars and os.path.exists(_calendars[key])
+
+
+def new_calendar_tmp_path(key: str) -> str:
+    """
+    Unique file for one render, it's moved into the cache by store_calendar()
+    :return: 'images/out/calendars/2024_06_north_w0_pil2_conway.3f2b9c....tmp'
+    """
+    create_dir(_cache_dir)
+    return os.path.join(_cache_dir, f"{key}.{uuid.uuid4().hex}.tmp")
+
+
+def store_calendar(key: str, tmp_path: str) -> str:
+    """
+    Atomically put rendered file into the cache, readers never see half-written PNG
+
+    :param key: '2024_06_north_w0_pil2_conway'
+    :param tmp_path: new_calendar_tmp_path() result with rendered PNG
+    :return: 'images/out/calendars/2024_06_north_w0_pil2_conway.png'
+    """
+    path = os.path.join(_cache_dir, f"{key}.png")
+    os.replace(tmp_path, path)
+    _calendars[key] = path
+    _calendars.move_to_end(key)
+    _evict(keep=key)
+    return path
+
+
+def _evict(keep: Optional[str] = None):
+    """
+    :param keep: '2024_06_north_w0_pil2_conway' | just stored calendar, it stays even with max_size=0
+    """
+    while len(_calendars) > _cache_max_size and next(iter(_calendars)) != keep:
+        key, path = _calendars.popitem(last=False)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        _stats["evicted"] += 1
+        logging.info(f"calendar '{key}' was evicted from the cache")
+
+
+def clear_calendar_cache() -> int:
+    """
+    Remove all cached calendars, for example after change of calendar template or fonts
+    :return: 5 | count of removed calendars
+    """
+    removed = len(_calendars)
+    while _calendars:
+        _, path = _calendars.popitem()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def get_calendar_cache_stats() -> Dict[str, int]:
+    """
+    :return: {'size': 5, 'max_size': 48, 'hits': 20, 'misses': 6, 'evicted': 0}
+    """
+    return {"size": len(_calendars), "max_size": _cache_max_size, **_stats}
+
+
+__all__ = ["configure_calendar_cache",
+           "calendar_key",
+           "get_cached_calendar",
+           "is_calendar_cached",
+           "new_calendar_tmp_path",
+           "store_calendar",
+           "clear_calendar_cache",
+           "get_calendar_cache_stats"]
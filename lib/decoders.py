@@ -0,0 +1,178 @@
+import json
+from typing import List, Dict, Union, Optional, Iterable, NamedTuple, Any
+
+# orjson is optional, it's several times faster on the big Exmo ticker:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DecodeError(ValueError):
+    """
+    Upstream response isn't JSON or hasn't expected fields
+    """
+
+
+class PrivatRate(NamedTuple):
+    ccy: str
+    base_ccy: str
+    buy: str
+    sale: str
+
+
+class ExmoTicker(NamedTuple):
+    buy_price: float
+    sell_price: float
+    updated: int
+
+
+class WeatherRecord(NamedTuple):
+    dt: int
+    description: str
+    temp_min: float
+    temp_max: float
+    pressure: int
+    humidity: int
+    wind_speed: float
+    clouds: int
+    # Only 'weather' API has sunrise/sunset, 'forecast' entries have None:
+    sunrise: Optional[int] = None
+    sunset: Optional[int] = None
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON with orjson when it is installed, with json module otherwise
+    :param data: '{"BTC_USD": {"buy_price": "7573.5", ...}, ...}'
+    :return: dict | list
+    """
+    try:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+    except (ValueError, TypeError) as e:
+        raise DecodeError(f"response is not JSON: {e}") from e
+
+
+def _field(data: Any, key: Union[str, int], expected_type: Union[type, tuple]) -> Any:
+    """
+    Take field from decoded JSON and check its type
+    :param data: {'ccy': 'USD', ...}
+    :param key: 'ccy'
+    :param expected_type: str | (int, float)
+    :return: field value
+    """
+    try:
+        value = data[key]
+    except (KeyError, IndexError, TypeError):
+        raise DecodeError(f"field '{key}' is absent")
+    if not isinstance(value, expected_type) or isinstance(value, bool):
+        raise DecodeError(f"field '{key}' has type {type(value).__name__}")
+    return value
+
+
+def _number(data: Any, key: str) -> float:
+    """
+    Take numeric field, Exmo sends numbers as strings: '7573.5'
+    """
+    value = _field(data, key, (str, int, float))
+    try:
+        return float(value)
+    except ValueError:
+        raise DecodeError(f"field '{key}' is not a number: {value}")
+
+
+def decode_privat_rates(data: Union[str, bytes]) -> List[PrivatRate]:
+    """
+    :param data: '[{"ccy":"USD","base_ccy":"UAH","buy":"26.85000","sale":"27.25000"}, ...]'
+    :return: [PrivatRate(ccy='USD', base_ccy='UAH', buy='26.85000', sale='27.25000'), ...]
+    """
+    rows = json_loads(data)
+    if not isinstance(rows, list):
+        raise DecodeError("Privatbank response is not a list")
+    return [PrivatRate(_field(row, "ccy", str),
+                       _field(row, "base_ccy", str),
+                       _field(row, "buy", str),
+                       _field(row, "sale", str)) for row in rows]
+
+
+def decode_exmo_pair(pair_data: Dict[str, Union[str, int]]) -> ExmoTicker:
+    """
+    :param pair_data: {'buy_price': '7573.5', 'sell_price': '7574.7319', ..., 'updated': 1587671114}
+    :return: ExmoTicker(buy_price=7573.5, sell_price=7574.7319, updated=1587671114)
+    """
+    return ExmoTicker(_number(pair_data, "buy_price"),
+                      _number(pair_data, "sell_price"),
+                      int(_number(pair_data, "updated")))
+
+
+def decode_exmo_ticker(data: Union[str, bytes], pairs: Optional[Iterable[str]] = None) -> \
+                                                                        Dict[str, Optional[ExmoTicker]]:
+    """
+    Decode Exmo ticker, only requested pairs are converted to records
+
+    :param data: '{"BTC_USD": {"buy_price": "7573.5", ...}, "BTC_EUR": { ... }, ... }'
+    :param pairs: ['BTC_USD', 'ETH_USD', ... ] | None - all pairs
+    :return: {'BTC_USD': ExmoTicker(...), 'ETH_USD': None, ... }
+             None - pair exists in the response but it has wrong data
+    """
+    ticker = json_loads(data)
+    if not isinstance(ticker, dict):
+        raise DecodeError("Exmo response is not an object")
+    if pairs is not None:
+        pairs = set(pairs)
+    result = {}
+    for pair, pair_data in ticker.items():
+        if pairs is not None and pair not in pairs:
+            continue
+        try:
+            result[pair] = decode_exmo_pair(pair_data)
+        except DecodeError:
+            result[pair] = None
+    return result
+
+
+def _weather_record(entry: Dict[str, Any]) -> WeatherRecord:
+    main = _field(entry, "main", dict)
+    sys_data = entry.get("sys") or {}
+    return WeatherRecord(dt=_field(entry, "dt", int),
+                         description=_field(_field(_field(entry, "weather", list), 0, dict), "description", str),
+                         temp_min=_field(main, "temp_min", (int, float)),
+                         temp_max=_field(main, "temp_max", (int, float)),
+                         pressure=_field(main, "pressure", (int, float)),
+                         humidity=_field(main, "humidity", (int, float)),
+                         wind_speed=_field(_field(entry, "wind", dict), "speed", (int, float)),
+                         clouds=_field(_field(entry, "clouds", dict), "all", (int, float)),
+                         sunrise=sys_data.get("sunrise"),
+                         sunset=sys_data.get("sunset"))
+
+
+def decode_weather(data: Union[str, bytes]) -> WeatherRecord:
+    """
+    Decode openweathermap.org 'weather' API response
+    :param data: '{"coord": {"lon": 30.51, "lat": 50.4}, "weather": [...], "main": {...}, ...}'
+    :return: WeatherRecord(dt=1589710794, description='light rain', temp_min=290.15, ...)
+    """
+    return _weather_record(json_loads(data))
+
+
+def decode_forecast(data: Union[str, bytes]) -> List[WeatherRecord]:
+    """
+    Decode openweathermap.org 'forecast' API response
+    :param data: '{"cod": "200", "list": [{"dt": 1589727600, "main": {...}, ...}, ...], "city": {...}}'
+    :return: [WeatherRecord(dt=1589727600, ...), WeatherRecord(dt=1589738400, ...), ...]
+    """
+    return [_weather_record(entry) for entry in _field(json_loads(data), "list", list)]
+
+
+__all__ = ["DecodeError",
+           "PrivatRate",
+           "ExmoTicker",
+           "WeatherRecord",
+           "json_loads",
+           "decode_privat_rates",
+           "decode_exmo_pair",
+           "decode_exmo_ticker",
+           "decode_weather",
+           "decode_forecast"]
@@ -1,8 +1,10 @@
-import ast
+import io
 import statistics
 from typing import List, Dict, Union
-from PIL import Image, ImageDraw, ImageFont
-from .help_functions import create_dir
+from PIL import ImageDraw
+from .assets import get_template, get_font
+from .render_executor import run_render
+from .decoders import DecodeError, decode_exmo_ticker
 
 
 # EXMO exchange API (JSON format)
@@ -31,26 +33,24 @@ async def parse_exmo_jsons(raw_data: Dict[str, Union[int, str]], cripto_pair: Li
 
     :return {'BTC_USD': '7580.34561', 'ETH_USD': '189.682', ... }
     """
-    # Check correct result request and prepare data using ast.literal_eval method:
+    # Check correct result request and decode specific pairs only:
     if raw_data and raw_data.get("status") == 200:
-        raw_data = ast.literal_eval(raw_data["result"])
+        try:
+            data = decode_exmo_ticker(raw_data["result"], cripto_pair)
+        except DecodeError:
+            return False
     else:
         return False
 
-    # Take specific pairs only:
-    data = {pair: pair_data for pair, pair_data in raw_data.items() if pair in cripto_pair}
-
     # Take average buy/sell price:
     result = {}
-    for pair, pair_data in data.items():
-        try:
-            buy_price = float(pair_data["buy_price"])
-            sell_price = float(pair_data["sell_price"])
-            average_price = statistics.mean([buy_price, sell_price])
-            average_price = round(average_price, 5)
-            result[pair] = str(average_price)
-        except Exception:
+    for pair, ticker in data.items():
+        if ticker is None:
             result[pair] = "haven't result"
+            continue
+        average_price = statistics.mean([ticker.buy_price, ticker.sell_price])
+        average_price = round(average_price, 5)
+        result[pair] = str(average_price)
     return result
 
 
@@ -77,23 +77,19 @@ async def create_cryptocurrency_message(currency: Union[Dict[str, str], bool], t
         return currency_str
 
 
-async def create_cryptocurrency_image(displayed_text: str) -> str:
+def draw_cryptocurrency_image(displayed_text: str) -> bytes:
     """
-    Create images with text and return path to images
+    Draw text on the template, CPU-bound part of create_cryptocurrency_image()
 
     :param displayed_text: str
-    :return: "images/out/crypto.png"
+    :return: b'\x89PNG...'
     """
-    template_directory = "images/background_template"
-    result_directory = "images/out"
     image_name = "crypto.png"
-    image_template_path = f"{template_directory}/{image_name}"
-    image_result_path = f"{result_directory}/{image_name}"
-    image_template = Image.open(image_template_path)
+    image_template = get_template(image_name)
     draw = ImageDraw.Draw(image_template)
 
     font_size = 50
-    font = ImageFont.truetype("images/fonts/Spartan/static/Spartan-SemiBold.ttf", size=font_size)
+    font = get_font(font_size)
 
     # Start position on images:
     (x, y) = (140, 90)
@@ -101,13 +97,21 @@ async def create_cryptocurrency_image(displayed_text: str) -> str:
     text_color = "rgb(255, 255, 255)"
 
     draw.text((x, y), displayed_text, fill=text_color, font=font)
-    try:
-        image_template.save(image_result_path)
-    except FileNotFoundError:
-        create_dir(result_directory)
-        image_template.save(image_result_path)
+    image_result = io.BytesIO()
+    image_template.save(image_result, format="PNG")
+    return image_result.getvalue()
+
 
-    return image_result_path
+async def create_cryptocurrency_image(displayed_text: str) -> io.BytesIO:
+    """
+    Create images with text in the render pool and return it as in-memory PNG file
+
+    :param displayed_text: str
+    :return: <class '_io.BytesIO'> with PNG data, position at the start
+    """
+    image_result = io.BytesIO(await run_render(draw_cryptocurrency_image, displayed_text))
+    image_result.name = "crypto.png"
+    return image_result
 
 __all__ = ["url_exmo",
            "cripto_pair",
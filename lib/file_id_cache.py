@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from aiogram import types
+from aiogram.utils.exceptions import BadRequest
+from .help_functions import create_dir
+
+
+# Default cache params (can be overridden from data.yaml "file_id_cache" section):
+FILE_ID_CACHE_PATH = "images/out/file_ids.json"
+FILE_ID_CACHE_MAX_SIZE = 256
+# Seconds between a new upload and the cache write, uploads of this time are written together:
+FILE_ID_CACHE_SAVE_INTERVAL = 5.0
+# Telegram limit of photos in one media group:
+MEDIA_GROUP_SIZE = 10
+
+# sha256 of image bytes -> Telegram file_id, the oldest used image is first:
+_file_ids: "OrderedDict[str, str]" = OrderedDict()
+_cache_path = FILE_ID_CACHE_PATH
+_cache_max_size = FILE_ID_CACHE_MAX_SIZE
+_save_interval = FILE_ID_CACHE_SAVE_INTERVAL
+# Delayed write, see _save_later(), "write" - future of the write running in the executor:
+_save = {"dirty": False, "task": None, "write": None}
+# Writes of the delayed task and of the shutdown hook never run at the same time:
+_write_lock = threading.Lock()
+
+
+def load_file_id_cache(path: str = FILE_ID_CACHE_PATH, max_size: int = FILE_ID_CACHE_MAX_SIZE,
+                       save_interval: float = FILE_ID_CACHE_SAVE_INTERVAL):
+    """
+    Load saved file_id values from disk. Call it from the dispatcher startup hook.
+
+    :param path: "images/out/file_ids.json"
+    :param max_size: 256 | max count of remembered images
+    :param save_interval: 5.0 | seconds between a new upload and the cache write
+    """
+    global _cache_path, _cache_max_size, _save_interval
+    _cache_path = path
+    _cache_max_size = max_size
+    _save_interval = save_interval
+    try:
+        with open(path, "r") as f:
+            _file_ids.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logging.warning(f"file_id cache '{path}' is broken and will be rewritten: {e}")
+    while len(_file_ids) > _cache_max_size:
+        _file_ids.popitem(last=False)
+
+
+def _write_file_id_cache(path: str, content: str):
+    """
+    Executed in the default executor, a temporary file is renamed so broken file is never left after crash
+    """
+    directory = os.path.dirname(path) or "."
+    with _write_lock:
+        create_dir(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+async def save_file_id_cache():
+    """
+    Write changed cache to disk now
+    """
+    if not _save["dirty"]:
+        return
+    _save["dirty"] = False
+    # Snapshot in the loop thread, the dict is changed by handlers:
+    content = json.dumps(_file_ids)
+    loop = asyncio.get_event_loop()
+    _save["write"] = loop.run_in_executor(None, _write_file_id_cache, _cache_path, content)
+    # Cancelled caller doesn't stop the write in the executor, close_file_id_cache() waits for it:
+    await asyncio.shield(_save["write"])
+
+
+async def _save_later():
+    # Uploads which came while previous write was running are written by the next round:
+    while True:
+        await asyncio.sleep(_save_interval)
+        await save_file_id_cache()
+        if not _save["dirty"]:
+            break
+
+
+async def close_file_id_cache():
+    """
+    Write pending changes. Call it from the dispatcher shutdown hook.
+    """
+    if _save["task"] is not None and not _save["task"].done():
+        _save["task"].cancel()
+        await asyncio.gather(_save["task"], return_exceptions=True)
+    _save["task"] = None
+    if _save["write"] is not None:
+        await asyncio.gather(_save["write"], return_exceptions=True)
+        _save["write"] = None
+    await save_file_id_cache()
+
+
+async def reply_photo_cached(message: types.Message, photo: bytes, caption: Optional[str] = None) -> types.Message:
+    """
+    Reply with photo, image bytes are uploaded to Telegram only once and then it's sent by file_id
+
+    :param message: <class 'aiogram.types.message.Message'>
+    :param photo: b'\\x89PNG...'
+    :param caption: 'text under the photo' | None
+    :return: sent message
+    """
+    key = hashlib.sha256(photo).hexdigest()
+    file_id = _file_ids.get(key)
+    if file_id:
+        try:
+            sent = await message.reply_photo(file_id, caption=caption)
+            _file_ids.move_to_end(key)
+            return sent
+        except BadRequest as e:
+            # file_id isn't valid anymore (other bot token, removed file), upload it again:
+            logging.warning(f"cached file_id is rejected: {e}")
+            del _file_ids[key]
+
+    sent = await message.reply_photo(types.InputFile(io.BytesIO(photo), filename="image.png"), caption=caption)
+    _remember_file_ids([key], [sent])
+    return sent
+
+
+def _remember_file_ids(keys: List[str], sent: List[types.Message]):
+    for key, sent_message in zip(keys, sent):
+        _file_ids[key] = sent_message.photo[-1].file_id
+        _file_ids.move_to_end(key)
+    while len(_file_ids) > _cache_max_size:
+        _file_ids.popitem(last=False)
+    _save["dirty"] = True
+    if _save["task"] is None or _save["task"].done():
+        _save["task"] = asyncio.ensure_future(_save_later())
+
+
+def _media_group(photos: List[bytes], keys: List[str], caption: Optional[str], use_file_ids: bool) -> types.MediaGroup:
+    media = types.MediaGroup()
+    for number, (photo, key) in enumerate(zip(photos, keys)):
+        file_id = _file_ids.get(key) if use_file_ids else None
+        media.attach_photo(file_id or types.InputFile(io.BytesIO(photo), filename=f"image_{number}.png"),
+                           caption=caption if number == 0 else None)
+    return media
+
+
+async def reply_media_group_cached(message: types.Message, photos: List[bytes],
+                                   caption: Optional[str] = None) -> List[types.Message]:
+    """
+    Reply with albums of photos, already uploaded images are sent by file_id.
+    More than MEDIA_GROUP_SIZE photos are split into several albums of the same size: 12 -> 6 + 6.
+
+    :param message: <class 'aiogram.types.message.Message'>
+    :param photos: [b'\x89PNG...', ...]
+    :param caption: 'text under the first album' | None
+    :return: sent messages, one per photo
+    """
+    groups = math.ceil(len(photos) / MEDIA_GROUP_SIZE)
+    group_size = math.ceil(len(photos) / groups) if groups else 0
+    result = []
+    for first in range(0, len(photos), group_size or 1):
+        chunk = photos[first:first + group_size]
+        keys = [hashlib.sha256(photo).hexdigest() for photo in chunk]
+        group_caption = caption if first == 0 else None
+        try:
+            sent = await message.reply_media_group(_media_group(chunk, keys, group_caption, use_file_ids=True))
+        except BadRequest as e:
+            # Some file_id isn't valid anymore, upload whole album again:
+            logging.warning(f"cached file_id is rejected: {e}")
+            for key in keys:
+                _file_ids.pop(key, None)
+            sent = await message.reply_media_group(_media_group(chunk, keys, group_caption, use_file_ids=False))
+        _remember_file_ids(keys, sent)
+        result.extend(sent)
+    return result
+
+
+__all__ = ["load_file_id_cache",
+           "close_file_id_cache",
+           "reply_photo_cached",
+           "reply_media_group_cached"]
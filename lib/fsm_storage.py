@@ -0,0 +1,226 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+from aiogram.dispatcher.storage import BaseStorage
+from .help_functions import create_dir
+from .metrics import observe
+
+
+# Default storage params (can be overridden from data.yaml "fsm_storage" section):
+FSM_STORAGE_PATH = "images/out/fsm_storage.sqlite3"
+# Seconds after the last change when abandoned conversation is removed:
+FSM_STORAGE_TTL = 3600
+# Seconds between writes of changed records to the disk:
+FSM_STORAGE_FLUSH_INTERVAL = 1.0
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage which survives restart. All reads are served from the memory, changed records are
+    written to SQLite in one transaction every flush_interval seconds (write-behind).
+    Records which weren't changed during ttl seconds are removed.
+    """
+
+    def __init__(self,
+                 path: str = FSM_STORAGE_PATH,
+                 ttl: float = FSM_STORAGE_TTL,
+                 flush_interval: float = FSM_STORAGE_FLUSH_INTERVAL):
+        """
+        :param path: "images/out/fsm_storage.sqlite3"
+        :param ttl: 3600 | seconds, 0 - records never expire
+        :param flush_interval: 1.0 | seconds
+        """
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        # (chat, user) -> {'state': ..., 'data': {...}, 'bucket': {...}, 'updated_at': 1700000000.0}
+        self.data: typing.Dict[typing.Tuple[str, str], dict] = {}
+        self._dirty: typing.Set[typing.Tuple[str, str]] = set()
+        self._flush_task: typing.Optional[asyncio.Task] = None
+        # Flushes are executed in the default executor, one at a time:
+        self._db_lock = threading.Lock()
+        self.stats = {"flushes": 0, "rows_written": 0, "rows_deleted": 0, "expired": 0}
+
+        create_dir(os.path.dirname(path) or ".")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS fsm ("
+                         "chat TEXT NOT NULL, user TEXT NOT NULL, state TEXT, data TEXT, bucket TEXT, "
+                         "updated_at REAL NOT NULL, PRIMARY KEY (chat, user))")
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        expired_before = time.time() - self.ttl if self.ttl else 0
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM fsm WHERE updated_at < ?", (expired_before,))
+            rows = self._db.execute("SELECT chat, user, state, data, bucket, updated_at FROM fsm").fetchall()
+        for chat, user, state, data, bucket, updated_at in rows:
+            self.data[(chat, user)] = {"state": state,
+                                       "data": json.loads(data),
+                                       "bucket": json.loads(bucket),
+                                       "updated_at": updated_at}
+        logging.info(f"FSM storage '{self.path}': {len(rows)} conversation(s) restored")
+
+    def _record(self, chat, user) -> typing.Tuple[typing.Tuple[str, str], dict]:
+        key = tuple(map(str, self.check_address(chat=chat, user=user)))
+        record = self.data.get(key)
+        if record is not None and self.ttl and time.time() - record["updated_at"] > self.ttl:
+            self._expire(key)
+            record = None
+        if record is None:
+            record = {"state": None, "data": {}, "bucket": {}, "updated_at": time.time()}
+        return key, record
+
+    def _save(self, key: typing.Tuple[str, str], record: dict):
+        record["updated_at"] = time.time()
+        if record["state"] is None and not record["data"] and not record["bucket"]:
+            self.data.pop(key, None)
+        else:
+            self.data[key] = record
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    def _expire(self, key: typing.Tuple[str, str]):
+        del self.data[key]
+        self._dirty.add(key)
+        self.stats["expired"] += 1
+
+    async def _flush_later(self):
+        # Records changed while previous flush was writing are flushed by the next round:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._dirty:
+                break
+
+    async def flush(self):
+        """
+        Write changed records to the disk now
+        """
+        if self.ttl:
+            expired_before = time.time() - self.ttl
+            for key in [key for key, record in self.data.items() if record["updated_at"] < expired_before]:
+                self._expire(key)
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = []
+        deleted = []
+        for key in dirty:
+            record = self.data.get(key)
+            if record is None:
+                deleted.append(key)
+            else:
+                rows.append((*key, record["state"], json.dumps(record["data"]), json.dumps(record["bucket"]),
+                             record["updated_at"]))
+        loop = asyncio.get_event_loop()
+        started_at = time.monotonic()
+        await loop.run_in_executor(None, self._write, rows, deleted)
+        observe("tbot_fsm_flush_duration_seconds", time.monotonic() - started_at)
+
+    def _write(self, rows: list, deleted: list):
+        with self._db_lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO fsm VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM fsm WHERE chat = ? AND user = ?", deleted)
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+        self.stats["rows_deleted"] += len(deleted)
+
+    async def close(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+    async def wait_closed(self):
+        with self._db_lock:
+            self._db.close()
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        _, record = self._record(chat, user)
+        return record["state"] if record["state"] is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[str] = None) -> typing.Dict:
+        _, record = self._record(chat, user)
+        return copy.deepcopy(record["data"])
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key, record = self._record(chat, user)
+        record["data"].update(data or {}, **kwargs)
+        self._save(key, record)
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key, record = self._record(chat, user)
+        record["state"] = self.resolve_state(state)
+        self._save(key, record)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key, record = self._record(chat, user)
+        record["data"] = copy.deepcopy(data or {})
+        self._save(key, record)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        key, record = self._record(chat, user)
+        record["state"] = None
+        if with_data:
+            record["data"] = {}
+        self._save(key, record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        _, record = self._record(chat, user)
+        return copy.deepcopy(record["bucket"])
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key, record = self._record(chat, user)
+        record["bucket"] = copy.deepcopy(bucket or {})
+        self._save(key, record)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key, record = self._record(chat, user)
+        record["bucket"].update(bucket or {}, **kwargs)
+        self._save(key, record)
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        """
+        :return: {'records': 2, 'dirty': 0, 'flushes': 14, 'rows_written': 20, 'rows_deleted': 6, 'expired': 1}
+        """
+        return {"records": len(self.data), "dirty": len(self._dirty), **self.stats}
+
+
+__all__ = ["SQLiteStorage"]
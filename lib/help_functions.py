@@ -1,10 +1,39 @@
 import os
 import signal
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, Union, Optional, Tuple
+from urllib.parse import urlsplit
 import asyncio
 import aiohttp
 import yaml
+from .metrics import observe, inc
+
+
+# Shared HTTP client params (can be overridden from data.yaml "http" section):
+HTTP_LIMIT = 20
+HTTP_LIMIT_PER_HOST = 4
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_DNS_CACHE_TTL = 300
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 15
+HTTP_TOTAL_TIMEOUT = 30
+
+# One long-lived session for all upstream calls, see open_http_session():
+_http_session: Optional[aiohttp.ClientSession] = None
+
+# Responses cache params (can be overridden from data.yaml "http_cache" section):
+HTTP_CACHE_MAX_SIZE = 64
+# URL prefix -> seconds of keeping response in the cache (0 - without cache), see set_cache_ttl():
+_http_cache_ttl: Dict[str, float] = {}
+# URL -> (expire time, response), the oldest used URL is first:
+_http_cache: "OrderedDict[str, Tuple[float, Dict[str, Union[str, object]]]]" = OrderedDict()
+_http_cache_max_size = HTTP_CACHE_MAX_SIZE
+# URL prefix -> replacement, upstream services are redirected to local stand-ins (load tests, staging):
+_upstream_overrides: Dict[str, str] = {}
+# URL -> request task, shared between all callers while response isn't received:
+_http_inflight: Dict[str, asyncio.Future] = {}
 
 
 def get_data_from_yaml(filename: str) -> dict:
@@ -17,24 +46,166 @@ def get_data_from_yaml(filename: str) -> dict:
         return yaml.safe_load(f)
 
 
-def admin_check(ADMINS_IDS):
+async def open_http_session(limit: int = HTTP_LIMIT,
+                            limit_per_host: int = HTTP_LIMIT_PER_HOST,
+                            keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                            dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                            connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                            read_timeout: float = HTTP_READ_TIMEOUT,
+                            total_timeout: float = HTTP_TOTAL_TIMEOUT) -> aiohttp.ClientSession:
+    """
+    Create shared HTTP session with pooled keep-alive connections and DNS cache.
+    Call it from the dispatcher startup hook, pair with close_http_session() on shutdown.
+
+    :param limit: 20 | max opened connections at all
+    :param limit_per_host: 4 | max opened connections to one host
+    :param keepalive_timeout: 60 | seconds for keep idle connection opened
+    :param dns_cache_ttl: 300 | seconds for cache resolved hosts
+    :param connect_timeout: 5 | seconds for connect to the host
+    :param read_timeout: 15 | seconds for read one portion of data
+    :param total_timeout: 30 | seconds for whole request
+    :return: <class 'aiohttp.client.ClientSession'>
+    """
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        return _http_session
+    connector = aiohttp.TCPConnector(limit=limit,
+                                     limit_per_host=limit_per_host,
+                                     keepalive_timeout=keepalive_timeout,
+                                     ttl_dns_cache=dns_cache_ttl)
+    timeout = aiohttp.ClientTimeout(total=total_timeout,
+                                    sock_connect=connect_timeout,
+                                    sock_read=read_timeout)
+    _http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _http_session
+
+
+async def close_http_session():
+    """
+    Close shared HTTP session and all pooled connections
+    """
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return shared HTTP session, it will be opened with default params if startup hook was not called
+    :return: <class 'aiohttp.client.ClientSession'>
+    """
+    if _http_session is None or _http_session.closed:
+        return await open_http_session()
+    return _http_session
+
+
+def set_cache_ttl(url_prefix: str, ttl: float):
+    """
+    Set time of keeping responses in the cache for all URLs started with url_prefix
+    :param url_prefix: 'https://api.exmo.com/v1.1/ticker'
+    :param ttl: 30 | seconds, 0 - disable cache
+    """
+    _http_cache_ttl[url_prefix] = ttl
+
+
+def configure_http_cache(max_size: int = HTTP_CACHE_MAX_SIZE, ttl: Optional[Dict[str, float]] = None):
     """
-    Decorator for access admins ID only
+    Set responses cache params, data.yaml "http_cache" section is the only source of TTLs
+    :param max_size: 64 | max count of cached URLs, the least recently used is evicted first
+    :param ttl: {'https://api.exmo.com/v1.1/ticker': 30, ...} | None - responses aren't cached
     """
-    def wrap(f):
-        async def wrapped_f(*args, **kwargs):
-            if args[0]["chat"]["id"] in ADMINS_IDS:
-                value = await f(*args, **kwargs)
-                return value
-        return wrapped_f
-    return wrap
+    global _http_cache_max_size
+    _http_cache_max_size = max_size
+    _http_cache_ttl.clear()
+    for url_prefix, url_ttl in (ttl or {}).items():
+        set_cache_ttl(url_prefix, url_ttl)
+    while len(_http_cache) > _http_cache_max_size:
+        _http_cache.popitem(last=False)
 
 
-async def get_json_from_web(url: str) -> Dict[str, Union[str, object]]:
-    async with aiohttp.ClientSession() as session:
+def get_cache_ttl(url: str) -> float:
+    """
+    Find TTL for URL using the longest registered prefix
+    :param url: 'https://api.exmo.com/v1.1/ticker'
+    :return: 30 | 0 when URL isn't cached
+    """
+    matched = [prefix for prefix in _http_cache_ttl if url.startswith(prefix)]
+    if not matched:
+        return 0
+    return _http_cache_ttl[max(matched, key=len)]
+
+
+def configure_upstream_overrides(overrides: Optional[Dict[str, str]] = None):
+    """
+    Send requests for URLs with the prefix to other server, cache keeps original URLs
+    :param overrides: {'https://api.exmo.com/': 'http://127.0.0.1:9000/exmo/', ...} | None - real services
+    """
+    _upstream_overrides.clear()
+    _upstream_overrides.update(overrides or {})
+
+
+def _override_url(url: str) -> str:
+    for prefix, replacement in _upstream_overrides.items():
+        if url.startswith(prefix):
+            return replacement + url[len(prefix):]
+    return url
+
+
+async def _request_web(url: str) -> Dict[str, Union[str, object]]:
+    session = await get_http_session()
+    host = urlsplit(url).hostname or ""
+    url = _override_url(url)
+    started_at = time.monotonic()
+    status = "error"
+    try:
         async with session.get(url) as resp:
+            status = str(resp.status)
             result = {"status": resp.status, "result": await resp.text()}
             return result
+    finally:
+        # Cached responses aren't counted, only real requests to the host:
+        observe("tbot_upstream_request_duration_seconds", time.monotonic() - started_at, host=host)
+        inc("tbot_upstream_requests_total", host=host, status=status)
+
+
+async def _request_web_to_cache(url: str, ttl: float) -> Dict[str, Union[str, object]]:
+    result = await _request_web(url)
+    # Errors are not cached, next call will try again:
+    if result["status"] == 200:
+        _http_cache[url] = (time.monotonic() + ttl, result)
+        _http_cache.move_to_end(url)
+        while len(_http_cache) > _http_cache_max_size:
+            _http_cache.popitem(last=False)
+    return result
+
+
+async def get_json_from_web(url: str, ttl: Optional[float] = None) -> Dict[str, Union[str, object]]:
+    """
+    GET request through the shared HTTP session.
+    Successful responses are cached for the TTL of the URL, concurrent calls for the same URL share one request.
+
+    :param url: 'https://api.exmo.com/v1.1/ticker'
+    :param ttl: 30 | seconds, None - take TTL registered with set_cache_ttl()
+    :return: {'status': 200, 'result': 'response text'}
+    """
+    if ttl is None:
+        ttl = get_cache_ttl(url)
+    if not ttl:
+        return await _request_web(url)
+
+    cached = _http_cache.get(url)
+    if cached and cached[0] > time.monotonic():
+        _http_cache.move_to_end(url)
+        return dict(cached[1])
+
+    request = _http_inflight.get(url)
+    if request is None:
+        request = asyncio.ensure_future(_request_web_to_cache(url, ttl))
+        _http_inflight[url] = request
+        request.add_done_callback(lambda _: _http_inflight.pop(url, None))
+    # shield() - cancelled caller doesn't cancel request for the other callers:
+    return dict(await asyncio.shield(request))
 
 
 def create_dir(dir_path: str):
@@ -93,7 +264,11 @@ async def kill_process(pid: int) -> Union[str, bool]:
 
 
 __all__ = ["get_data_from_yaml",
-           "admin_check",
+           "open_http_session",
+           "close_http_session",
+           "set_cache_ttl",
+           "configure_http_cache",
+           "configure_upstream_overrides",
            "get_json_from_web",
            "create_dir",
            "find_pid",
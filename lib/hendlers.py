@@ -1,6 +1,70 @@
-from main import bot, dp, ADMINS_IDS
+import asyncio
+import logging
+from .help_functions import open_http_session, close_http_session, configure_http_cache, configure_upstream_overrides
+from .prefetch import start_prefetch, stop_prefetch
+from .file_id_cache import load_file_id_cache, close_file_id_cache
+from .assets import load_assets, watch_assets
+from .render_executor import start_render_executor, stop_render_executor
+from .calendar_cache import configure_calendar_cache
+from .moon_calendar import prerender_calendars
+from .send_queue import start_send_queue, stop_send_queue, broadcast
+from .metrics import start_metrics, stop_metrics
+from .loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from .fsm_storage import SQLiteStorage
+
+# Background tasks started in on_startup():
+background_tasks = []
 
 
 async def send_to_admin(dp):
-    # TODO: send message all admins, not one
-    await bot.send_message(chat_id=ADMINS_IDS[0], text="Bot was start. Again... /start")
+    # All admins through the send queue, Telegram rate limits are respected:
+    admins_ids = dp["admins_ids"]
+    results = await broadcast(admins_ids, "Bot was start. Again... /start")
+    for admin_id, result in zip(admins_ids, results):
+        if isinstance(result, Exception):
+            logging.warning(f"startup message to {admin_id} wasn't sent: {result!r}")
+
+
+async def on_startup(dp):
+    """
+    Dispatcher startup hook: open shared resources and notify admin.
+    Configuration is taken from dp["config_data"], see main.py
+    """
+    config_data = dp["config_data"]
+    # Storage for message states, conversations survive bot restart. Dispatcher closes it on shutdown:
+    dp.storage = SQLiteStorage(**config_data.get("fsm_storage", {}))
+    await start_metrics(**config_data.get("metrics", {}))
+    start_loop_watchdog(**config_data.get("loop_watchdog", {}))
+    await open_http_session(**config_data.get("http", {}))
+    start_send_queue(dp.bot, **config_data.get("send_queue", {}))
+    configure_http_cache(**config_data.get("http_cache", {}))
+    configure_upstream_overrides(config_data.get("upstream_overrides"))
+    start_prefetch(**config_data.get("prefetch", {}))
+    load_file_id_cache(**config_data.get("file_id_cache", {}))
+    load_assets()
+    start_render_executor(**config_data.get("render", {}))
+    assets_config = config_data.get("assets", {})
+    if assets_config.get("reload_interval"):
+        background_tasks.append(asyncio.ensure_future(watch_assets(assets_config["reload_interval"])))
+    configure_calendar_cache(**config_data.get("calendar_cache", {}))
+    moon_calendar_config = config_data.get("moon_calendar", {})
+    if moon_calendar_config.get("prerender_months") is not None:
+        background_tasks.append(asyncio.ensure_future(prerender_calendars(**moon_calendar_config)))
+    await send_to_admin(dp)
+
+
+async def on_shutdown(dp):
+    """
+    Dispatcher shutdown hook: close shared resources
+    """
+    await stop_send_queue()
+    await stop_prefetch()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await stop_render_executor()
+    await close_file_id_cache()
+    await close_http_session()
+    await stop_metrics()
+    await stop_loop_watchdog()
@@ -1,6 +1,11 @@
 import platform
 import asyncio
 from .help_functions import get_json_from_web
+from .render_executor import get_render_stats
+from .middlewares import get_access_stats
+from .send_queue import get_send_queue_stats
+from .metrics import get_histogram_summary, get_counter_values
+from .loop_watchdog import get_watchdog_report
 
 
 async def get_public_ip() -> str:
@@ -79,15 +84,97 @@ async def get_cpu_temperature():
     return f"{result}°C"
 
 
-async def all_messages_text() -> str:
+async def get_render_info() -> str:
+    """
+    Get render pool load, it helps to choose workers count
+    :return: 'render: 2 thread workers, queue 0/8 (max 3), wait avg 12ms max 400ms, rejected 0'
+    """
+    stats = get_render_stats()
+    return f"render: {stats['workers']} {stats['mode']} workers, " \
+           f"queue {stats['queue_depth']}/{stats['queue_size']} (max {stats['queue_depth_max']}), " \
+           f"wait avg {stats['wait_time_avg'] * 1000:.0f}ms max {stats['wait_time_max'] * 1000:.0f}ms, " \
+           f"rejected {stats['rejected']}"
+
+
+async def get_send_queue_info() -> str:
+    """
+    :return: 'sent: 25 (0.02/s), queued 0, latency avg 350ms max 2100ms, retried 1, failed 0'
+    """
+    stats = get_send_queue_stats()
+    return f"sent: {stats['sent']} ({stats['throughput']:.2f}/s), queued {stats['queued']}, " \
+           f"latency avg {stats['latency_avg'] * 1000:.0f}ms max {stats['latency_max'] * 1000:.0f}ms, " \
+           f"retried {stats['retried']}, failed {stats['failed']}"
+
+
+async def get_access_info(dp) -> str:
+    """
+    :param dp: <class 'aiogram.dispatcher.dispatcher.Dispatcher'>
+    :return: 'updates: passed 120, rejected 3, throttled 0' | ''
+    """
+    stats = get_access_stats(dp)
+    if not stats:
+        return ""
+    return f"updates: passed {stats['passed']}, rejected {stats['rejected']}, throttled {stats['throttled']}"
+
+
+async def get_metrics_info() -> str:
+    """
+    Slowest commands, upstream hosts and event loop lag, full data is on the metrics endpoint
+    :return: 'commands: /weather 5x avg 300ms p95 1000ms, ...
+              upstream: api.openweathermap.org 5x avg 250ms p95 500ms errors 0, ...
+              loop lag: avg 2ms max 40ms' | ''
+    """
+    lines = []
+    commands = get_histogram_summary("tbot_command_duration_seconds", top=3)
+    if commands:
+        lines.append("commands: " + ", ".join(
+            f"{item['labels'].split('=', 1)[1]} {item['count']}x avg {item['avg'] * 1000:.0f}ms "
+            f"p95 {item['p95'] * 1000:.0f}ms" for item in commands))
+    hosts = get_histogram_summary("tbot_upstream_request_duration_seconds", top=3)
+    if hosts:
+        statuses = get_counter_values("tbot_upstream_requests_total")
+        upstream = []
+        for item in hosts:
+            host = item["labels"].split("=", 1)[1]
+            errors = sum(count for labels, count in statuses.items()
+                         if labels.startswith(f"host={host},") and not labels.endswith("status=200"))
+            upstream.append(f"{host} {item['count']}x avg {item['avg'] * 1000:.0f}ms "
+                            f"p95 {item['p95'] * 1000:.0f}ms errors {errors:.0f}")
+        lines.append("upstream: " + ", ".join(upstream))
+    loop_lag = get_histogram_summary("tbot_event_loop_lag_seconds", top=1)
+    if loop_lag:
+        lines.append(f"loop lag: avg {loop_lag[0]['avg'] * 1000:.0f}ms max {loop_lag[0]['max'] * 1000:.0f}ms")
+    return "\n".join(lines)
+
+
+async def get_loop_watchdog_info() -> str:
+    """
+    The worst call site found by the loop watchdog, full ranked list is in the log
+    :return: 'loop blocked: 5 times, worst lib/privat.py:88 draw_privat_image 3x total 1200ms' | ''
+    """
+    report = get_watchdog_report()
+    if not report:
+        return ""
+    worst = report[0]
+    return f"loop blocked: {sum(record['blocks'] for record in report)} times, worst {worst['site']} " \
+           f"{worst['blocks']}x total {worst['total'] * 1000:.0f}ms"
+
+
+async def all_messages_text(dp=None) -> str:
     """
     Collecting different data about Telegram-bot platform/environment
+    :param dp: <class 'aiogram.dispatcher.dispatcher.Dispatcher'> | None - without updates counters
     :return: 'information text'
     """
     public_ip = await get_public_ip()
     software_info = await get_software_info()
     hardware_info = await get_hardware_info()
     cpu_temperature = await get_cpu_temperature()
+    render_info = await get_render_info()
+    access_info = await get_access_info(dp) if dp else ""
+    send_queue_info = await get_send_queue_info()
+    metrics_info = await get_metrics_info()
+    loop_watchdog_info = await get_loop_watchdog_info()
 
     message_text = "<code>"
     if public_ip:
@@ -98,6 +185,16 @@ async def all_messages_text() -> str:
         message_text += f"{hardware_info}\n"
     if cpu_temperature:
         message_text += f"CPU temperature: {cpu_temperature}\n"
+    if render_info:
+        message_text += f"{render_info}\n"
+    if access_info:
+        message_text += f"{access_info}\n"
+    if send_queue_info:
+        message_text += f"{send_queue_info}\n"
+    if metrics_info:
+        message_text += f"{metrics_info}\n"
+    if loop_watchdog_info:
+        message_text += f"{loop_watchdog_info}\n"
     message_text += "</code>"
     if not message_text:
         message_text = "Haven't information"
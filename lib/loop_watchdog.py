@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple, Union
+
+
+# Default params (can be overridden from data.yaml "loop_watchdog" section):
+# Seconds of event loop blocking which are reported:
+WATCHDOG_THRESHOLD = 0.1
+# Seconds between heartbeats of the loop and checks of the watchdog thread:
+WATCHDOG_INTERVAL = 0.05
+# Seconds between ranked reports in the log, 0 - on shutdown only:
+WATCHDOG_REPORT_INTERVAL = 600
+WATCHDOG_TOP = 10
+# Frames up to the call site kept in the report:
+STACK_DEPTH = 6
+
+# Project files are preferred as the call site, library frames are the details of it:
+_project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_state = {"beat": 0.0, "loop_thread_id": None, "stop": None, "thread": None, "task": None}
+# Call site 'lib/privat.py:88 draw_privat_image' -> {'blocks': 3, 'total': 1.2, 'max': 0.5, 'stack': [...]}
+_sites: Dict[str, Dict[str, Union[int, float, List[str]]]] = {}
+_sites_lock = threading.Lock()
+
+
+def _call_site(frame) -> Tuple[str, List[str]]:
+    """
+    :return: ('lib/privat.py:88 draw_privat_image',
+              ['main.py:92 send_privatbank', 'lib/privat.py:88 draw_privat_image', '... PIL/Image.py:...'])
+    """
+    stack = traceback.extract_stack(frame)
+    site_index = len(stack) - 1
+    for index in range(len(stack) - 1, -1, -1):
+        filename = stack[index].filename
+        if filename.startswith(_project_dir) and "site-packages" not in filename:
+            site_index = index
+            break
+
+    def describe(frame_summary) -> str:
+        filename = os.path.relpath(frame_summary.filename, _project_dir) \
+            if frame_summary.filename.startswith(_project_dir) else frame_summary.filename
+        return f"{filename}:{frame_summary.lineno} {frame_summary.name}"
+
+    # Project callers of the site and the innermost library frame which was running:
+    frames = [describe(frame_summary) for frame_summary in stack[max(0, site_index - STACK_DEPTH + 1):site_index + 1]]
+    if site_index < len(stack) - 1:
+        frames.append(f"... {describe(stack[-1])}")
+    return describe(stack[site_index]), frames
+
+
+def _record_block(site: str, stack: List[str], blocked: float):
+    with _sites_lock:
+        record = _sites.setdefault(site, {"blocks": 0, "total": 0.0, "max": 0.0, "stack": stack})
+        record["blocks"] += 1
+        record["total"] += blocked
+        if blocked > record["max"]:
+            record["max"] = blocked
+            record["stack"] = stack
+
+
+def _watch(threshold: float, interval: float, report_interval: float, top: int):
+    stop = _state["stop"]
+    reported_at = time.monotonic()
+    # Call site captured for the current block, its duration is known when the loop wakes up:
+    blocked_site: Optional[Tuple[str, List[str]]] = None
+    blocked_since = 0.0
+    while not stop.wait(interval):
+        now = time.monotonic()
+        beat = _state["beat"]
+        if now - beat > interval + threshold:
+            if blocked_site is None:
+                frame = sys._current_frames().get(_state["loop_thread_id"])
+                if frame is not None:
+                    blocked_site = _call_site(frame)
+                    blocked_since = beat + interval
+                del frame
+        elif blocked_site is not None:
+            blocked = beat - blocked_since
+            _record_block(*blocked_site, blocked)
+            logging.warning(f"event loop was blocked for {blocked * 1000:.0f}ms at {blocked_site[0]}")
+            blocked_site = None
+        if report_interval and now - reported_at > report_interval:
+            reported_at = now
+            log_watchdog_report(top)
+
+
+async def _heartbeat(interval: float):
+    while True:
+        _state["beat"] = time.monotonic()
+        await asyncio.sleep(interval)
+
+
+def start_loop_watchdog(enabled: bool = False,
+                        threshold: float = WATCHDOG_THRESHOLD,
+                        interval: float = WATCHDOG_INTERVAL,
+                        report_interval: float = WATCHDOG_REPORT_INTERVAL,
+                        top: int = WATCHDOG_TOP):
+    """
+    Find code which blocks the event loop. Loop task updates heartbeat, helper thread checks it and
+    captures the stack of the loop thread when heartbeat is late. Call it from the dispatcher startup hook.
+
+    :param enabled: True - start watchdog, it's off by default
+    :param threshold: 0.1 | seconds of blocking which are reported
+    :param interval: 0.05 | seconds between heartbeats
+    :param report_interval: 600 | seconds between ranked call sites reports in the log, 0 - on shutdown only
+    :param top: 10 | call sites in the report
+    """
+    if not enabled or _state["thread"] is not None:
+        return
+    _state["beat"] = time.monotonic()
+    _state["loop_thread_id"] = threading.get_ident()
+    _state["stop"] = threading.Event()
+    _state["task"] = asyncio.ensure_future(_heartbeat(interval))
+    _state["thread"] = threading.Thread(target=_watch, args=(threshold, interval, report_interval, top),
+                                       name="loop-watchdog", daemon=True)
+    _state["thread"].start()
+    logging.info(f"event loop watchdog is started, threshold {threshold * 1000:.0f}ms")
+
+
+async def stop_loop_watchdog(top: int = WATCHDOG_TOP):
+    """
+    Stop watchdog thread and log the final report
+    """
+    if _state["thread"] is None:
+        return
+    _state["stop"].set()
+    _state["task"].cancel()
+    await asyncio.gather(_state["task"], return_exceptions=True)
+    _state["thread"].join()
+    _state.update(thread=None, task=None, stop=None)
+    log_watchdog_report(top)
+
+
+def get_watchdog_report(top: int = WATCHDOG_TOP) -> List[Dict[str, Union[str, int, float, List[str]]]]:
+    """
+    :param top: 10
+    :return: [{'site': 'lib/privat.py:88 draw_privat_image', 'blocks': 3, 'total': 1.2, 'max': 0.5,
+               'stack': ['main.py:92 send_privatbank', ...]}, ...] the longest total blocking is first
+    """
+    with _sites_lock:
+        sites = [{"site": site, **record} for site, record in _sites.items()]
+    return sorted(sites, key=lambda record: record["total"], reverse=True)[:top]
+
+
+def log_watchdog_report(top: int = WATCHDOG_TOP):
+    """
+    Log call sites ranked by total blocking time with the stack of the longest block
+    """
+    report = get_watchdog_report(top)
+    if not report:
+        return
+    lines = ["event loop blocking call sites:"]
+    for position, record in enumerate(report, 1):
+        lines.append(f"{position}. {record['site']} - {record['blocks']} block(s), "
+                     f"total {record['total'] * 1000:.0f}ms, max {record['max'] * 1000:.0f}ms")
+        lines.extend(f"       {frame}" for frame in record["stack"])
+    logging.warning("\n".join(lines))
+
+
+__all__ = ["start_loop_watchdog",
+           "stop_loop_watchdog",
+           "get_watchdog_report",
+           "log_watchdog_report"]
@@ -0,0 +1,229 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from aiohttp import web
+
+
+# Default params (can be overridden from data.yaml "metrics" section):
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9101
+METRICS_PATH = "/metrics"
+# Seconds between event loop lag probes:
+LOOP_LAG_INTERVAL = 0.5
+# Histogram upper bounds in seconds, "+Inf" bucket is added automatically:
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Label sets of one metric, next ones are counted with "other" label values (user input in labels):
+MAX_SERIES = 100
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Latency histogram of one label set, bucket counts are cumulated on export
+    """
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: 0.95
+        :return: 0.5 | upper bound of the bucket with the quantile, max value for "+Inf" bucket
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return min(bound, self.max)
+        return self.max
+
+
+# Metric name -> (type, help), in export order:
+_metrics: Dict[str, Tuple[str, str]] = {
+    "tbot_command_duration_seconds": ("histogram", "Message handling time from middleware to handler end"),
+    "tbot_command_dispatch_seconds": ("histogram", "Time of FSM state lookup and filters before the handler"),
+    "tbot_upstream_request_duration_seconds": ("histogram", "Upstream HTTP request time by host"),
+    "tbot_upstream_requests_total": ("counter", "Upstream HTTP requests by host and status"),
+    "tbot_render_duration_seconds": ("histogram", "Image render time in the render pool by renderer"),
+    "tbot_fsm_flush_duration_seconds": ("histogram", "FSM storage write to SQLite time"),
+    "tbot_event_loop_lag_seconds": ("histogram", "Delay of event loop wake-ups over the probe interval"),
+}
+# Metric name -> labels -> Histogram | counter value:
+_series: Dict[str, Dict[Labels, Union[Histogram, float]]] = {name: {} for name in _metrics}
+_server: Optional[web.AppRunner] = None
+_lag_task: Optional[asyncio.Task] = None
+
+
+def _labels(name: str, labels: Dict[str, str]) -> Labels:
+    key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+    series = _series[name]
+    if key not in series and len(series) >= MAX_SERIES:
+        key = tuple((label, "other") for label, _ in key)
+    return key
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Put value into the histogram
+    :param name: 'tbot_render_duration_seconds'
+    :param value: 0.21 | seconds
+    :param labels: renderer='draw_privat_image'
+    """
+    series = _series[name]
+    key = _labels(name, labels)
+    histogram = series.get(key)
+    if histogram is None:
+        histogram = series[key] = Histogram()
+    histogram.observe(value)
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Increase the counter
+    :param name: 'tbot_upstream_requests_total'
+    :param labels: host='api.privatbank.ua', status='200'
+    """
+    series = _series[name]
+    key = _labels(name, labels)
+    series[key] = series.get(key, 0) + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels) + "}"
+
+
+def render_metrics() -> str:
+    """
+    :return: all metrics in Prometheus text exposition format
+    """
+    lines = []
+    for name, (metric_type, help_text) in _metrics.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in _series[name].items():
+            if metric_type == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), value.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+    return "\n".join(lines) + "\n"
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+async def _watch_loop_lag(interval: float):
+    while True:
+        started_at = time.monotonic()
+        await asyncio.sleep(interval)
+        observe("tbot_event_loop_lag_seconds", max(0.0, time.monotonic() - started_at - interval))
+
+
+async def start_metrics(enabled: bool = True,
+                        host: str = METRICS_HOST,
+                        port: int = METRICS_PORT,
+                        path: str = METRICS_PATH,
+                        loop_lag_interval: float = LOOP_LAG_INTERVAL):
+    """
+    Serve metrics for Prometheus scraping and start event loop lag probe. Call it from the dispatcher startup hook.
+    Metrics are collected even when the endpoint is disabled, /info summary uses them.
+
+    :param enabled: False - don't listen the port
+    :param host: "127.0.0.1" | keep it local, metrics aren't protected
+    :param port: 9101
+    :param path: "/metrics"
+    :param loop_lag_interval: 0.5 | seconds, 0 - without lag probe
+    """
+    global _server, _lag_task
+    if loop_lag_interval and _lag_task is None:
+        _lag_task = asyncio.ensure_future(_watch_loop_lag(loop_lag_interval))
+    if not enabled or _server is not None:
+        return
+    app = web.Application()
+    app.router.add_get(path, _metrics_handler)
+    _server = web.AppRunner(app, access_log=None)
+    await _server.setup()
+    try:
+        await web.TCPSite(_server, host, port).start()
+    except OSError as e:
+        # Bot works without metrics endpoint:
+        logging.warning(f"metrics endpoint {host}:{port} isn't started: {e}")
+        await _server.cleanup()
+        _server = None
+        return
+    logging.info(f"metrics are served on http://{host}:{port}{path}")
+
+
+async def stop_metrics():
+    """
+    Stop metrics endpoint and lag probe
+    """
+    global _server, _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        await asyncio.gather(_lag_task, return_exceptions=True)
+        _lag_task = None
+    if _server is not None:
+        await _server.cleanup()
+        _server = None
+
+
+def get_histogram_summary(name: str, top: int = 5) -> List[Dict[str, Union[str, int, float]]]:
+    """
+    :param name: 'tbot_command_duration_seconds'
+    :param top: 5 | series with the biggest total time
+    :return: [{'labels': 'command=/weather', 'count': 5, 'avg': 0.3, 'p50': 0.25, 'p95': 1.0, 'max': 1.2}, ...]
+    """
+    series = sorted(_series[name].items(), key=lambda item: item[1].sum, reverse=True)[:top]
+    return [{"labels": ",".join(f"{label}={value}" for label, value in labels),
+             "count": histogram.count,
+             "avg": histogram.sum / histogram.count if histogram.count else 0.0,
+             "p50": histogram.quantile(0.5),
+             "p95": histogram.quantile(0.95),
+             "max": histogram.max}
+            for labels, histogram in series]
+
+
+def get_counter_values(name: str) -> Dict[str, float]:
+    """
+    :param name: 'tbot_upstream_requests_total'
+    :return: {'host=api.privatbank.ua,status=200': 12, ...}
+    """
+    return {",".join(f"{label}={value}" for label, value in labels): value
+            for labels, value in _series[name].items()}
+
+
+__all__ = ["observe",
+           "inc",
+           "render_metrics",
+           "start_metrics",
+           "stop_metrics",
+           "get_histogram_summary",
+           "get_counter_values"]
@@ -0,0 +1,133 @@
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from .metrics import observe
+from .send_queue import send_message
+
+
+# Default throttling params (can be overridden from data.yaml "access" section):
+# Every user gets `burst` updates at once and then `rate` updates per second:
+THROTTLE_RATE = 1.0
+THROTTLE_BURST = 5
+THROTTLE_NOTICE = "Too many requests, slow down a bit"
+
+
+def update_sender_id(update: types.Update) -> Optional[int]:
+    """
+    :param update: <class 'aiogram.types.update.Update'>
+    :return: 123456789 | chat id for messages, user id for other updates | None
+    """
+    for message in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if message:
+            return message.chat.id
+    for event in (update.callback_query, update.inline_query, update.chosen_inline_result,
+                  update.shipping_query, update.pre_checkout_query, update.my_chat_member, update.chat_member):
+        if event and event.from_user:
+            return event.from_user.id
+    return None
+
+
+class AccessMiddleware(BaseMiddleware):
+    """
+    Drop updates from non-admin chats before handlers matching and FSM state lookup,
+    then limit admins with per-user token bucket
+    """
+
+    def __init__(self, admins_ids: Iterable[int], rate: float = THROTTLE_RATE, burst: int = THROTTLE_BURST,
+                 notice: str = THROTTLE_NOTICE):
+        """
+        :param admins_ids: [123456789, 987654321]
+        :param rate: 1.0 | tokens added per second
+        :param burst: 5 | bucket size
+        :param notice: 'Too many requests...' | '' - throttled updates are dropped silently
+        """
+        super().__init__()
+        self.admins_ids = frozenset(admins_ids)
+        self.rate = rate
+        self.burst = burst
+        self.notice = notice
+        # user id -> (tokens, last refill time, notice was sent):
+        self._buckets: Dict[int, Tuple[float, float, bool]] = {}
+        self.counters = {"passed": 0, "rejected": 0, "throttled": 0}
+
+    def _take_token(self, user_id: int) -> Tuple[bool, bool]:
+        """
+        :return: (update is allowed, throttling notice has to be sent)
+        """
+        now = time.monotonic()
+        tokens, refilled_at, notified = self._buckets.get(user_id, (self.burst, now, False))
+        tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+        if tokens >= 1:
+            self._buckets[user_id] = (tokens - 1, now, False)
+            return True, False
+        self._buckets[user_id] = (tokens, now, True)
+        return False, not notified
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        sender_id = update_sender_id(update)
+        if sender_id not in self.admins_ids:
+            self.counters["rejected"] += 1
+            raise CancelHandler()
+
+        allowed, send_notice = self._take_token(sender_id)
+        if not allowed:
+            self.counters["throttled"] += 1
+            logging.warning(f"update {update.update_id} from {sender_id} is throttled")
+            if send_notice and self.notice and update.message:
+                # Notice is sent within the same chat limits as the other bot messages:
+                try:
+                    await send_message(sender_id, self.notice)
+                except Exception as e:
+                    logging.warning(f"throttle notice to {sender_id} isn't sent: {e}")
+            raise CancelHandler()
+        self.counters["passed"] += 1
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Measure message handling time per command. Dispatch time (FSM state lookup and filters) is recorded
+    separately, upstream requests and renders inside the handler have their own metrics
+    """
+
+    @staticmethod
+    def command_label(message: types.Message, data: dict) -> str:
+        """
+        :return: '/weather' | 'StatesWeather:question_of_city' - answer to the bot question | 'location'
+        """
+        if message.is_command():
+            return f"/{message.get_command(pure=True)}"
+        return data.get("raw_state") or message.content_type
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        data["metrics_started_at"] = time.monotonic()
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        data["metrics_command"] = self.command_label(message, data)
+        observe("tbot_command_dispatch_seconds", time.monotonic() - data["metrics_started_at"],
+                command=data["metrics_command"])
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        started_at = data.get("metrics_started_at")
+        if started_at is None:
+            return
+        observe("tbot_command_duration_seconds", time.monotonic() - started_at,
+                command=data.get("metrics_command", "unmatched"))
+
+
+def get_access_stats(dp) -> Dict[str, int]:
+    """
+    :param dp: <class 'aiogram.dispatcher.dispatcher.Dispatcher'>
+    :return: {'passed': 120, 'rejected': 3, 'throttled': 0} | {} - middleware isn't installed
+    """
+    for middleware in dp.middleware.applications:
+        if isinstance(middleware, AccessMiddleware):
+            return dict(middleware.counters)
+    return {}
+
+
+__all__ = ["AccessMiddleware",
+           "MetricsMiddleware",
+           "get_access_stats"]
@@ -1,14 +1,33 @@
+import asyncio
 import datetime
 import calendar
 import collections
+import logging
+import math
 import os.path
-from reportlab.lib import pagesizes
+import tempfile
+import threading
 from contextlib import contextmanager
-from reportlab.pdfgen.canvas import Canvas
-from pdf2image import convert_from_path
-from PIL import Image, ImageDraw, ImageFont
+from functools import partial
+from PIL import Image, ImageDraw, ImageOps
 from dateutil import relativedelta
 from pprint import pprint
+from .assets import get_template, get_font, get_moon_icon, MOON_PHASE_ICONS
+from .render_executor import run_render, run_render_in, batch_render_pool
+from .moon_phase import CENTURY_CORRECTION, FIRST_CENTURY, LAST_CENTURY, PHASE_NAMES, month_phases
+from .calendar_cache import calendar_key, get_cached_calendar, is_calendar_cached, new_calendar_tmp_path, \
+    store_calendar
+
+# reportlab and pdf2image (poppler) are needed for the "pdf" renderer only:
+try:
+    from reportlab.lib import pagesizes
+    from reportlab.pdfgen.canvas import Canvas
+    from pdf2image import convert_from_path
+    from pdf2image.exceptions import PDFInfoNotInstalledError, PopplerNotInstalledError
+    POPPLER_MISSING_ERRORS = (PDFInfoNotInstalledError, PopplerNotInstalledError)
+except ImportError:
+    pagesizes = Canvas = convert_from_path = None
+    POPPLER_MISSING_ERRORS = ()
 
 
 # Calendar dates names:
@@ -78,6 +97,68 @@ calendar_coordinates = {
     "46": (1012, 794),
 }
 
+# Calendar renderers: "pil" - direct raster drawing, "pdf" - reportlab -> PDF -> poppler -> PNG
+CALENDAR_RENDERER = "pil"
+# Moon phase engines: "conway" - Conway's approximation (+-1 day), "meeus" - true new/full moon instants
+PHASE_ENGINE = "conway"
+# Increase renderer version after every change of its picture, old calendars in the cache won't be used:
+RENDERER_VERSIONS = {"pil": 1, "pdf": 1}
+HEMISPHERE = "north"
+FIRST_WEEKDAY = calendar.MONDAY
+# Background pre-render: current month + next PRERENDER_MONTHS months, checked every PRERENDER_INTERVAL seconds:
+PRERENDER_MONTHS = 1
+PRERENDER_INTERVAL = 3600
+# Month grid skeletons (header + cells + day numbers) in memory, ~3.3 MB each.
+# One renderer and first weekday have 28 layouts: the 1st on one of 7 weekdays x 28-31 days in month:
+SKELETON_CACHE_SIZE = 7 * 4
+# Year mosaic: 4 x 3 months, every month is scaled down:
+MOSAIC_COLUMNS = 4
+MOSAIC_SCALE = 0.5
+# Calendar file can be evicted by concurrent renders before it's read, then it's rendered again:
+READ_ATTEMPTS = 3
+# Calendars are available for the years of Conway's century correction table:
+FIRST_YEAR = FIRST_CENTURY * 100
+LAST_YEAR = LAST_CENTURY * 100 + 99
+
+# Calendar key -> render task, shared between all requests of the same calendar while it isn't ready:
+_renders_inflight = {}
+_render_stats = {"renders": 0, "joined": 0}
+# (renderer, weekday of the 1st, days in month, first weekday) -> skeleton, the oldest used is first.
+# Render pool threads share it:
+_skeletons = collections.OrderedDict()
+_skeletons_lock = threading.Lock()
+_skeleton_stats = {"hits": 0, "misses": 0}
+
+
+def _reset_skeletons_lock():
+    # Forked batch render worker: a render thread of the parent could hold the lock at fork moment:
+    global _skeletons_lock
+    _skeletons_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_skeletons_lock)
+
+
+class UnsupportedYear(ValueError):
+    """
+    Requested year is out of FIRST_YEAR-LAST_YEAR
+    """
+
+
+class PdfRendererUnavailable(RuntimeError):
+    """
+    Packages or poppler-utils for the "pdf" renderer are not installed, message is the fix
+    """
+
+
+# "pil" renderer geometry, it repeats A6 landscape PDF page rasterized by poppler with 200 DPI:
+RASTER_DPI = 200
+PAGE_SIZE = Size(148 / 25.4 * 72, 105 / 25.4 * 72)  # points, the same as pagesizes.landscape(pagesizes.A6)
+RASTER_SIZE = Size(math.ceil(PAGE_SIZE.width * RASTER_DPI / 72), math.ceil(PAGE_SIZE.height * RASTER_DPI / 72))
+ORDINALS_FONT = "images/fonts/Spartan/static/Spartan-Regular.ttf"
+MOON_ICON_SIZE = 96
+
 
 @contextmanager
 def save_state(canvas):
@@ -87,7 +168,7 @@ def save_state(canvas):
     canvas.restoreState()
 
 
-async def add_calendar_page(canvas, rect, datetime_obj, cell_cb, first_weekday=calendar.SUNDAY):
+def add_calendar_page(canvas, rect, datetime_obj, cell_cb, first_weekday=calendar.SUNDAY):
     """Create a one-month pdf calendar, and return the canvas
 
     @param rect: A C{Geom} or 4-item iterable of floats defining the shape of
@@ -102,8 +183,8 @@ async def add_calendar_page(canvas, rect, datetime_obj, cell_cb, first_weekday=c
     @type rect: C{Geom}
     @type cell_cb: C{function(Canvas, int, Geom, Font)}
     """
-    calendar.setfirstweekday(first_weekday)
-    cal = calendar.monthcalendar(datetime_obj.year, datetime_obj.month)
+    # Own Calendar object, calendar.setfirstweekday() is global for all render threads:
+    cal = calendar.Calendar(first_weekday).monthdayscalendar(datetime_obj.year, datetime_obj.month)
     rect = Geom(*rect)
 
     # set up constants
@@ -178,7 +259,7 @@ def draw_cell(canvas, day, rect, font, scale_factor):
                       ordinal_str)
 
 
-async def generate_pdf(datetime_obj, outfile, size, first_weekday=calendar.MONDAY):
+def generate_pdf(datetime_obj, outfile, size, first_weekday=calendar.MONDAY):
     """Helper to apply add_calendar_page to save a ready-to-print file to disk.
 
     @param datetime_obj: A Python C{datetime} object specifying the month
@@ -196,75 +277,267 @@ async def generate_pdf(datetime_obj, outfile, size, first_weekday=calendar.MONDA
     wmar, hmar = size.width / 50, size.height / 50
     size = Size(size.width - (2 * wmar), size.height - (2 * hmar))
 
-    data = await add_calendar_page(canvas,
-                                   Geom(wmar, hmar, size.width, size.height),
-                                   datetime_obj,
-                                   draw_cell,
-                                   first_weekday)
+    data = add_calendar_page(canvas,
+                             Geom(wmar, hmar, size.width, size.height),
+                             datetime_obj,
+                             draw_cell,
+                             first_weekday)
     data.save()
 
 
-async def pdf_to_png_converter(pdf_file="calendar.pdf", png_file="calendar.png"):
+def pdf_to_png_converter(pdf_file="calendar.pdf"):
+    """
+    Rasterize the first PDF page with poppler
+
+    :param pdf_file: "/home/stastodd/projects/telegram-bot/images/out/calendar.pdf"
+    :return: <class 'PIL.PpmImagePlugin.PpmImageFile'> | calendar body in memory
+    :raise PdfRendererUnavailable: poppler-utils are not installed
+    """
     try:
         pil_image_lst = convert_from_path(pdf_file)  # This returns a list even for a 1 page pdf
-    except Exception as e:
-        print(e)
-        print(f"ERROR: sudo apt install poppler-utils")
-        raise
-    pil_obj = pil_image_lst[0]
-    pil_obj.save(png_file, "PNG")
+    except POPPLER_MISSING_ERRORS as e:
+        logging.error(f"poppler is not available for the 'pdf' calendar renderer: {e}")
+        raise PdfRendererUnavailable("sudo apt install poppler-utils") from e
+    return pil_image_lst[0]
 
 
-async def concatenate_two_png(img1, img2):
+def concatenate_two_png(img1, img2):
     """
-    Concatenate two files moon_calendar_exp.png + calendar.png to single one
+    Concatenate two images moon_calendar_exp.png + calendar body to single one
 
-    :param img1: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/background_template/moon_calendar_exp.png"
-    :param img2: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/out/calendar.png"
+    :param img1: "moon_calendar_exp.png" | template name in the assets registry
+    :param img2: <class 'PIL.Image.Image'> | calendar body in memory
+    :return: <class 'PIL.Image.Image'> | new RGB image with head and body
     """
-    img1_obj = Image.open(img1)  # expander (head)
-    img2_obj = Image.open(img2)  # main (body)
-    pil_obj = Image.new('RGB', (img1_obj.width, img1_obj.height + img2_obj.height))
+    img1_obj = get_template(img1)  # expander (head)
+    pil_obj = Image.new('RGB', (img1_obj.width, img1_obj.height + img2.height))
     pil_obj.paste(img1_obj, (0, 0))
-    pil_obj.paste(img2_obj, (0, img1_obj.height))
-    pil_obj.save(img2)
+    pil_obj.paste(img2, (0, img1_obj.height))
+    return pil_obj
 
 
-async def write_calendar_attributes(file, year, month, font, hemisphere="north"):
+def write_calendar_attributes(img_obj, year, month, hemisphere="north"):
     """
-    Add on the calendar.png text (year + month)
+    Add on the calendar image text (year + month)
 
-    :param file: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/out/calendar.png"
+    :param img_obj: <class 'PIL.Image.Image'> | calendar in memory, it's changed in place
     :param year: 2023
     :param month: June
-    :param font: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/fonts/Spartan/static/Spartan-SemiBold.ttf"
     :param hemisphere: "north" | "south"
     """
     font_size = 60
-    font_obj = ImageFont.truetype(font, size=font_size)
-    img_obj = Image.open(file)
+    font_obj = get_font(font_size)
     img_draw_obj = ImageDraw.Draw(img_obj)
     (x, y) = (40, 25)
     text_color = "rgb(60, 42, 33)"
     img_draw_obj.text((x, y), f"{year}, {month} [{hemisphere}]", fill=text_color, font=font_obj)
-    img_obj.save(file)
 
 
-async def add_layer_into_calendar(calendar_file, new_layer, coordinates):
+def add_layer_into_calendar(calendar_img, new_layer, coordinates):
     """
     Write new layer png images to the calendar image
 
-    :param calendar_file: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/out/calendar.png"
-    :param new_layer: "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/moon/first_quarter_moon/icons8-first-quarter-moon-96.png"
+    :param calendar_img: <class 'PIL.Image.Image'> | calendar in memory, it's changed in place
+    :param new_layer: <class 'PIL.PngImagePlugin.PngImageFile'> | decoded moon icon from the assets registry
     :param coordinates: (58, 160)
     """
-    img1 = Image.open(calendar_file)
-    img2 = Image.open(new_layer)
-    img1.paste(img2, coordinates, img2)
-    img1.save(calendar_file)
+    calendar_img.paste(new_layer, coordinates, new_layer)
+
+
+def raster_grid_geometry(rows):
+    """
+    Cells geometry of the "pil" renderer body, the same as add_calendar_page() + draw_cell() make in the PDF
+
+    @param rows: Count of weeks in the month (4-6).
+    @return: (Geom of the top-left cell in pixels, Font in pixels, line width in pixels)
+    """
+    scale = RASTER_DPI / 72
+    wmar, hmar = PAGE_SIZE.width / 50, PAGE_SIZE.height / 50
+    size = Size(PAGE_SIZE.width - (2 * wmar), PAGE_SIZE.height - (2 * hmar))
+    scale_factor = min(size.width, size.height)
+    line_width = scale_factor * 0.0025
+    font = Font(ORDINALS_FONT, scale_factor * 0.028 * scale)
+    cell = Geom(x=(wmar + line_width) * scale,
+                y=(hmar + line_width) * scale,
+                width=(size.width - line_width * 2) / 7 * scale,
+                height=(size.height - line_width * 2) / rows * scale)
+    return cell, font, line_width * scale
+
+
+def month_cells(year, month, first_weekday=calendar.MONDAY):
+    """
+    Map every day of the month to the grid cell
+
+    @return: {1: (0, 2), 2: (0, 3), ... 30: (4, 1)} - day: (row, column)
+    """
+    weeks = calendar.Calendar(first_weekday).monthdayscalendar(year, month)
+    return {day: (row, col) for row, week in enumerate(weeks) for col, day in enumerate(week) if day}
+
+
+def moon_icon_coordinates(cells, header_height):
+    """
+    Moon icons positions on the calendar with header. Five-week months use calendar_coordinates,
+    other months get the same cell offsets recalculated for their row height.
+
+    @param cells: month_cells() result.
+    @param header_height: Height of the moon_calendar_exp.png expander in pixels.
+    @return: {1: (376, 160), 2: (535, 160), ...}
+    """
+    rows = max(row for row, _ in cells.values()) + 1
+    if rows == 5:
+        return {day: calendar_coordinates[f"{row}{col}"] for day, (row, col) in cells.items()}
+    cell, _, _ = raster_grid_geometry(rows)
+    five_rows_cell, _, _ = raster_grid_geometry(5)
+    offset_y = calendar_coordinates["00"][1] - header_height - five_rows_cell.y
+    offset_y = min(offset_y, cell.height - MOON_ICON_SIZE - 2)
+    return {day: (calendar_coordinates[f"0{col}"][0], round(header_height + cell.y + row * cell.height + offset_y))
+            for day, (row, col) in cells.items()}
+
+
+def month_layout(work_datetime, first_weekday=calendar.MONDAY):
+    """
+    Only 28 grids exist for one first weekday: the 1st is on one of 7 weekdays, month has 28, 29, 30 or 31 days
+
+    @return: (5, 30, 0) - (weekday of the 1st, days in month, first weekday)
+    """
+    first_day_weekday, days = calendar.monthrange(work_datetime.year, work_datetime.month)
+    return first_day_weekday, days, first_weekday
+
+
+def calendar_skeleton(work_datetime, first_weekday=calendar.MONDAY, renderer="pil", calendar_pdf_path=None):
+    """
+    Header + grid of the month layout, it's drawn once per layout and then copied
+
+    @param work_datetime: datetime.date(2024, 6, 1)
+    @param renderer: "pil" | "pdf" - grid is drawn by PIL or rasterized from reportlab PDF
+    @param calendar_pdf_path: "/tmp/calendar.pdf" | None - own scratch directory, "pdf" renderer only
+    @return: copy of the skeleton, it can be changed by the caller
+    """
+    key = (renderer,) + month_layout(work_datetime, first_weekday)
+    with _skeletons_lock:
+        skeleton = _skeletons.get(key)
+        if skeleton is not None:
+            _skeletons.move_to_end(key)
+            _skeleton_stats["hits"] += 1
+            return skeleton.copy()
+        _skeleton_stats["misses"] += 1
+
+    if renderer == "pdf":
+        calendar_body = pdf_calendar_body(work_datetime, first_weekday, calendar_pdf_path)
+    else:
+        calendar_body = draw_calendar_grid(work_datetime, first_weekday)
+    skeleton = concatenate_two_png("moon_calendar_exp.png", calendar_body)
+
+    with _skeletons_lock:
+        _skeletons[key] = skeleton
+        while len(_skeletons) > SKELETON_CACHE_SIZE:
+            _skeletons.popitem(last=False)
+    return skeleton.copy()
+
+
+def clear_calendar_skeletons():
+    """
+    Forget all skeletons, for example after moon_calendar_exp.png change
+    """
+    with _skeletons_lock:
+        _skeletons.clear()
+
+
+def get_skeleton_stats():
+    """
+    :return: {'size': 3, 'max_size': 14, 'hits': 20, 'misses': 3}
+    """
+    return {"size": len(_skeletons), "max_size": SKELETON_CACHE_SIZE, **_skeleton_stats}
+
+
+def pdf_calendar_body(work_datetime, first_weekday=calendar.MONDAY, calendar_pdf_path=None):
+    """
+    reportlab -> PDF -> poppler calendar body
+
+    @param calendar_pdf_path: "/tmp/calendar.pdf" | None - own scratch directory for this render
+    @return: <class 'PIL.PpmImagePlugin.PpmImageFile'>
+    """
+    if calendar_pdf_path is None:
+        # Concurrent renders never share the intermediate PDF:
+        with tempfile.TemporaryDirectory(prefix="calendar-") as scratch_dir:
+            return pdf_calendar_body(work_datetime, first_weekday, os.path.join(scratch_dir, "calendar.pdf"))
+    generate_pdf(work_datetime, calendar_pdf_path, pagesizes.landscape(pagesizes.A6), first_weekday)
+    return pdf_to_png_converter(pdf_file=calendar_pdf_path)
+
+
+def draw_calendar_grid(work_datetime, first_weekday=calendar.MONDAY):
+    """
+    Draw calendar body (cells borders + day numbers) without PDF
+
+    @param work_datetime: datetime.date(2024, 6, 1)
+    @return: RGB image RASTER_SIZE
+    """
+    cells = month_cells(work_datetime.year, work_datetime.month, first_weekday)
+    rows = max(row for row, _ in cells.values()) + 1
+    cell, font, line_width = raster_grid_geometry(rows)
+    font_obj = get_font(round(font.size), font.name)
+    margin = Size(font.size * 0.5, font.size * 1.3)
+
+    image = Image.new("RGB", RASTER_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for day, (row, col) in cells.items():
+        x = cell.x + cell.width * col
+        y = cell.y + cell.height * row
+        draw.rectangle((round(x), round(y), round(x + cell.width), round(y + cell.height)),
+                       outline="black", width=max(1, round(line_width)))
+        text_x = x + margin.width
+        text_y = y + margin.height
+        day_str = str(day)
+        draw.text((text_x, text_y), day_str, fill="black", font=font_obj, anchor="ls")
+        # Lifted ordinal number suffix:
+        draw.text((text_x + draw.textlength(day_str, font=font_obj), text_y - margin.height * 0.1),
+                  ORDINALS.get(day, ORDINALS[None]), fill="black", font=font_obj, anchor="ls")
+    return image
+
+
+def moon_icons(hemisphere="north"):
+    """
+    @param hemisphere: "north" | "south" - the Moon is seen mirrored from the southern hemisphere
+    @return: {"Full moon": <PIL.Image.Image>, ...}
+    """
+    icons = {phase_name: get_moon_icon(phase_name) for phase_name in MOON_PHASE_ICONS}
+    if hemisphere == "south":
+        icons = {phase_name: ImageOps.mirror(icon) for phase_name, icon in icons.items()}
+    return icons
+
+
+def render_calendar_image(work_datetime, first_weekday=calendar.MONDAY, hemisphere="north", engine=PHASE_ENGINE):
+    """
+    "pil" renderer: header, grid, title and moon icons are drawn into one in-memory image
+
+    @param work_datetime: datetime.date(2024, 6, 1)
+    @param hemisphere: "north" | "south"
+    @param engine: "conway" | "meeus" - moon phase engine
+    @return: RGB image with the whole calendar
+    """
+    image = calendar_skeleton(work_datetime, first_weekday)
+    write_calendar_attributes(image, work_datetime.year, work_datetime.strftime("%B"), hemisphere)
+    calendar_creator(image, work_datetime, first_weekday, engine=engine, moon_phases_img=moon_icons(hemisphere))
+    return image
+
+
+def render_calendar_pil(work_datetime, calendar_path_filename, engine=PHASE_ENGINE, first_weekday=calendar.MONDAY,
+                        hemisphere="north"):
+    """
+    Render calendar with the "pil" renderer and save it to the PNG file
+
+    :param work_datetime: datetime.date(2024, 6, 1)
+    :param calendar_path_filename: "images/out/calendars/2024_06_north_w0_pil1_conway.3f2b9c....tmp"
+    :param engine: "conway" | "meeus"
+    :param first_weekday: calendar.MONDAY
+    :param hemisphere: "north" | "south"
+    :return: calendar_path_filename
+    """
+    render_calendar_image(work_datetime, first_weekday, hemisphere, engine).save(calendar_path_filename, "PNG")
+    return calendar_path_filename
 
 
-async def moonphase(work_datetime, do_print=False):
+def moonphase(work_datetime, do_print=False):
     __doc__ = """
     Using calculator from
 
@@ -306,10 +579,7 @@ async def moonphase(work_datetime, do_print=False):
     # algorithm that handles the different corrections between
     # centuries 17|23|29, 20|26, 21|27, and 24|30.
     try:
-        c = {17: 7,
-             18: 1, 19: -4, 20: -8, 21: 16, 22: 11, 23: 6,
-             24: 1, 25: -4, 26: -9, 27: 15, 28: 11, 29: 6,
-             30: 0}[h]
+        c = CENTURY_CORRECTION[h]
     except KeyError:
         print(f"No century correction available for {h}00-{h}99")
         return
@@ -419,127 +689,333 @@ async def moonphase(work_datetime, do_print=False):
     return phase
 
 
-async def get_moonphase_image(moonphase_number, **kwargs):
+def get_moonphase_image(moonphase_number, **kwargs):
     """
     :param moonphase_number: int() | 2
-    :return: str() | "/home/stastodd/projects/Raspberrypi4_projects/telegram-bot/images/moon/new_moon.png"
-    """
-    # Moon phases ranges:
-    moon_phases = {
-        "New moon after": list(range(2)),
-        "Waxing crescent": list(range(2, 7)),
-        "First quarter": list(range(7, 9)),
-        "Waxing gibbous": list(range(9, 14)),
-        "Full moon": list(range(14, 16)),
-        "Waning gibbous": list(range(16, 22)),
-        "Last quarter": list(range(22, 24)),
-        "Waning crescent": list(range(24, 29)),
-        "New moon before": list(range(29, 31)),
-    }
-
+    :return: <class 'PIL.PngImagePlugin.PngImageFile'> | decoded "images/moon/new_moon.png"
+    """
     moon_phases_img = kwargs.get("moon_phases_img")
 
-    moon_phase_name = str()
-    for phase_name, phase_range in moon_phases.items():
-        if moonphase_number in phase_range:
-            moon_phase_name = phase_name
-            break
-    return moon_phases_img.get(moon_phase_name, str())
+    # Moon phases ranges are precomputed in PHASE_NAMES, age is the index:
+    if moonphase_number is None or not 0 <= moonphase_number < len(PHASE_NAMES):
+        return None
+    return moon_phases_img.get(PHASE_NAMES[moonphase_number])
 
 
-async def calendar_creator(calendar_path_filename, work_datetime, **kwargs):
-    # calendar_path = params.get("calendar_path", "~/")
-    # calendar_png_filename = f"{calendar_path}calendar.png"
+def calendar_creator(calendar_img, work_datetime, first_weekday=calendar.MONDAY, engine=PHASE_ENGINE, **kwargs):
+    """
+    Paste moon phase icon into every day cell
 
-    # work_datetime = params.get("datetime", datetime.datetime.now())
+    :param calendar_img: <class 'PIL.Image.Image'> | calendar with header in memory, it's changed in place
+    :param work_datetime: datetime.date(2024, 6, 1)
+    :param first_weekday: calendar.MONDAY
+    :param engine: "conway" | "meeus" - moon phase engine
+    :param kwargs: moon_phases_img={"Full moon": <PIL.PngImagePlugin.PngImageFile>, ...}
+    """
     work_datetime_year = work_datetime.year
     work_datetime_month = work_datetime.month
-    num_days = calendar.monthrange(work_datetime_year, work_datetime_month)[1]  # 31
-    all_days_objects = [datetime.date(work_datetime_year, work_datetime_month, day) for day in range(1, num_days + 1)]
+    header_height = get_template("moon_calendar_exp.png").height
+
+    # Day -> icon position, computed once for the whole month:
+    cells = month_cells(work_datetime_year, work_datetime_month, first_weekday)
+    """
+    cells =
+    {1: (0, 2), 2: (0, 3), 3: (0, 4), 4: (0, 5), 5: (0, 6),
+     6: (1, 0), ...
+     30: (4, 1)}
+    """
+    # Moon age for all days of the month in one pass:
+    phases = month_phases(work_datetime_year, work_datetime_month, engine)
+    for day, coordinates in moon_icon_coordinates(cells, header_height).items():
+        moon_image = get_moonphase_image(phases[day - 1], **kwargs)
+        add_layer_into_calendar(calendar_img, moon_image, coordinates)
 
-    dates = calendar.monthcalendar(work_datetime_year, work_datetime_month)
+
+def render_calendar(work_datetime, calendar_path_filename, calendar_pdf_path=None, engine=PHASE_ENGINE,
+                    first_weekday=calendar.MONDAY, hemisphere="north"):
     """
-    dates = 
-    [[0, 0, 1, 2, 3, 4, 5],
-     [6, 7, 8, 9, 10, 11, 12],
-     [13, 14, 15, 16, 17, 18, 19],
-     [20, 21, 22, 23, 24, 25, 26],
-     [27, 28, 29, 30, 0, 0, 0]]
+    "pdf" renderer: whole CPU-bound calendar pipeline, it is executed in the render pool
+
+    :param work_datetime: datetime.date(2024, 6, 1)
+    :param calendar_path_filename: "images/out/calendars/2024_06_north_w0_pdf1_conway.3f2b9c....tmp"
+    :param calendar_pdf_path: "/tmp/calendar.pdf" | None - own scratch directory for this render
+    :param engine: "conway" | "meeus"
+    :param first_weekday: calendar.MONDAY
+    :param hemisphere: "north" | "south"
+    :return: calendar_path_filename
+    :raise PdfRendererUnavailable: reportlab, pdf2image or poppler-utils are not installed
     """
+    if Canvas is None or convert_from_path is None:
+        raise PdfRendererUnavailable("pip install reportlab pdf2image")
+
+    # Moon phases images, decoded once in the assets registry:
+    moon_phases_img = moon_icons(hemisphere)
+
+    # Header + body from PDF, PDF is created and rasterized only once for every month layout:
+    calendar_img = calendar_skeleton(work_datetime, first_weekday, "pdf", calendar_pdf_path)
+
+    # Write year and month names on calendar:
+    datetime_month_name = work_datetime.strftime("%B")  # June
+    datetime_year_number = work_datetime.year  # 2024
+    write_calendar_attributes(calendar_img, datetime_year_number, datetime_month_name, hemisphere)
+
+    # Write moon data on the calendar:
+    calendar_creator(calendar_img, work_datetime, first_weekday, engine=engine, moon_phases_img=moon_phases_img)
+
+    # Single PNG encode at the end:
+    calendar_img.save(calendar_path_filename, "PNG")
+    return calendar_path_filename
 
-    for day_obj in all_days_objects:
-        day_obj_moonphase_number = await moonphase(day_obj, do_print=False)
-        moon_image = await get_moonphase_image(day_obj_moonphase_number, **kwargs)
 
-        for line_number, line_days in enumerate(dates):
-            if day_obj.day in line_days:
-                day_weekday = day_obj.weekday()  # 0 - 6
-                await add_layer_into_calendar(calendar_path_filename, moon_image, calendar_coordinates[f"{line_number}{day_weekday}"])
-                break
+def _check_year(year):
+    if not FIRST_YEAR <= year <= LAST_YEAR:
+        raise UnsupportedYear(f"Moon calendar is available for years {FIRST_YEAR}-{LAST_YEAR} only")
 
 
-async def main(requested_datetime):
+def requested_month(requested_datetime):
     """
     :param requested_datetime: '/this_month' | '/next_month' | '2024-1'
+    :return: datetime.date(2024, 1, 1) | today's month for unknown text
+    :raise UnsupportedYear: '1500-1'
     """
-    kwargs = dict()
-
-    # Check and requested_datetime argument:
+    today = datetime.date.today().replace(day=1)
     if requested_datetime == "/this_month":
-        work_datetime = datetime.date.today()
-    elif requested_datetime == "/next_month":
-        work_datetime = datetime.date.today() + relativedelta.relativedelta(months=1)
+        return today
+    if requested_datetime == "/next_month":
+        return today + relativedelta.relativedelta(months=1)
+    try:
+        year_month = requested_datetime.split("-")  # ['2024', '1']
+        work_datetime = datetime.date(int(year_month[0]), int(year_month[1]), 1)
+    except Exception:
+        return today
+    _check_year(work_datetime.year)
+    return work_datetime
+
+
+def month_calendar_key(work_datetime, renderer=CALENDAR_RENDERER, engine=PHASE_ENGINE, hemisphere=HEMISPHERE,
+                       first_weekday=FIRST_WEEKDAY):
+    """
+    :return: '2024_06_north_w0_pil1_conway' | calendar cache key
+    """
+    return calendar_key(work_datetime.year, work_datetime.month, hemisphere, first_weekday,
+                        renderer, RENDERER_VERSIONS[renderer], engine)
+
+
+async def render_month(work_datetime, renderer=CALENDAR_RENDERER, engine=PHASE_ENGINE, hemisphere=HEMISPHERE,
+                       first_weekday=FIRST_WEEKDAY, pool=None):
+    """
+    Render calendar in the pool and move it into the calendar cache.
+    Concurrent calls for the same calendar wait for one shared render.
+
+    :param work_datetime: datetime.date(2024, 6, 1)
+    :param pool: batch_render_pool() result | None - shared render pool
+    :return: "images/out/calendars/2024_06_north_w0_pil1_conway.png"
+    """
+    key = month_calendar_key(work_datetime, renderer, engine, hemisphere, first_weekday)
+    render = _renders_inflight.get(key)
+    if render is None:
+        render = asyncio.ensure_future(_render_to_cache(key, work_datetime, renderer, engine, hemisphere,
+                                                        first_weekday, pool))
+        _renders_inflight[key] = render
+        render.add_done_callback(lambda _: _renders_inflight.pop(key, None))
     else:
-        try:
-            year_month = requested_datetime.split("-")  # ['2024', '1']
-            work_datetime = datetime.datetime(int(year_month[0]), int(year_month[1]), 1)
-        except Exception:
-            work_datetime = datetime.date.today()
-
-    # TODO: move path to the external config file
-    # Handle new calendar params:
-    calendar_pdf_filename = "calendar.pdf"
-    calendar_path = "/home/stastodd/projects/telegram-bot/images/out/"
-    calendar_png_expander = "/home/stastodd/projects/telegram-bot/images/background_template/moon_calendar_exp.png"
-    text_font = "/home/stastodd/projects/telegram-bot/images/fonts/Spartan/static/Spartan-SemiBold.ttf"
-
-    # TODO: move path to the external config file
-    # Moon phases images:
-    moon_phases_img = {
-        "New moon after": "/home/stastodd/projects/telegram-bot/images/moon/new_moon.png",
-        "Waxing crescent": "/home/stastodd/projects/telegram-bot/images/moon/waxing_crescent_moon.png",
-        "First quarter": "/home/stastodd/projects/telegram-bot/images/moon/first_quarter_moon.png",
-        "Waxing gibbous": "/home/stastodd/projects/telegram-bot/images/moon/waxing_gibbous_moon.png",
-        "Full moon": "/home/stastodd/projects/telegram-bot/images/moon/full_moon.png",
-        "Waning gibbous": "/home/stastodd/projects/telegram-bot/images/moon/waning_gibbous_moon.png",
-        "Last quarter": "/home/stastodd/projects/telegram-bot/images/moon/last_quarter_moon.png",
-        "Waning crescent": "/home/stastodd/projects/telegram-bot/images/moon/waning_crescent_moon.png",
-        "New moon before": "/home/stastodd/projects/telegram-bot/images/moon/new_moon.png",
-    }
-    kwargs["moon_phases_img"] = moon_phases_img
+        _render_stats["joined"] += 1
+    # shield() - cancelled caller doesn't cancel render for the other callers:
+    return await asyncio.shield(render)
+
+
+async def _render_to_cache(key, work_datetime, renderer, engine, hemisphere, first_weekday, pool=None):
+    """
+    Render calendar into its own temporary file, then move it into the cache
+    """
+    _render_stats["renders"] += 1
+    tmp_path = new_calendar_tmp_path(key)
+    render = run_render if pool is None else partial(run_render_in, pool)
+    try:
+        # Render in the pool, event loop keeps serving other chats:
+        if renderer == "pdf":
+            await render(render_calendar, work_datetime, tmp_path, None, engine, first_weekday, hemisphere)
+        else:
+            await render(render_calendar_pil, work_datetime, tmp_path, engine, first_weekday, hemisphere)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return store_calendar(key, tmp_path)
+
+
+async def main(requested_datetime, renderer=CALENDAR_RENDERER, engine=PHASE_ENGINE, hemisphere=HEMISPHERE,
+               first_weekday=FIRST_WEEKDAY):
+    """
+    :param requested_datetime: '/this_month' | '/next_month' | '2024-1'
+    :param renderer: 'pil' | 'pdf'
+    :param engine: 'conway' | 'meeus'
+    :param hemisphere: 'north' | 'south'
+    :param first_weekday: 0 - Monday ... 6 - Sunday
+    :return: "images/out/calendars/2024_01_north_w0_pil1_conway.png"
+    """
+    work_datetime = requested_month(requested_datetime)
 
     # If calendar file exists, just return it:
-    calendar_path_filename = f"{calendar_path}{work_datetime.year}_{work_datetime.month}.png"
-    if os.path.exists(calendar_path_filename):
-        return calendar_path_filename
+    cached_path = get_cached_calendar(month_calendar_key(work_datetime, renderer, engine, hemisphere, first_weekday))
+    if cached_path:
+        return cached_path
+    return await render_month(work_datetime, renderer, engine, hemisphere, first_weekday)
 
-    # Create calendar.pdf:
-    await generate_pdf(work_datetime,
-                       f"{calendar_path}{calendar_pdf_filename}",
-                       pagesizes.landscape(pagesizes.A6))
 
-    # Create calendar.png:
-    await pdf_to_png_converter(pdf_file=f"{calendar_path}{calendar_pdf_filename}", png_file=calendar_path_filename)
+async def read_month_calendar(requested_datetime, **kwargs):
+    """
+    main() result as bytes, calendar which was evicted before reading is rendered again
 
-    # Concatenate two png images (body + header) to single one:
-    await concatenate_two_png(calendar_png_expander, calendar_path_filename)
+    :param requested_datetime: '/this_month' | '/next_month' | '2024-1'
+    :param kwargs: renderer, engine, hemisphere, first_weekday - see main()
+    :return: b'\x89PNG...'
+    """
+    for attempt in range(1, READ_ATTEMPTS + 1):
+        calendar_path = await main(requested_datetime, **kwargs)
+        try:
+            with open(calendar_path, "rb") as calendar_file:
+                return calendar_file.read()
+        except FileNotFoundError:
+            if attempt == READ_ATTEMPTS:
+                raise
+            logging.info(f"calendar '{calendar_path}' was evicted before reading, it's rendered again")
 
-    # Write year and month names on calendar.png:
-    datetime_month_name = work_datetime.strftime("%B")  # June
-    datetime_year_number = work_datetime.year  # 2024
-    await write_calendar_attributes(calendar_path_filename, datetime_year_number, datetime_month_name, text_font)
 
-    # Write moon data on the png calendar:
-    await calendar_creator(calendar_path_filename, work_datetime, **kwargs)
+async def prerender_calendars(prerender_months=PRERENDER_MONTHS, prerender_interval=PRERENDER_INTERVAL,
+                              renderer=CALENDAR_RENDERER, engine=PHASE_ENGINE, hemisphere=HEMISPHERE,
+                              first_weekday=FIRST_WEEKDAY):
+    """
+    Endless loop: keep current and next months in the calendar cache, so /this_month and /next_month
+    are answered without render. Arguments are the data.yaml "moon_calendar" section.
 
-    return calendar_path_filename
+    :param prerender_months: 1 | count of months after the current one
+    :param prerender_interval: 3600 | seconds between checks
+    """
+    while True:
+        this_month = datetime.date.today().replace(day=1)
+        for offset in range(prerender_months + 1):
+            work_datetime = this_month + relativedelta.relativedelta(months=offset)
+            if is_calendar_cached(month_calendar_key(work_datetime, renderer, engine, hemisphere, first_weekday)):
+                continue
+            try:
+                await render_month(work_datetime, renderer, engine, hemisphere, first_weekday)
+                logging.info(f"calendar {work_datetime:%Y-%m} was pre-rendered")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"calendar {work_datetime:%Y-%m} pre-render failed: {e!r}")
+        await asyncio.sleep(prerender_interval)
+
+
+def requested_year(requested_datetime):
+    """
+    :param requested_datetime: '/this_year' | '/next_year' | '2024'
+    :return: 2024 | current year for unknown text
+    :raise UnsupportedYear: '1500'
+    """
+    this_year = datetime.date.today().year
+    if requested_datetime == "/this_year":
+        return this_year
+    if requested_datetime == "/next_year":
+        return this_year + 1
+    try:
+        year = int(requested_datetime.strip())
+    except (AttributeError, ValueError):
+        return this_year
+    _check_year(year)
+    return year
+
+
+def render_year_mosaic(calendar_paths, mosaic_path):
+    """
+    Join month calendars into one picture, MOSAIC_COLUMNS months in a row
+
+    :param calendar_paths: ["images/out/calendars/2024_01_north_w0_pil1_conway.png", ... ] | 12 files
+    :param mosaic_path: "images/out/calendars/2024_year_north_w0_pil1_conway.3f2b9c....tmp"
+    :return: mosaic_path
+    """
+    months = []
+    for path in calendar_paths:
+        with Image.open(path) as month_img:
+            months.append(month_img.convert("RGB").reduce(round(1 / MOSAIC_SCALE)))
+    cell_width = max(month_img.width for month_img in months)
+    cell_height = max(month_img.height for month_img in months)
+    rows = math.ceil(len(months) / MOSAIC_COLUMNS)
+    mosaic = Image.new("RGB", (cell_width * MOSAIC_COLUMNS, cell_height * rows), "white")
+    for number, month_img in enumerate(months):
+        mosaic.paste(month_img, (cell_width * (number % MOSAIC_COLUMNS), cell_height * (number // MOSAIC_COLUMNS)))
+    mosaic.save(mosaic_path, "PNG")
+    return mosaic_path
+
+
+async def year_main(requested_datetime, mosaic=False, renderer=CALENDAR_RENDERER, engine=PHASE_ENGINE,
+                    hemisphere=HEMISPHERE, first_weekday=FIRST_WEEKDAY, workers=None):
+    """
+    All months of the year, missing months are rendered in parallel in own process pool of the year,
+    shared render pool stays free for the other chats
+
+    :param requested_datetime: '/this_year' | '/next_year' | '2024'
+    :param mosaic: True - join months into one more picture
+    :param workers: 4 | None - CPU cores count, processes of the year pool
+    :return: (["images/out/calendars/2024_01_north_w0_pil1_conway.png", ... ],
+              "images/out/calendars/2024_year_north_w0_pil1_conway.png" | None)
+    """
+    year = requested_year(requested_datetime)
+    months = {month: get_cached_calendar(month_calendar_key(datetime.date(year, month, 1), renderer, engine,
+                                                            hemisphere, first_weekday))
+              for month in range(1, 13)}
+    key = calendar_key(year, None, hemisphere, first_weekday, renderer, RENDERER_VERSIONS[renderer], engine)
+    mosaic_path = get_cached_calendar(key) if mosaic else None
+    if all(months.values()) and (mosaic_path or not mosaic):
+        return list(months.values()), mosaic_path
+
+    async with batch_render_pool(min(workers or os.cpu_count() or 1, 12)) as pool:
+        async def month_calendar(month):
+            return months[month] or await render_month(datetime.date(year, month, 1), renderer, engine,
+                                                       hemisphere, first_weekday, pool)
+
+        calendar_paths = await asyncio.gather(*[month_calendar(month) for month in range(1, 13)])
+        if not mosaic or mosaic_path:
+            return calendar_paths, mosaic_path
+        tmp_path = new_calendar_tmp_path(key)
+        try:
+            await run_render_in(pool, render_year_mosaic, calendar_paths, tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return calendar_paths, store_calendar(key, tmp_path)
+
+
+async def read_year_calendars(requested_datetime, mosaic=False, **kwargs):
+    """
+    year_main() results as bytes, calendars which were evicted before reading are rendered again
+
+    :param requested_datetime: '/this_year' | '/next_year' | '2024'
+    :param mosaic: True - join months into one more picture
+    :param kwargs: renderer, engine, hemisphere, first_weekday - see year_main()
+    :return: ([b'\x89PNG...', ... ], b'\x89PNG...' | None) | 12 months and mosaic
+    """
+    for attempt in range(1, READ_ATTEMPTS + 1):
+        try:
+            calendar_paths, mosaic_path = await year_main(requested_datetime, mosaic, **kwargs)
+            months = []
+            for calendar_path in calendar_paths:
+                with open(calendar_path, "rb") as calendar_file:
+                    months.append(calendar_file.read())
+            if mosaic_path is None:
+                return months, None
+            with open(mosaic_path, "rb") as calendar_file:
+                return months, calendar_file.read()
+        except FileNotFoundError as e:
+            if attempt == READ_ATTEMPTS:
+                raise
+            logging.info(f"calendar '{e.filename}' was evicted before reading, year is collected again")
+
+
+def get_calendar_render_stats():
+    """
+    :return: {'renders': 3, 'joined': 9, 'inflight': 1} | joined - requests which waited for another one's render
+    """
+    return {**_render_stats, "inflight": len(_renders_inflight)}
@@ -0,0 +1,357 @@
+import datetime
+import calendar
+import functools
+import math
+from typing import List, Sequence, Tuple
+
+# NumPy is optional, without it the same arithmetic is executed for python lists:
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Conway's algorithm century correction, it is available for years 1700-3099:
+CENTURY_CORRECTION = {17: 7,
+                      18: 1, 19: -4, 20: -8, 21: 16, 22: 11, 23: 6,
+                      24: 1, 25: -4, 26: -9, 27: 15, 28: 11, 29: 6,
+                      30: 0}
+# NumPy call overhead is bigger than the whole python pass for short spans:
+NUMPY_MIN_DAYS = 180
+FIRST_CENTURY = min(CENTURY_CORRECTION)
+LAST_CENTURY = max(CENTURY_CORRECTION)
+
+# Moon age (0-30) -> phase name, the same ranges which get_moonphase_image() used:
+PHASE_NAMES = (("New moon after",) * 2 +
+               ("Waxing crescent",) * 5 +
+               ("First quarter",) * 2 +
+               ("Waxing gibbous",) * 5 +
+               ("Full moon",) * 2 +
+               ("Waning gibbous",) * 6 +
+               ("Last quarter",) * 2 +
+               ("Waning crescent",) * 5 +
+               ("New moon before",) * 2)
+
+
+def phase_name(phase: int) -> str:
+    """
+    :param phase: 15
+    :return: "Full moon"
+    """
+    return PHASE_NAMES[phase]
+
+
+def _check_years(first_year: int, last_year: int):
+    if first_year // 100 < FIRST_CENTURY or last_year // 100 > LAST_CENTURY:
+        raise ValueError(f"Conway moon phase is available for years {FIRST_CENTURY}00-{LAST_CENTURY}99 only")
+
+
+def _conway_numpy(start: datetime.date, end: datetime.date) -> Sequence[int]:
+    dates = numpy.arange(numpy.datetime64(start, "D"), numpy.datetime64(end, "D"))
+    month_starts = dates.astype("datetime64[M]")
+    years = dates.astype("datetime64[Y]").astype(int) + 1970
+    months = month_starts.astype(int) % 12 + 1
+    days = (dates - month_starts).astype(int) + 1
+
+    corrections = numpy.array([CENTURY_CORRECTION[century]
+                               for century in range(FIRST_CENTURY, LAST_CENTURY + 1)])
+    golden = (years % 100 + 9) % 19 - 9
+    century = corrections[years // 100 - FIRST_CENTURY]
+    january_february = numpy.where(months < 3, 2, 0)
+    return (months + january_february + days + golden * 11 + century + 30) % 30
+
+
+def _conway_python(start: datetime.date, end: datetime.date) -> List[int]:
+    result = []
+    # Corrections are the same for all days of one month, so they are computed once per month:
+    first = start.replace(day=1)
+    while first < end:
+        days_in_month = calendar.monthrange(first.year, first.month)[1]
+        golden = (first.year % 100 + 9) % 19 - 9
+        january_february = 2 if first.month < 3 else 0
+        month_correction = first.month + january_february + golden * 11 + CENTURY_CORRECTION[first.year // 100] + 30
+        first_day = start.day if first == start.replace(day=1) else 1
+        last_day = min(days_in_month, (end - first).days)
+        result.extend((month_correction + day) % 30 for day in range(first_day, last_day + 1))
+        first = first + datetime.timedelta(days=days_in_month)
+    return result
+
+
+def conway_phases(start: datetime.date, end: datetime.date) -> List[int]:
+    """
+    Conway's moon age (0-29) for every day of the span in one batched pass
+
+    :param start: datetime.date(2024, 1, 1) | first day
+    :param end: datetime.date(2025, 1, 1) | day after the last one
+    :return: [19, 20, 21, ...] | one number per day
+    """
+    if end <= start:
+        return []
+    _check_years(start.year, (end - datetime.timedelta(days=1)).year)
+    if numpy is not None and (end - start).days >= NUMPY_MIN_DAYS:
+        return _conway_numpy(start, end).tolist()
+    return _conway_python(start, end)
+
+
+# Meeus, "Astronomical Algorithms" (2nd ed.), chapter 49 - true new/full moon instants:
+SYNODIC_MONTH = 29.530588861
+JD_UNIX_EPOCH = 2440587.5
+# Periodic terms (coefficient, power of E, multipliers of M, M', F, Omega), both tables have the same arguments:
+NEW_MOON_TERMS = ((-0.40720, 0, 0, 1, 0, 0), (0.17241, 1, 1, 0, 0, 0), (0.01608, 0, 0, 2, 0, 0),
+                  (0.01039, 0, 0, 0, 2, 0), (0.00739, 1, -1, 1, 0, 0), (-0.00514, 1, 1, 1, 0, 0),
+                  (0.00208, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0), (-0.00057, 0, 0, 1, 2, 0),
+                  (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+                  (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1),
+                  (-0.00007, 0, 2, 1, 0, 0), (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0),
+                  (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0), (-0.00003, 0, 1, 1, 2, 0),
+                  (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+                  (0.00002, 0, 0, 4, 0, 0))
+FULL_MOON_TERMS = ((-0.40614, 0, 0, 1, 0, 0), (0.17302, 1, 1, 0, 0, 0), (0.01614, 0, 0, 2, 0, 0),
+                   (0.01043, 0, 0, 0, 2, 0), (0.00734, 1, -1, 1, 0, 0), (-0.00515, 1, 1, 1, 0, 0),
+                   (0.00209, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0), (-0.00057, 0, 0, 1, 2, 0),
+                   (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+                   (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1),
+                   (-0.00007, 0, 2, 1, 0, 0), (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0),
+                   (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0), (-0.00003, 0, 1, 1, 2, 0),
+                   (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+                   (0.00002, 0, 0, 4, 0, 0))
+# Planetary arguments (constant, k multiplier, coefficient):
+PLANETARY_TERMS = ((251.88, 0.016321, 0.000165), (251.83, 26.651886, 0.000164), (349.42, 36.412478, 0.000126),
+                   (84.66, 18.206239, 0.000110), (141.74, 53.303771, 0.000062), (207.14, 2.453732, 0.000060),
+                   (154.84, 7.306860, 0.000056), (34.52, 27.261239, 0.000047), (207.19, 0.121824, 0.000042),
+                   (291.34, 1.844379, 0.000040), (161.72, 24.198154, 0.000037), (239.56, 25.513099, 0.000035),
+                   (331.55, 3.592518, 0.000023))
+# Moon age index for the exact new/full moon day, PHASE_NAMES[0] - "New moon after", PHASE_NAMES[15] - "Full moon":
+NEW_MOON_AGE = 0
+FULL_MOON_AGE = 15
+
+
+def _math():
+    """
+    :return: (sin, cos) working with arrays when NumPy is installed, with floats otherwise
+    """
+    if numpy is not None:
+        return numpy.sin, numpy.cos
+    return math.sin, math.cos
+
+
+def _true_phase_jde(k):
+    """
+    Meeus true phase instant for lunation number k (integer - new moon, +0.5 - full moon)
+
+    :param k: 301.0 | 301.5 | numpy.ndarray with new and full moons mixed
+    :return: Julian Ephemeris Day (TT)
+    """
+    sin, _ = _math()
+    t = k / 1236.85
+    jde = 2451550.09766 + SYNODIC_MONTH * k + 0.00015437 * t ** 2 - 0.000000150 * t ** 3 + 0.00000000073 * t ** 4
+    e = 1 - 0.002516 * t - 0.0000074 * t ** 2
+    m = math.radians(1) * (2.5534 + 29.10535670 * k - 0.0000014 * t ** 2 - 0.00000011 * t ** 3)
+    mp = math.radians(1) * (201.5643 + 385.81693528 * k + 0.0107582 * t ** 2 + 0.00001238 * t ** 3
+                            - 0.000000058 * t ** 4)
+    f = math.radians(1) * (160.7108 + 390.67050284 * k - 0.0016118 * t ** 2 - 0.00000227 * t ** 3
+                           + 0.000000011 * t ** 4)
+    omega = math.radians(1) * (124.7746 - 1.56375588 * k + 0.0020672 * t ** 2 + 0.00000215 * t ** 3)
+    jde = jde + 0.000325 * sin(math.radians(1) * (299.77 + 0.107408 * k - 0.009173 * t ** 2))
+    if numpy is not None:
+        # All terms at once: (terms x lunations) matrix of arguments and one sin() call:
+        new_coefficients, e_powers, multipliers = _terms_arrays(NEW_MOON_TERMS)
+        full_coefficients, _, _ = _terms_arrays(FULL_MOON_TERMS)
+        coefficients = numpy.where(k % 1, full_coefficients[:, None], new_coefficients[:, None])
+        arguments = multipliers @ numpy.vstack((m, mp, f, omega))
+        jde = jde + (coefficients * e ** e_powers[:, None] * numpy.sin(arguments)).sum(axis=0)
+        constants, k_multipliers, coefficients = _terms_arrays(PLANETARY_TERMS)
+        arguments = math.radians(1) * (constants[:, None] + k_multipliers[:, None] * k)
+        return jde + (coefficients[:, None] * numpy.sin(arguments)).sum(axis=0)
+    for coefficient, e_power, m_mult, mp_mult, f_mult, omega_mult in (FULL_MOON_TERMS if k % 1 else NEW_MOON_TERMS):
+        jde = jde + coefficient * e ** e_power * sin(m_mult * m + mp_mult * mp + f_mult * f + omega_mult * omega)
+    for constant, k_mult, coefficient in PLANETARY_TERMS:
+        jde = jde + coefficient * sin(math.radians(1) * (constant + k_mult * k))
+    return jde
+
+
+@functools.lru_cache(maxsize=None)
+def _terms_arrays(terms: tuple) -> tuple:
+    """
+    Terms table as NumPy columns:
+    NEW_MOON_TERMS -> (coefficients, E powers, (M, M', F, Omega) multipliers matrix)
+    PLANETARY_TERMS -> (constants, k multipliers, coefficients)
+    """
+    table = numpy.array(terms, dtype=float)
+    if table.shape[1] == 3:
+        return table[:, 0], table[:, 1], table[:, 2]
+    return table[:, 0], table[:, 1], table[:, 2:]
+
+
+def _delta_t_days(year: float) -> float:
+    """
+    TT - UT difference (Espenak & Meeus polynomial for 2005-2050, long-term parabola otherwise)
+    """
+    if 2005 <= year <= 2050:
+        t = year - 2000
+        seconds = 62.92 + 0.32217 * t + 0.005589 * t ** 2
+    else:
+        u = (year - 1820) / 100
+        seconds = -20 + 32 * u ** 2
+    return seconds / 86400
+
+
+def _lunations(start: datetime.date, end: datetime.date) -> list:
+    """
+    Lunation numbers k (new moons) covering the span with one lunation margin on both sides
+    """
+    first = math.floor((start.year + (start.timetuple().tm_yday - 1) / 365.25 - 2000) * 12.3685) - 1
+    last = math.ceil((end.year + (end.timetuple().tm_yday - 1) / 365.25 - 2000) * 12.3685) + 1
+    return list(range(first, last + 1))
+
+
+def _phase_instants_jd(start: datetime.date, end: datetime.date) -> Tuple[list, list]:
+    """
+    :return: ([new moons JD (UT)], [full moons JD (UT)]) for the span with margins, sorted
+    """
+    lunations = _lunations(start, end)
+    delta_t = _delta_t_days((start.year + end.year) / 2)
+    if numpy is not None:
+        k = numpy.array(lunations, dtype=float)
+        # New and full moons in one pass:
+        instants = (_true_phase_jde(numpy.concatenate((k, k + 0.5))) - delta_t).tolist()
+        return instants[:len(lunations)], instants[len(lunations):]
+    new_moons = [_true_phase_jde(k) - delta_t for k in lunations]
+    full_moons = [_true_phase_jde(k + 0.5) - delta_t for k in lunations]
+    return new_moons, full_moons
+
+
+def _jd_to_datetime(jd: float) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(days=jd - JD_UNIX_EPOCH)
+
+
+def _date_to_jd(day: datetime.date) -> float:
+    return day.toordinal() - datetime.date(1970, 1, 1).toordinal() + JD_UNIX_EPOCH
+
+
+def new_full_moons(start: datetime.date, end: datetime.date) -> List[Tuple[datetime.datetime, str]]:
+    """
+    Exact new/full moon instants in the span
+
+    :param start: datetime.date(2024, 1, 1) | first day
+    :param end: datetime.date(2025, 1, 1) | day after the last one
+    :return: [(datetime.datetime(2024, 1, 11, 11, 57), "new"), (datetime.datetime(2024, 1, 25, 17, 54), "full"), ...]
+             UTC time, sorted
+    """
+    new_moons, full_moons = _phase_instants_jd(start, end)
+    start_jd, end_jd = _date_to_jd(start), _date_to_jd(end)
+    instants = [(jd, "new") for jd in new_moons] + [(jd, "full") for jd in full_moons]
+    return [(_jd_to_datetime(jd), name) for jd, name in sorted(instants) if start_jd <= jd < end_jd]
+
+
+def meeus_phases(start: datetime.date, end: datetime.date) -> List[int]:
+    """
+    Moon age index (0-30) for every day of the span, by true new/full moon instants.
+    Day with the new moon instant has age 0, day with the full moon instant has age 15, other days are
+    interpolated inside their half of the lunation. The same contract as conway_phases().
+
+    :param start: datetime.date(2024, 1, 1) | first day
+    :param end: datetime.date(2025, 1, 1) | day after the last one
+    :return: [19, 20, 21, ...] | one number per day (UTC dates)
+    """
+    if end <= start:
+        return []
+    new_moons, full_moons = _phase_instants_jd(start, end)
+    # Phase anchors: new moon -> 0, full moon -> 15, next new moon -> 30:
+    anchors = sorted([(jd, NEW_MOON_AGE) for jd in new_moons] + [(jd, FULL_MOON_AGE) for jd in full_moons])
+    start_jd = _date_to_jd(start)
+    days = (end - start).days
+    if numpy is not None:
+        return _meeus_phases_numpy(anchors, start_jd, days)
+    result = []
+    anchor = 0
+    for day in range(days):
+        day_start = start_jd + day
+        noon = day_start + 0.5
+        while anchors[anchor + 1][0] <= noon:
+            anchor += 1
+        previous_jd, previous_age = anchors[anchor]
+        next_jd, _ = anchors[anchor + 1]
+        if day_start <= previous_jd < day_start + 1:
+            result.append(previous_age)
+        elif day_start <= next_jd < day_start + 1:
+            result.append(anchors[anchor + 1][1])
+        else:
+            age = previous_age + FULL_MOON_AGE * (noon - previous_jd) / (next_jd - previous_jd)
+            result.append(min(round(age), len(PHASE_NAMES) - 1))
+    return result
+
+
+def _meeus_phases_numpy(anchors: List[Tuple[float, int]], start_jd: float, days: int) -> List[int]:
+    """
+    meeus_phases() loop as array operations: every day finds its pair of anchors with searchsorted()
+    """
+    anchors_jd = numpy.array([jd for jd, _ in anchors])
+    anchors_age = numpy.array([age for _, age in anchors])
+    day_start = start_jd + numpy.arange(days)
+    noon = day_start + 0.5
+    previous = numpy.searchsorted(anchors_jd, noon, side="right") - 1
+    previous_jd, next_jd = anchors_jd[previous], anchors_jd[previous + 1]
+    previous_age, next_age = anchors_age[previous], anchors_age[previous + 1]
+    age = previous_age + FULL_MOON_AGE * (noon - previous_jd) / (next_jd - previous_jd)
+    age = numpy.minimum(numpy.round(age), len(PHASE_NAMES) - 1)
+    age = numpy.where(next_jd < day_start + 1, next_age, age)
+    age = numpy.where(previous_jd >= day_start, previous_age, age)
+    return age.astype(int).tolist()
+
+
+def illumination(start: datetime.date, end: datetime.date) -> List[float]:
+    """
+    Illuminated fraction of the Moon disk at 12:00 UTC of every day (Meeus, chapter 48, main terms)
+
+    :param start: datetime.date(2024, 1, 1) | first day
+    :param end: datetime.date(2025, 1, 1) | day after the last one
+    :return: [0.73, 0.64, ...] | 0 - new moon, 1 - full moon
+    """
+    sin, cos = _math()
+    if end <= start:
+        return []
+    noons = [_date_to_jd(start) + day + 0.5 for day in range((end - start).days)]
+    if numpy is not None:
+        noons = numpy.array(noons)
+    else:
+        return [_illumination(jd, sin, cos) for jd in noons]
+    return _illumination(noons, sin, cos).tolist()
+
+
+def _illumination(jd, sin, cos):
+    t = (jd - 2451545) / 36525
+    d = math.radians(1) * (297.8501921 + 445267.1114034 * t)
+    m = math.radians(1) * (357.5291092 + 35999.0502909 * t)
+    mp = math.radians(1) * (134.9633964 + 477198.8675055 * t)
+    phase_angle = (math.pi - d
+                   - math.radians(6.289) * sin(mp)
+                   + math.radians(2.100) * sin(m)
+                   - math.radians(1.274) * sin(2 * d - mp)
+                   - math.radians(0.658) * sin(2 * d)
+                   - math.radians(0.214) * sin(2 * mp)
+                   - math.radians(0.110) * sin(d))
+    return (1 + cos(phase_angle)) / 2
+
+
+def month_phases(year: int, month: int, engine: str = "conway") -> List[int]:
+    """
+    :param year: 2024
+    :param month: 6
+    :param engine: "conway" - Conway's approximation (+-1 day) | "meeus" - true new/full moon instants
+    :return: [24, 25, 26, ... ] | moon age for days 1..last day of the month
+    """
+    start = datetime.date(year, month, 1)
+    end = start + datetime.timedelta(days=calendar.monthrange(year, month)[1])
+    if engine == "meeus":
+        return meeus_phases(start, end)
+    return conway_phases(start, end)
+
+
+__all__ = ["PHASE_NAMES",
+           "phase_name",
+           "conway_phases",
+           "meeus_phases",
+           "new_full_moons",
+           "illumination",
+           "month_phases"]
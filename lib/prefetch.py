@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from .help_functions import get_json_from_web
+from .privat import url_privatbank_list, get_jsons_privat, parse_privat_jsons
+from .exmo import url_exmo, cripto_pair, parse_exmo_jsons
+
+
+# Default polling params (can be overridden from data.yaml "prefetch" section):
+PRIVAT_INTERVAL = 300
+EXMO_INTERVAL = 30
+# Snapshot is stale when it is older than stale_factor * interval:
+STALE_FACTOR = 2
+# Backoff after failed request: 5, 10, 20 ... backoff_max seconds, each value with random jitter:
+BACKOFF_BASE = 5
+BACKOFF_MAX = 600
+
+
+class Snapshot(NamedTuple):
+    data: Any
+    fetched_at: float
+
+
+# Source name -> latest parsed data:
+_snapshots: Dict[str, Snapshot] = {}
+# Source name -> polling interval, seconds:
+_intervals: Dict[str, float] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+_stale_factor = STALE_FACTOR
+
+
+async def fetch_privat() -> list:
+    """
+    Request and parse Privatbank data, bypassing responses cache
+    :return: [PrivatRate(ccy='USD', ...), PrivatRate(ccy='USD', ...)]
+    """
+    data = await parse_privat_jsons(await get_jsons_privat(url_privatbank_list, ttl=0))
+    if len(data) != len(url_privatbank_list):
+        raise ValueError("not all Privatbank responses were received")
+    return data
+
+
+async def fetch_exmo() -> Dict[str, str]:
+    """
+    Request and parse Exmo data, bypassing responses cache
+    :return: {'BTC_USD': '7580.34561', 'ETH_USD': '189.682', ... }
+    """
+    data = await parse_exmo_jsons(await get_json_from_web(url_exmo, ttl=0), cripto_pair)
+    if not data:
+        raise ValueError("Exmo response was not received")
+    return data
+
+
+async def _poll(name: str, fetch: Callable[[], Awaitable[Any]], interval: float, backoff_max: float):
+    """
+    Endless loop: fetch data into the snapshot, sleep interval or jittered backoff after failure
+    """
+    failures = 0
+    while True:
+        try:
+            _snapshots[name] = Snapshot(await fetch(), time.time())
+            failures = 0
+            delay = interval
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            delay = min(backoff_max, BACKOFF_BASE * 2 ** (failures - 1))
+            delay = random.uniform(delay / 2, delay)
+            logging.warning(f"prefetch '{name}' failed {failures} time(s), retry in {delay:.0f}s: {e!r}")
+        await asyncio.sleep(delay)
+
+
+def start_prefetch(privat_interval: float = PRIVAT_INTERVAL,
+                   exmo_interval: float = EXMO_INTERVAL,
+                   stale_factor: float = STALE_FACTOR,
+                   backoff_max: float = BACKOFF_MAX):
+    """
+    Start background polling of Privatbank and Exmo. Call it from the dispatcher startup hook.
+
+    :param privat_interval: 300 | seconds between Privatbank requests
+    :param exmo_interval: 30 | seconds between Exmo requests
+    :param stale_factor: 2 | snapshot older than stale_factor * interval is marked as stale
+    :param backoff_max: 600 | max seconds between retries after failures
+    """
+    global _stale_factor
+    _stale_factor = stale_factor
+    sources = {"privat": (fetch_privat, privat_interval),
+               "exmo": (fetch_exmo, exmo_interval)}
+    for name, (fetch, interval) in sources.items():
+        if name in _tasks and not _tasks[name].done():
+            continue
+        _intervals[name] = interval
+        _tasks[name] = asyncio.ensure_future(_poll(name, fetch, interval, backoff_max))
+
+
+async def stop_prefetch():
+    """
+    Cancel background polling
+    """
+    for task in _tasks.values():
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
+
+
+def get_snapshot(name: str) -> Optional[Snapshot]:
+    """
+    :param name: 'privat' | 'exmo'
+    :return: Snapshot(data=..., fetched_at=1589710794.2) | None when data wasn't received yet
+    """
+    return _snapshots.get(name)
+
+
+def get_stale_note(name: str) -> str:
+    """
+    :param name: 'privat' | 'exmo'
+    :return: '' for fresh snapshot | '⚠️ data from 12:30 (14 min ago)' for stale one
+    """
+    snapshot = _snapshots.get(name)
+    interval = _intervals.get(name)
+    if snapshot is None or interval is None:
+        return ""
+    age = time.time() - snapshot.fetched_at
+    if age <= interval * _stale_factor:
+        return ""
+    fetched_at = datetime.fromtimestamp(snapshot.fetched_at).strftime("%H:%M")
+    return f"⚠️ data from {fetched_at} ({int(age // 60)} min ago)"
+
+
+__all__ = ["start_prefetch",
+           "stop_prefetch",
+           "get_snapshot",
+           "get_stale_note"]
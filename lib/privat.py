@@ -1,8 +1,11 @@
 import asyncio
-import ast
-from typing import List, Dict, Union, Any
-from PIL import Image, ImageDraw, ImageFont
-from .help_functions import get_json_from_web, create_dir
+import io
+from typing import List, Dict, Union, Any, Optional
+from PIL import ImageDraw
+from .help_functions import get_json_from_web
+from .assets import get_template, get_font
+from .render_executor import run_render
+from .decoders import PrivatRate, decode_privat_rates
 
 
 # Privatbank API (JSON format)
@@ -11,31 +14,31 @@ url_privatbank_busines = "https://api.privatbank.ua/p24api/pubinfo?exchange&json
 url_privatbank_list = [url_privatbank_private, url_privatbank_busines]
 
 
-async def get_jsons_privat(url_list: List[str]) -> list:
-    coroutines = map(get_json_from_web, url_list)
+async def get_jsons_privat(url_list: List[str], ttl: Optional[float] = None) -> list:
+    coroutines = [get_json_from_web(url, ttl=ttl) for url in url_list]
     return await asyncio.gather(*coroutines)
 
 
-async def parse_privat_jsons(raw_data: List[Dict[str, Union[int, str]]]) -> List[Dict[str, str]]:
+async def parse_privat_jsons(raw_data: List[Dict[str, Union[int, str]]]) -> List[PrivatRate]:
     """
     :param raw_data: [{'status': 200,
                        'result': '[{"ccy":"USD","base_ccy":"UAH","buy":"26.85000","sale":"27.25000"}, ...]'},
                       {'status': 200,
                        'result': '[{"ccy":"USD","base_ccy":"UAH","buy":"26.90000","sale":"27.24796"}, ...]'}]
 
-    :return [{'ccy': 'USD', 'base_ccy': 'UAH', 'buy': '26.85000', 'sale': '27.25000'},
-             {'ccy': 'USD', 'base_ccy': 'UAH', 'buy': '26.90000', 'sale': '27.24796'}]
+    :return [PrivatRate(ccy='USD', base_ccy='UAH', buy='26.85000', sale='27.25000'),
+             PrivatRate(ccy='USD', base_ccy='UAH', buy='26.90000', sale='27.24796')]
     """
     # Check correct result request and rebuild list with data:
     raw_data = [row["result"] for row in raw_data if row.get("result") and row.get("status") == 200]
-    # Transform str -> List[Dict[str, str]] using ast.literal_eval method:
-    raw_data = [ast.literal_eval(row) for row in raw_data]
+    # Transform str -> List[PrivatRate] using JSON decoder:
+    raw_data = [decode_privat_rates(row) for row in raw_data]
     # Taking USD only:
-    raw_data = [[currency for currency in row if currency.get("ccy") == "USD"][0] for row in raw_data]
+    raw_data = [[currency for currency in row if currency.ccy == "USD"][0] for row in raw_data]
     return raw_data
 
 
-async def create_privat_currency_message(currency: List[Dict[str, str]], text_for_image: bool = False) -> str:
+async def create_privat_currency_message(currency: List[PrivatRate], text_for_image: bool = False) -> str:
     """
     Create string with currency data
 
@@ -43,17 +46,17 @@ async def create_privat_currency_message(currency: List[Dict[str, str]], text_fo
     Func arg position 1 - for business
 
     :param text_for_image: True/False
-    :param currency: [{'ccy': 'USD', 'base_ccy': 'UAH', 'buy': '26.85000', 'sale': '27.25000'},
-                      {'ccy': 'USD', 'base_ccy': 'UAH', 'buy': '26.90000', 'sale': '27.24796'}]
+    :param currency: [PrivatRate(ccy='USD', base_ccy='UAH', buy='26.85000', sale='27.25000'),
+                      PrivatRate(ccy='USD', base_ccy='UAH', buy='26.90000', sale='27.24796')]
     :return: 'str'
     """
     if not isinstance(currency, list):
         return "Haven't data..."
 
-    retail_buy = currency[0]["buy"]
-    retail_sell = currency[0]["sale"]
-    business_buy = currency[1]["buy"]
-    business_sell = currency[1]["sale"]
+    retail_buy = currency[0].buy
+    retail_sell = currency[0].sale
+    business_buy = currency[1].buy
+    business_sell = currency[1].sale
 
     if not text_for_image:
         currency_str = f"Retail:\n" \
@@ -75,23 +78,19 @@ async def create_privat_currency_message(currency: List[Dict[str, str]], text_fo
         return currency_str
 
 
-async def create_privat_image(displayed_text: str) -> str:
+def draw_privat_image(displayed_text: str) -> bytes:
     """
-    Create images with text and return path to images
+    Draw text on the template, CPU-bound part of create_privat_image()
 
     :param displayed_text: str
-    :return: "images/out/usd.png"
+    :return: b'\x89PNG...'
     """
-    template_directory = "images/background_template"
-    result_directory = "images/out"
     image_name = "usd.png"
-    image_template_path = f"{template_directory}/{image_name}"
-    image_result_path = f"{result_directory}/{image_name}"
-    image_template = Image.open(image_template_path)
+    image_template = get_template(image_name)
     draw = ImageDraw.Draw(image_template)
 
     font_size = 60
-    font = ImageFont.truetype("images/fonts/Spartan/static/Spartan-SemiBold.ttf", size=font_size)
+    font = get_font(font_size)
 
     # Start position on images:
     (x, y) = (190, 100)
@@ -99,13 +98,21 @@ async def create_privat_image(displayed_text: str) -> str:
     text_color = "rgb(0, 0, 0)"
 
     draw.text((x, y), displayed_text, fill=text_color, font=font)
-    try:
-        image_template.save(image_result_path)
-    except FileNotFoundError:
-        create_dir(result_directory)
-        image_template.save(image_result_path)
+    image_result = io.BytesIO()
+    image_template.save(image_result, format="PNG")
+    return image_result.getvalue()
 
-    return image_result_path
+
+async def create_privat_image(displayed_text: str) -> io.BytesIO:
+    """
+    Create images with text in the render pool and return it as in-memory PNG file
+
+    :param displayed_text: str
+    :return: <class '_io.BytesIO'> with PNG data, position at the start
+    """
+    image_result = io.BytesIO(await run_render(draw_privat_image, displayed_text))
+    image_result.name = "usd.png"
+    return image_result
 
 __all__ = ["url_privatbank_list",
            "get_jsons_privat",
@@ -0,0 +1,118 @@
+import asyncio
+import collections
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Counter, NamedTuple
+from aiogram import types
+
+
+# Default params (can be overridden from data.yaml "profiler" section):
+PROFILE_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+# Seconds between stack samples, 0.01 costs ~1-3% of one core on Raspberry Pi:
+PROFILE_INTERVAL = 0.01
+
+_project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_session = {"running": False}
+
+
+class ProfilerBusy(Exception):
+    """
+    Other profiling session is running
+    """
+
+
+class ProfileResult(NamedTuple):
+    # Collapsed stacks: 'thread;caller (file:line);callee (file:line) 25' per line, for flamegraph.pl/speedscope:
+    collapsed: bytes
+    samples: int
+    seconds: float
+    threads: int
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_project_dir):
+        filename = os.path.relpath(filename, _project_dir)
+    # Function start line, all samples of the function are merged into one frame:
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _sample(seconds: float, interval: float, stop: threading.Event) -> ProfileResult:
+    own_id = threading.get_ident()
+    stacks: Counter[str] = collections.Counter()
+    thread_ids = set()
+    samples = 0
+    started_at = time.monotonic()
+    deadline = started_at + seconds
+    while time.monotonic() < deadline and not stop.is_set():
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(stack))] += 1
+            thread_ids.add(thread_id)
+        samples += 1
+        stop.wait(interval)
+    collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    return ProfileResult(collapsed.encode(), samples, time.monotonic() - started_at, len(thread_ids))
+
+
+def is_profiler_running() -> bool:
+    return _session["running"]
+
+
+def start_profile(seconds: float = PROFILE_SECONDS,
+                  interval: float = PROFILE_INTERVAL,
+                  max_seconds: float = PROFILE_MAX_SECONDS) -> asyncio.Future:
+    """
+    Sample stacks of all threads of the process in a helper thread, the event loop keeps serving updates.
+    Renders in "process" mode of the render pool are not visible here.
+
+    :param seconds: 30 | profiling time, limited by max_seconds
+    :param interval: 0.01 | seconds between samples
+    :param max_seconds: 300
+    :return: future with ProfileResult, cancel it to stop sampling
+    :raise ProfilerBusy: only one session runs at a time
+    """
+    if _session["running"]:
+        raise ProfilerBusy("profiler is already running")
+    seconds = min(max(seconds, 1), max_seconds)
+    stop = threading.Event()
+    _session["running"] = True
+    loop = asyncio.get_event_loop()
+    sampling = loop.run_in_executor(None, _sample, seconds, interval, stop)
+
+    def finish(future: asyncio.Future):
+        stop.set()
+        _session["running"] = False
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"profiler failed: {future.exception()!r}")
+
+    sampling.add_done_callback(finish)
+    logging.info(f"profiler is started for {seconds}s")
+    return sampling
+
+
+def profile_input_file(result: ProfileResult) -> types.InputFile:
+    """
+    :return: 'profile_20240601_120000.txt' document for message.answer_document()
+    """
+    return types.InputFile(io.BytesIO(result.collapsed), filename=f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt")
+
+
+__all__ = ["ProfilerBusy",
+           "ProfileResult",
+           "is_profiler_running",
+           "start_profile",
+           "profile_input_file"]
@@ -0,0 +1,191 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Union
+from .metrics import observe
+
+
+# Default executor params (can be overridden from data.yaml "render" section):
+RENDER_MODE = "thread"
+RENDER_WORKERS = 2
+RENDER_QUEUE_SIZE = 8
+# Batch pool workers are forked: they start in milliseconds with current assets and skeletons of the bot,
+# nothing is left in them after the batch. Without fork (Windows, macOS) workers import the project again:
+BATCH_POOL_START_METHOD = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class RenderQueueFull(Exception):
+    """
+    All render workers are busy and the waiting queue is full
+    """
+
+
+_executor: Optional[Executor] = None
+# Free workers, render waits here while all workers are busy:
+_workers: Optional[asyncio.Semaphore] = None
+_workers_count = RENDER_WORKERS
+_queue_size = RENDER_QUEUE_SIZE
+_mode = RENDER_MODE
+_stats = {"queue_depth": 0,
+          "queue_depth_max": 0,
+          "running": 0,
+          "completed": 0,
+          "failed": 0,
+          "rejected": 0,
+          "wait_time_total": 0.0,
+          "wait_time_max": 0.0,
+          "render_time_total": 0.0}
+
+
+def start_render_executor(mode: str = RENDER_MODE, workers: int = RENDER_WORKERS, queue_size: int = RENDER_QUEUE_SIZE):
+    """
+    Create pool for CPU-bound rendering. Call it from the dispatcher startup hook.
+
+    :param mode: "thread" | "process" - process pool uses all CPU cores, threads are lighter on memory.
+                 Process workers have their own copies of assets and skeleton cache, reload of assets and
+                 memory footprint report see the main process only.
+    :param workers: 2 | renders executed at the same time
+    :param queue_size: 8 | renders waiting for a free worker, next ones are rejected with RenderQueueFull
+    """
+    global _executor, _workers, _workers_count, _queue_size, _mode
+    if _executor is not None:
+        return
+    if mode == "process":
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+    _workers = asyncio.Semaphore(workers)
+    _workers_count = workers
+    _queue_size = queue_size
+    _mode = mode
+
+
+async def stop_render_executor():
+    """
+    Wait for running renders and close the pool. Waiting is done in the default executor,
+    so the event loop keeps serving other shutdown work.
+    """
+    global _executor, _workers
+    executor = _executor
+    _executor = None
+    _workers = None
+    if executor is not None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, partial(executor.shutdown, wait=True, cancel_futures=True))
+
+
+async def run_render(func: Callable, *args, **kwargs) -> Any:
+    """
+    Execute CPU-bound function in the render pool and wait for result without blocking the event loop.
+    For "process" mode func and arguments have to be picklable (module-level function).
+
+    :param func: draw_privat_image
+    :param args: positional arguments for func
+    :param kwargs: keyword arguments for func
+    :return: func result
+    """
+    if _executor is None:
+        start_render_executor()
+    if _stats["queue_depth"] >= _queue_size and _workers.locked():
+        _stats["rejected"] += 1
+        raise RenderQueueFull(f"render queue is full ({_queue_size} waiting)")
+
+    _stats["queue_depth"] += 1
+    _stats["queue_depth_max"] = max(_stats["queue_depth_max"], _stats["queue_depth"])
+    queued_at = time.monotonic()
+    # The pool can be stopped while the render runs, its own semaphore is released:
+    workers = _workers
+    try:
+        await workers.acquire()
+    finally:
+        _stats["queue_depth"] -= 1
+    wait_time = time.monotonic() - queued_at
+    _stats["wait_time_total"] += wait_time
+    _stats["wait_time_max"] = max(_stats["wait_time_max"], wait_time)
+
+    try:
+        return await _execute(_executor, func, *args, **kwargs)
+    finally:
+        workers.release()
+
+
+async def _execute(executor: Optional[Executor], func: Callable, *args, **kwargs) -> Any:
+    _stats["running"] += 1
+    started_at = time.monotonic()
+    try:
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+        _stats["completed"] += 1
+        return result
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        render_time = time.monotonic() - started_at
+        _stats["render_time_total"] += render_time
+        observe("tbot_render_duration_seconds", render_time, renderer=getattr(func, "__name__", "other"))
+        _stats["running"] -= 1
+
+
+@asynccontextmanager
+async def batch_render_pool(workers: Optional[int] = None):
+    """
+    Own process pool for a batch of renders (12 months of /moon_year), it's closed after the batch.
+    Renders of the batch use all CPU cores and don't take workers of the shared pool.
+
+    :param workers: 4 | None - CPU cores count
+    :return: pool for run_render_in()
+    """
+    pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context(BATCH_POOL_START_METHOD))
+    try:
+        yield pool
+    finally:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, partial(pool.shutdown, wait=True, cancel_futures=True))
+
+
+async def run_render_in(pool: Executor, func: Callable, *args, **kwargs) -> Any:
+    """
+    run_render() for batch_render_pool(), the pool size limits the batch, shared queue isn't used
+
+    :param pool: batch_render_pool() result
+    :param func: render_calendar_pil | module-level function
+    :return: func result
+    """
+    return await _execute(pool, func, *args, **kwargs)
+
+
+def get_render_stats() -> Dict[str, Union[int, float, str]]:
+    """
+    :return: {'mode': 'thread', 'workers': 2, 'queue_size': 8, 'queue_depth': 0, 'queue_depth_max': 3,
+              'running': 1, 'completed': 25, 'failed': 0, 'rejected': 0,
+              'wait_time_avg': 0.012, 'wait_time_max': 0.4, 'render_time_avg': 0.21}
+    """
+    finished = _stats["completed"] + _stats["failed"]
+    started = finished + _stats["running"]
+    return {"mode": _mode,
+            "workers": _workers_count,
+            "queue_size": _queue_size,
+            "queue_depth": _stats["queue_depth"],
+            "queue_depth_max": _stats["queue_depth_max"],
+            "running": _stats["running"],
+            "completed": _stats["completed"],
+            "failed": _stats["failed"],
+            "rejected": _stats["rejected"],
+            "wait_time_avg": _stats["wait_time_total"] / started if started else 0.0,
+            "wait_time_max": _stats["wait_time_max"],
+            "render_time_avg": _stats["render_time_total"] / finished if finished else 0.0}
+
+
+__all__ = ["RenderQueueFull",
+           "start_render_executor",
+           "stop_render_executor",
+           "batch_render_pool",
+           "run_render_in",
+           "run_render",
+           "get_render_stats"]
@@ -0,0 +1,277 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Union
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+
+# Default params (can be overridden from data.yaml "send_queue" section), Telegram limits are
+# ~30 messages per second for the bot and ~1 message per second for one chat:
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+SEND_WORKERS = 4
+SEND_QUEUE_SIZE = 500
+# Attempts after RetryAfter before the message is failed:
+MAX_RETRIES = 3
+# Seconds for queued messages to be sent on shutdown:
+DRAIN_TIMEOUT = 10
+# Seconds between scans for idle chat buckets:
+BUCKET_PRUNE_INTERVAL = 60
+
+
+class SendQueueFull(Exception):
+    """
+    Too many messages are waiting to be sent
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket, acquire() reserves a token and tells how long to wait for it
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        # RetryAfter from Telegram, nothing is sent before this time:
+        self.paused_until = 0.0
+
+    def acquire(self) -> float:
+        """
+        :return: 0.4 | seconds to wait before sending, token is already taken
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def is_full(self, now: float) -> bool:
+        """
+        :return: True | bucket is refilled and not paused, a new bucket would behave the same
+        """
+        return now >= self.paused_until and self.tokens + (now - self.updated_at) * self.rate >= self.burst
+
+
+class _Request:
+    __slots__ = ("call", "future", "enqueued_at", "retries")
+
+    def __init__(self, call: Callable[[], Awaitable], future: asyncio.Future):
+        self.call = call
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.retries = 0
+
+
+_bot: Optional[Bot] = None
+_global_bucket: Optional[TokenBucket] = None
+_chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+# Chat id -> its requests in order, only one worker serves a chat at a time:
+_chat_requests: Dict[Union[int, str], Deque[_Request]] = {}
+# Chats with requests, in round-robin order:
+_ready_chats: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_params = {"chat_rate": CHAT_RATE, "chat_burst": CHAT_BURST, "queue_size": SEND_QUEUE_SIZE}
+_stats = {"queued": 0,
+          "sent": 0,
+          "failed": 0,
+          "retried": 0,
+          "rejected": 0,
+          "latency_total": 0.0,
+          "latency_max": 0.0,
+          "started_at": 0.0,
+          "pruned_at": 0.0}
+
+
+def start_send_queue(bot: Bot,
+                     global_rate: float = GLOBAL_RATE,
+                     chat_rate: float = CHAT_RATE,
+                     chat_burst: float = CHAT_BURST,
+                     workers: int = SEND_WORKERS,
+                     queue_size: int = SEND_QUEUE_SIZE):
+    """
+    Start send workers. Call it from the dispatcher startup hook.
+
+    :param bot: <class 'aiogram.bot.bot.Bot'>
+    :param global_rate: 30 | messages per second for all chats
+    :param chat_rate: 1 | messages per second for one chat
+    :param chat_burst: 3 | messages sent to one chat at once before chat_rate is applied
+    :param workers: 4 | requests to Telegram at the same time
+    :param queue_size: 500 | waiting messages, next ones are rejected with SendQueueFull
+    """
+    global _bot, _global_bucket, _ready_chats
+    if _workers:
+        return
+    _bot = bot
+    _global_bucket = TokenBucket(global_rate, global_rate)
+    _ready_chats = asyncio.Queue()
+    _params.update(chat_rate=chat_rate, chat_burst=chat_burst, queue_size=queue_size)
+    _stats["started_at"] = time.monotonic()
+    _workers.extend(asyncio.ensure_future(_worker()) for _ in range(workers))
+
+
+async def stop_send_queue(drain_timeout: float = DRAIN_TIMEOUT):
+    """
+    Wait for queued messages (not longer than drain_timeout) and stop workers
+    """
+    deadline = time.monotonic() + drain_timeout
+    while _stats["queued"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    for chat_id, requests in _chat_requests.items():
+        for request in requests:
+            if not request.future.done():
+                request.future.cancel()
+    _chat_requests.clear()
+    _chat_buckets.clear()
+    _stats["queued"] = 0
+
+
+def enqueue(chat_id: Union[int, str], call: Callable[[], Awaitable]) -> asyncio.Future:
+    """
+    Put Telegram request into the queue of its chat
+
+    :param chat_id: 123456789
+    :param call: lambda: bot.send_photo(chat_id, photo) | it is called when the limits allow
+    :return: future with the call result
+    """
+    if not _workers:
+        raise RuntimeError("send queue isn't started, call start_send_queue() first")
+    if _stats["queued"] >= _params["queue_size"]:
+        _stats["rejected"] += 1
+        raise SendQueueFull(f"send queue is full ({_params['queue_size']} waiting)")
+    request = _Request(call, asyncio.get_event_loop().create_future())
+    requests = _chat_requests.get(chat_id)
+    if requests is None:
+        # Chat isn't served by any worker now:
+        _chat_requests[chat_id] = collections.deque([request])
+        _ready_chats.put_nowait(chat_id)
+    else:
+        requests.append(request)
+    _stats["queued"] += 1
+    return request.future
+
+
+async def send_message(chat_id: Union[int, str], text: str, **kwargs) -> Any:
+    """
+    :param chat_id: 123456789
+    :param text: 'Bot was start'
+    :param kwargs: parse_mode, reply_markup, ...
+    :return: sent message
+    """
+    return await enqueue(chat_id, lambda: _bot.send_message(chat_id, text, **kwargs))
+
+
+async def broadcast(chat_ids: Iterable[Union[int, str]], text: str, **kwargs) -> List[Any]:
+    """
+    Send the same text to many chats, limits are respected
+    :return: [sent message | exception, ...] in chat_ids order
+    """
+    futures = [enqueue(chat_id, lambda chat_id=chat_id: _bot.send_message(chat_id, text, **kwargs))
+               for chat_id in chat_ids]
+    return await asyncio.gather(*futures, return_exceptions=True)
+
+
+def _chat_bucket(chat_id: Union[int, str]) -> TokenBucket:
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = _chat_buckets[chat_id] = TokenBucket(_params["chat_rate"], _params["chat_burst"])
+    return bucket
+
+
+async def _worker():
+    while True:
+        chat_id = await _ready_chats.get()
+        requests = _chat_requests[chat_id]
+        request = requests[0]
+        chat_bucket = _chat_bucket(chat_id)
+        await asyncio.sleep(max(chat_bucket.acquire(), _global_bucket.acquire()))
+        try:
+            result = await request.call()
+        except RetryAfter as e:
+            request.retries += 1
+            chat_bucket.paused_until = time.monotonic() + e.timeout
+            logging.warning(f"send to {chat_id}: retry after {e.timeout}s, attempt {request.retries}")
+            if request.retries <= MAX_RETRIES:
+                _stats["retried"] += 1
+                # Request stays first in the chat queue:
+                _ready_chats.put_nowait(chat_id)
+                continue
+            _finish(chat_id, requests, request, exception=e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _finish(chat_id, requests, request, exception=e)
+        else:
+            _finish(chat_id, requests, request, result=result)
+
+
+def _finish(chat_id: Union[int, str], requests: Deque[_Request], request: _Request, result: Any = None,
+            exception: Optional[BaseException] = None):
+    requests.popleft()
+    _stats["queued"] -= 1
+    if exception is None:
+        latency = time.monotonic() - request.enqueued_at
+        _stats["sent"] += 1
+        _stats["latency_total"] += latency
+        _stats["latency_max"] = max(_stats["latency_max"], latency)
+        if not request.future.done():
+            request.future.set_result(result)
+    else:
+        _stats["failed"] += 1
+        if not request.future.done():
+            request.future.set_exception(exception)
+    if requests:
+        # Other chats are served before the next message of this chat:
+        _ready_chats.put_nowait(chat_id)
+    else:
+        del _chat_requests[chat_id]
+        _prune_chat_buckets()
+
+
+def _prune_chat_buckets():
+    """
+    Drop buckets of idle chats once they are full again, otherwise every chat the bot ever wrote to stays in memory
+    """
+    now = time.monotonic()
+    if now - _stats["pruned_at"] < BUCKET_PRUNE_INTERVAL:
+        return
+    _stats["pruned_at"] = now
+    for chat_id in [chat_id for chat_id, bucket in _chat_buckets.items()
+                    if chat_id not in _chat_requests and bucket.is_full(now)]:
+        del _chat_buckets[chat_id]
+
+
+def get_send_queue_stats() -> Dict[str, Union[int, float]]:
+    """
+    :return: {'queued': 0, 'sent': 25, 'failed': 0, 'retried': 1, 'rejected': 0,
+              'latency_avg': 0.35, 'latency_max': 2.1, 'throughput': 0.02}
+              latency - seconds from enqueue to sent, throughput - sent messages per second since start
+    """
+    uptime = time.monotonic() - _stats["started_at"] if _stats["started_at"] else 0
+    return {"queued": _stats["queued"],
+            "sent": _stats["sent"],
+            "failed": _stats["failed"],
+            "retried": _stats["retried"],
+            "rejected": _stats["rejected"],
+            "latency_avg": _stats["latency_total"] / _stats["sent"] if _stats["sent"] else 0.0,
+            "latency_max": _stats["latency_max"],
+            "throughput": _stats["sent"] / uptime if uptime else 0.0}
+
+
+__all__ = ["SendQueueFull",
+           "start_send_queue",
+           "stop_send_queue",
+           "enqueue",
+           "send_message",
+           "broadcast",
+           "get_send_queue_stats"]
@@ -11,6 +11,10 @@ class StatesMoonCalendar(StatesGroup):
     query = State()
 
 
+class StatesMoonYear(StatesGroup):
+    question_of_year = State()
+
+
 class Geoposition(StatesGroup):
     position = State()
 
@@ -22,5 +26,6 @@ class BotTechnical(StatesGroup):
 
 __all__ = ["StatesWeather",
            "StatesMoonCalendar",
+           "StatesMoonYear",
            "Geoposition",
            "BotTechnical"]
@@ -1,12 +1,12 @@
-import ast
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Union, Any
 from .help_functions import get_json_from_web
+from .decoders import DecodeError, WeatherRecord, decode_weather, decode_forecast
 from aiogram.types import Location
 
 
 async def get_weather_data(weather_api: str, location: Location, state: str = "weather", lang: str = "en") -> \
-                                                                                                    Union[str, dict]:
+                                                                        Union[str, WeatherRecord, List[WeatherRecord]]:
     """
     Get API params and send request weather data to openweathermap.org
     :param weather_api: '8c4b1bbbxxxxxxxxxxxxxxxxxxx'
@@ -16,41 +16,31 @@ async def get_weather_data(weather_api: str, location: Location, state: str = "w
 
     :return:
     for 'weather' state:
-             {'coord': {'lon': 30.51, 'lat': 50.4},
-              'weather': [{'id': 500,
-                'main': 'Rain',
-                'description': 'light rain',
-                'icon': '10d'}],
-              'base': 'stations',
-              'main': {'temp': 299.1,
-               'feels_like': 296.27,
-               'temp_min': 298.15,
-               'temp_max': 300.37,
-               'pressure': 1007,
-               'humidity': 36},
-              'visibility': 10000,
-              'wind': {'speed': 4, 'deg': 200},
-              'rain': {'1h': 0.12},
-              'clouds': {'all': 2},
-              'dt': 1589200602,
-              'sys': {'type': 1,
-               'id': 8903,
-               'country': 'UA',
-               'sunrise': 1589163360,
-               'sunset': 1589218364},
-              'timezone': 10800,
-              'id': 703447,
-              'name': 'Kyiv',
-              'cod': 200}
+             WeatherRecord(dt=1589200602,
+                           description='light rain',
+                           temp_min=298.15,
+                           temp_max=300.37,
+                           pressure=1007,
+                           humidity=36,
+                           wind_speed=4,
+                           clouds=2,
+                           sunrise=1589163360,
+                           sunset=1589218364)
+    for 'forecast' state:
+             [WeatherRecord(dt=1589727600, ..., sunrise=None, sunset=None), ...]
     """
     lat = location.latitude
     lon = location.longitude
     url = f"http://api.openweathermap.org/data/2.5/{state}?lat={lat}&lon={lon}&appid={weather_api}&lang={lang}"
     data = await get_json_from_web(url)
     if data["status"] == 200 and data.get("result"):
-        # Transform str -> Dict[str, str] using ast.literal_eval method:
-        data = ast.literal_eval(data["result"])
-        return data
+        # Transform str -> WeatherRecord | List[WeatherRecord] using JSON decoder:
+        try:
+            if state == "forecast":
+                return decode_forecast(data["result"])
+            return decode_weather(data["result"])
+        except DecodeError as e:
+            return f"Error. Unexpected weather data - {e}"
     else:
         return f"Error. Get status message - {data['status']}"
 
@@ -146,56 +136,43 @@ def set_weather_emoji(description, set_date):
         return description
 
 
-async def parse_weather_api_request(weather_msg: dict) -> str:
+async def parse_weather_api_request(weather_msg: WeatherRecord) -> str:
     """
     Parse weather API request message.
 
     :param weather_msg:
-    'forecast' API (dicts in list) return:
-    {'clouds': {'all': 52},
-     'dt': 1589641200,
-     'dt_txt': '2020-05-16 15:00:00',
-     'main': {'feels_like': 283.27,
-           'grnd_level': 997,
-           'humidity': 52,
-           'pressure': 1015,
-           'sea_level': 1015,
-           'temp': 287.88,
-           'temp_kf': 0,
-           'temp_max': 287.88,
-           'temp_min': 287.88},
-     'sys': {'pod': 'd'},
-     'weather': [{'description': 'broken clouds',
-               'icon': '04d',
-               'id': 803,
-               'main': 'Clouds'}],
-     'wind': {'deg': 267, 'speed': 4.97}}
+    'forecast' API (records in list) return:
+    WeatherRecord(dt=1589641200,
+                  description='broken clouds',
+                  temp_min=287.88,
+                  temp_max=287.88,
+                  pressure=1015,
+                  humidity=52,
+                  wind_speed=4.97,
+                  clouds=52,
+                  sunrise=None,
+                  sunset=None)
 
     :return: parsed string
     """
     kelvin = 272.15
-    description = weather_msg.get("weather")[0].get("description")
+    description = weather_msg.description
     # Get temp of Kelvin and convert to the celsius:
-    # temp_avg = str(round(weather_data.get("main").get("temp") - kelvin))
-    temp_min = str(round(weather_msg.get("main").get("temp_min") - kelvin))
-    temp_max = str(round(weather_msg.get("main").get("temp_max") - kelvin))
-    atmo_pressure = str(weather_msg.get("main").get("pressure")) + "hPa"
-    humidity = str(weather_msg.get("main").get("humidity")) + "%"
-    # visibility = str(weather_data.get("visibility")) + "meters"
-    wind_speed = str(weather_msg.get("wind").get("speed")) + "m/s"
-    # Wind direction, degrees (meteorological):
-    # TODO: Transform wind_deg data to readable:
-    # wind_deg = str(weather_data.get("wind").get("deg")) + "°"
-    clouds = str(weather_msg.get("clouds").get("all")) + "%"
-    set_date = weather_msg.get("dt")
+    temp_min = str(round(weather_msg.temp_min - kelvin))
+    temp_max = str(round(weather_msg.temp_max - kelvin))
+    atmo_pressure = str(weather_msg.pressure) + "hPa"
+    humidity = str(weather_msg.humidity) + "%"
+    wind_speed = str(weather_msg.wind_speed) + "m/s"
+    # TODO: Transform wind direction data to readable
+    clouds = str(weather_msg.clouds) + "%"
+    set_date = weather_msg.dt
     date_str = datetime.fromtimestamp(set_date).strftime("%Y %B %d, %A, %I:%M %p")
-    sunrise = weather_msg.get("sys").get("sunrise")
-    sunset = weather_msg.get("sys").get("sunset")
+    sunrise = weather_msg.sunrise
+    sunset = weather_msg.sunset
     # This 'if' need for manual split API request for 'forecast' or 'weather' call:
     if sunrise and sunset:
         sunrise = datetime.fromtimestamp(sunrise).strftime("%I:%M %p")
         sunset = datetime.fromtimestamp(sunset).strftime("%I:%M %p")
-    # city = str(weather_data.get('name'))
 
     if temp_min == temp_max:
         temp_str = temp_min + "°"
@@ -218,52 +195,33 @@ async def parse_weather_api_request(weather_msg: dict) -> str:
     return result_str
 
 
-async def time_split_weather_message(weather_data: Dict[str, Union[int, dict, str, list]], weather_date: str) -> \
-                                                                            List[Dict[str, Union[int, dict, str, list]]]:
+async def time_split_weather_message(weather_data: List[WeatherRecord], weather_date: str) -> List[WeatherRecord]:
     """
     Got from API weather-data and split it to time. Returned date-parsed weather data.
 
-    :param weather_data: {'list': [{'wether': 'data'}, {'wether': 'data'}, ...]}
+    :param weather_data: [WeatherRecord(dt=1589706000, ...), WeatherRecord(dt=1589716800, ...), ...]
     :param weather_date: one from:
                          ["/today", "/tomorrow", "/plus_2_days", "/plus_3_days", "/plus_4_days""]
-    :return: [{'dt': 1589727600,
-               'main': {'temp': 287.12,
-                'feels_like': 283.01,
-                'temp_min': 286.09,
-                'temp_max': 287.12,
-                'pressure': 1017,
-                'sea_level': 1016,
-                'grnd_level': 998,
-                'humidity': 69,
-                'temp_kf': 1.03},
-               'weather': [{'id': 500,
-                 'main': 'Rain',
-                 'description': 'light rain',
-                 'icon': '10d'}],
-               'clouds': {'all': 98},
-               'wind': {'speed': 5.34, 'deg': 213},
-               'rain': {'3h': 0.46},
-               'sys': {'pod': 'd'},
-               'dt_txt': '2020-05-17 15:00:00'},
-              {'dt': 1589738400,
-               'main': {'temp': 284.03,
-                'feels_like': 281.43,
-                'temp_min': 283.56,
-                'temp_max': 284.03,
-                'pressure': 1016,
-                'sea_level': 1016,
-                'grnd_level': 998,
-                'humidity': 81,
-                'temp_kf': 0.47},
-               'weather': [{'id': 500,
-                 'main': 'Rain',
-                 'description': 'light rain',
-                 'icon': '10n'}],
-               'clouds': {'all': 94},
-               'wind': {'speed': 2.97, 'deg': 239},
-               'rain': {'3h': 0.24},
-               'sys': {'pod': 'n'},
-               'dt_txt': '2020-05-17 18:00:00'}]
+    :return: [WeatherRecord(dt=1589727600,
+                            description='light rain',
+                            temp_min=286.09,
+                            temp_max=287.12,
+                            pressure=1017,
+                            humidity=69,
+                            wind_speed=5.34,
+                            clouds=98,
+                            sunrise=None,
+                            sunset=None),
+              WeatherRecord(dt=1589738400,
+                            description='light rain',
+                            temp_min=283.56,
+                            temp_max=284.03,
+                            pressure=1016,
+                            humidity=81,
+                            wind_speed=2.97,
+                            clouds=94,
+                            sunrise=None,
+                            sunset=None)]
     """
     result = []
     dates = {"/today": 0,
@@ -275,8 +233,8 @@ async def time_split_weather_message(weather_data: Dict[str, Union[int, dict, st
     seted_date = current_date + timedelta(days=dates[weather_date])
     seted_date = seted_date.strftime("%d %B")
 
-    for one_data in weather_data["list"]:
-        date_data = one_data.get("dt")
+    for one_data in weather_data:
+        date_data = one_data.dt
         date_data = datetime.fromtimestamp(date_data).strftime("%d %B")
         if seted_date == date_data:
             result.append(one_data)
@@ -284,37 +242,21 @@ async def time_split_weather_message(weather_data: Dict[str, Union[int, dict, st
     return result
 
 
-async def create_weather_message(weather_data: Dict[str, Union[dict, list, str, int]], weather_date: str) -> str:
+async def create_weather_message(weather_data: Union[str, WeatherRecord, List[WeatherRecord]], weather_date: str) -> str:
     """
     Got API-data, call parse functions and return readable string.
 
-    :param weather_data: For example, '/now' string:
-                          {'coord': {'lon': 30.51, 'lat': 50.4},
-                          'weather': [{'id': 500,
-                            'main': 'Rain',
-                            'description': 'light rain',
-                            'icon': '10d'}],
-                          'base': 'stations',
-                          'main': {'temp': 290.7,
-                           'feels_like': 285.87,
-                           'temp_min': 290.15,
-                           'temp_max': 292.15,
-                           'pressure': 1019,
-                           'humidity': 51},
-                          'visibility': 10000,
-                          'wind': {'speed': 6, 'deg': 240},
-                          'rain': {'1h': 0.16},
-                          'clouds': {'all': 94},
-                          'dt': 1589710794,
-                          'sys': {'type': 1,
-                           'id': 8903,
-                           'country': 'UA',
-                           'sunrise': 1589681249,
-                           'sunset': 1589737289},
-                          'timezone': 10800,
-                          'id': 703447,
-                          'name': 'Kyiv',
-                          'cod': 200}
+    :param weather_data: For example, '/now' record:
+                          WeatherRecord(dt=1589710794,
+                                        description='light rain',
+                                        temp_min=290.15,
+                                        temp_max=292.15,
+                                        pressure=1019,
+                                        humidity=51,
+                                        wind_speed=6,
+                                        clouds=94,
+                                        sunrise=1589681249,
+                                        sunset=1589737289)
     :param weather_date: one from:
                         ["/now, "/today", "/tomorrow", "/plus_2_days", "/plus_3_days", "/plus_4_days""]
     :return: finish string for use. For example, '/now' string:
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import hmac
+import logging
+import ssl
+import time
+from typing import Awaitable, Callable, Optional, Union
+from aiohttp import web
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.webhook import WebhookRequestHandler, SendMessage
+from aiogram.utils.executor import Executor
+
+
+# Default webhook params (can be overridden from data.yaml "webhook" section):
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_HOST = "127.0.0.1"
+WEBHOOK_PORT = 8443
+# Seconds for updates in processing to finish after SIGTERM/SIGINT:
+SHUTDOWN_TIMEOUT = 30
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Set while update is processed inside the webhook request, its reply can be returned in the HTTP response:
+_webhook_reply: contextvars.ContextVar = contextvars.ContextVar("webhook_reply", default=None)
+# Webhook requests in processing, shutdown waits for them:
+_inflight = {"requests": 0}
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    """
+    Webhook handler which accepts updates with the secret token only, the token is set in setWebhook
+    """
+
+    async def post(self):
+        secret_token = self.request.app.get("SECRET_TOKEN")
+        received_token = self.request.headers.get(SECRET_TOKEN_HEADER, "")
+        if secret_token and not hmac.compare_digest(received_token.encode(), secret_token.encode()):
+            logging.warning(f"webhook request with wrong secret token from {self.request.remote}")
+            raise web.HTTPUnauthorized()
+
+        _inflight["requests"] += 1
+        reply = _webhook_reply.set({"used": False})
+        try:
+            return await super().post()
+        finally:
+            _webhook_reply.reset(reply)
+            _inflight["requests"] -= 1
+
+
+async def reply_text(message: types.Message, text: str, **kwargs) -> Union[SendMessage, types.Message]:
+    """
+    Send text to the message chat. In webhook mode the first reply is returned inside the webhook
+    HTTP response, without one more request to Telegram. Use it for the last message of the handler only:
+        return await reply_text(message, "Set requested month")
+
+    :param message: <class 'aiogram.types.message.Message'>
+    :param text: 'text'
+    :param kwargs: reply_markup, parse_mode, reply_to_message_id
+    :return: SendMessage - handler has to return it | sent message
+    """
+    reply = _webhook_reply.get()
+    if reply is not None and not reply["used"]:
+        reply["used"] = True
+        return SendMessage(message.chat.id, text, **kwargs)
+    return await message.bot.send_message(message.chat.id, text, **kwargs)
+
+
+def _ssl_context(ssl_certificate: Optional[str], ssl_private_key: Optional[str]) -> Optional[ssl.SSLContext]:
+    if not ssl_certificate:
+        # TLS is terminated by reverse proxy (nginx, caddy), plain HTTP is listened:
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(ssl_certificate, ssl_private_key)
+    return context
+
+
+def run_webhook(dp: Dispatcher,
+                on_startup: Callable[[Dispatcher], Awaitable],
+                on_shutdown: Callable[[Dispatcher], Awaitable],
+                url: str,
+                path: str = WEBHOOK_PATH,
+                host: str = WEBHOOK_HOST,
+                port: int = WEBHOOK_PORT,
+                secret_token: Optional[str] = None,
+                ssl_certificate: Optional[str] = None,
+                ssl_private_key: Optional[str] = None,
+                upload_certificate: bool = False,
+                set_webhook: bool = True,
+                check_ip: bool = False,
+                skip_updates: bool = False,
+                shutdown_timeout: float = SHUTDOWN_TIMEOUT):
+    """
+    Receive updates with aiohttp web server instead of long polling. Blocks until SIGINT/SIGTERM.
+
+    :param url: "https://example.com/webhook" | public URL which Telegram sends updates to
+    :param path: "/webhook" | route of the local server
+    :param host: "127.0.0.1" - behind reverse proxy | "0.0.0.0" - direct TLS
+    :param port: 8443 | Telegram supports 443, 80, 88 and 8443 for direct connections
+    :param secret_token: "random-string" | None - requests without this token are rejected with 401
+    :param ssl_certificate: "/etc/tbot/cert.pem" | None - TLS is terminated by reverse proxy
+    :param ssl_private_key: "/etc/tbot/private.key"
+    :param upload_certificate: True - self-signed certificate is sent to Telegram in setWebhook
+    :param set_webhook: False - webhook is registered manually (or with local fake client testing)
+    :param check_ip: True - accept requests from Telegram networks only (X-Forwarded-For behind proxy)
+    :param skip_updates: True - drop updates received while bot was stopped
+    :param shutdown_timeout: 30 | seconds for updates in processing before exit
+    """
+    executor = Executor(dp, skip_updates=skip_updates, check_ip=check_ip)
+
+    async def register_webhook(dispatcher: Dispatcher):
+        if not set_webhook:
+            return
+        certificate = types.InputFile(ssl_certificate) if upload_certificate and ssl_certificate else None
+        await dispatcher.bot.set_webhook(url,
+                                         certificate=certificate,
+                                         secret_token=secret_token,
+                                         drop_pending_updates=skip_updates)
+        logging.info(f"webhook is set to {url}")
+
+    async def wait_inflight_updates(_):
+        # aiohttp calls on_shutdown before it waits for open requests, shared resources are closed after them:
+        if _inflight["requests"]:
+            logging.info(f"waiting for {_inflight['requests']} update(s) in processing")
+        deadline = time.monotonic() + shutdown_timeout
+        while _inflight["requests"] and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if _inflight["requests"]:
+            logging.warning(f"{_inflight['requests']} update(s) were not finished in {shutdown_timeout}s")
+
+    executor.on_startup([register_webhook, on_startup])
+    executor.on_shutdown(on_shutdown)
+    executor.set_webhook(webhook_path=path, request_handler=SecretTokenRequestHandler)
+    executor.web_app["SECRET_TOKEN"] = secret_token
+    executor.web_app.on_shutdown.insert(0, wait_inflight_updates)
+    executor.run_app(host=host,
+                     port=port,
+                     ssl_context=_ssl_context(ssl_certificate, ssl_private_key),
+                     shutdown_timeout=shutdown_timeout)
+
+
+__all__ = ["SecretTokenRequestHandler",
+           "reply_text",
+           "run_webhook"]
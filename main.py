@@ -2,9 +2,11 @@
 
 import logging
 import asyncio
+import os
 from aiogram import Bot, Dispatcher, executor, types
-from aiogram.dispatcher import FSMContext
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher import FSMContext
 from sys import exit
 
 # Don't panic about '*', many imports is here but method __all__ on guard :)
@@ -15,10 +17,18 @@ from lib.exmo import *
 from lib.weather import *
 from lib.states import *
 from lib.info_about import *
-from lib.moon_calendar import main as moon_calendar_creator
-
-# Get configuration parameters from data.yaml:
-config_data = get_data_from_yaml("data.yaml")
+from lib.prefetch import *
+from lib.file_id_cache import *
+from lib.render_executor import RenderQueueFull
+from lib.webhook import reply_text
+from lib.middlewares import AccessMiddleware, MetricsMiddleware
+from lib.profiler import ProfilerBusy, start_profile, profile_input_file
+from lib.moon_calendar import read_month_calendar as moon_calendar_creator
+from lib.moon_calendar import read_year_calendars as moon_year_creator
+from lib.moon_calendar import PdfRendererUnavailable, UnsupportedYear, requested_year
+
+# Get configuration parameters from data.yaml (other file can be set with TBOT_CONFIG, load tests use it):
+config_data = get_data_from_yaml(os.environ.get("TBOT_CONFIG", "data.yaml"))
 # API telegram token:
 API_TOKEN = config_data["api_telegram_token"]
 # List of admin users. Create admins_id structure: [int, int]
@@ -27,15 +37,23 @@ ADMINS_IDS = [list(adm_id.values())[0] for adm_id in [adm_row for adm_row in con
 # Create loop
 loop = asyncio.get_event_loop()
 
-# Create storage for save message state
-storage = MemoryStorage()
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Initialize bot and dispatcher
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher(bot, loop=loop, storage=storage)
+# Local Bot API server or test stand-in can be set with "api_server":
+bot = Bot(token=API_TOKEN,
+          server=TelegramAPIServer.from_base(config_data["api_server"]) if config_data.get("api_server")
+          else TELEGRAM_PRODUCTION)
+# Memory storage until startup hook replaces it with SQLite storage, importing main.py opens no files:
+dp = Dispatcher(bot, loop=loop, storage=MemoryStorage())
+# Startup and shutdown hooks (lib/hendlers.py) read configuration from the dispatcher:
+dp["config_data"] = config_data
+dp["admins_ids"] = ADMINS_IDS
+# Non-admin updates are dropped before handlers matching, admins are throttled:
+dp.middleware.setup(AccessMiddleware(ADMINS_IDS, **config_data.get("access", {})))
+# Per-command latency for /info and metrics endpoint:
+dp.middleware.setup(MetricsMiddleware())
 
 # Display output information for privat and exmo services in images (images - True, text - False):
 image_output = True
@@ -46,12 +64,12 @@ start_string = "/start - initialization message\n\n" \
                "/exmo - crypto exchange rates\n\n" \
                "/weather - weather data\n\n" \
                "/moon_calendar - moon phases\n\n" \
+               "/moon_year - moon phases for the whole year\n\n" \
                "/geoposition - take GPS location\n\n" \
                "/bot - technical commands"
 
 
 @dp.message_handler(commands=["start"])
-@admin_check(ADMINS_IDS)
 async def send_welcome(message: types.Message, **kwargs):
     first_name = message._values["from"].first_name
     last_name = message._values["from"].last_name
@@ -68,89 +86,121 @@ async def send_welcome(message: types.Message, **kwargs):
 
 
 @dp.message_handler(commands=["privat"])
-@admin_check(ADMINS_IDS)
 async def send_privatbank(message: types.Message, **kwargs):
-    request_result = await get_jsons_privat(url_privatbank_list)
-    data_list = await parse_privat_jsons(request_result)
+    # Take data prefetched in background, request it right now only when it isn't received yet:
+    snapshot = get_snapshot("privat")
+    if snapshot:
+        data_list = snapshot.data
+    else:
+        request_result = await get_jsons_privat(url_privatbank_list)
+        data_list = await parse_privat_jsons(request_result)
+    stale_note = get_stale_note("privat")
 
     if image_output:
         result_message = await create_privat_currency_message(data_list, text_for_image=True)
-        image_path = await create_privat_image(result_message)
-        if image_path:
-            with open(image_path, "rb") as image:
-                await message.reply_photo(image.read())
+        try:
+            image = await create_privat_image(result_message)
+        except RenderQueueFull:
+            await message.answer("Bot is busy with other images, try again later")
+            return
+        if image:
+            await reply_photo_cached(message, image.getvalue(), caption=stale_note or None)
         else:
             await message.answer("Image not created. Something wrong...")
     else:
         result_message = await create_privat_currency_message(data_list, text_for_image=False)
+        if stale_note:
+            result_message += f"\n{stale_note}"
         await message.answer(result_message)
 
 
 @dp.message_handler(commands=["exmo"])
-@admin_check(ADMINS_IDS)
 async def send_exmo(message: types.Message, **kwargs):
-    request_result = await get_json_from_web(url_exmo)
-    request_result = await parse_exmo_jsons(request_result, cripto_pair)
+    # Take data prefetched in background, request it right now only when it isn't received yet:
+    snapshot = get_snapshot("exmo")
+    if snapshot:
+        request_result = snapshot.data
+    else:
+        request_result = await get_json_from_web(url_exmo)
+        request_result = await parse_exmo_jsons(request_result, cripto_pair)
+    stale_note = get_stale_note("exmo")
 
     if image_output:
         result_message = await create_cryptocurrency_message(request_result, text_for_image=True)
-        image_path = await create_cryptocurrency_image(result_message)
-        if image_path:
-            with open(image_path, "rb") as image:
-                await message.reply_photo(image.read())
+        try:
+            image = await create_cryptocurrency_image(result_message)
+        except RenderQueueFull:
+            await message.answer("Bot is busy with other images, try again later")
+            return
+        if image:
+            await reply_photo_cached(message, image.getvalue(), caption=stale_note or None)
         else:
             await message.answer("Image not created. Something wrong...")
     else:
         result_message = await create_cryptocurrency_message(request_result, text_for_image=False)
+        if stale_note:
+            result_message += f"\n{stale_note}"
         await message.answer(result_message)
 
 
 @dp.message_handler(commands=["weather"], state=None)
-@admin_check(ADMINS_IDS)
 async def query_weather(message: types.Message, **kwargs):
     await StatesWeather.question_of_date.set()
-    await bot.send_message(message.chat.id, "Set weather date:\n"
-                                            "/now\n\n"
-                                            "/today\n\n"
-                                            "/tomorrow\n\n"
-                                            "/plus_2_days\n\n"
-                                            "/plus_3_days\n\n"
-                                            "/plus_4_days")
+    return await reply_text(message, "Set weather date:\n"
+                                     "/now\n\n"
+                                     "/today\n\n"
+                                     "/tomorrow\n\n"
+                                     "/plus_2_days\n\n"
+                                     "/plus_3_days\n\n"
+                                     "/plus_4_days")
 
 
 @dp.message_handler(commands=["now", "today", "tomorrow", "plus_2_days", "plus_3_days", "plus_4_days"],
                     state=StatesWeather.question_of_date)
-@admin_check(ADMINS_IDS)
 async def query_weather(message: types.Message, state: FSMContext, **kwargs):
     await state.update_data({"weather_date": message.text})
     await StatesWeather.query.set()
-    await bot.send_message(message.chat.id, "Push the button and send GPS position", reply_markup=gps_keyboard)
+    return await reply_text(message, "Push the button and send GPS position", reply_markup=gps_keyboard)
 
 
 @dp.message_handler(commands=["moon_calendar"], state=None)
-@admin_check(ADMINS_IDS)
 async def query_moon_calendar(message: types.Message, **kwargs):
     await StatesMoonCalendar.question_of_date.set()
-    await bot.send_message(message.chat.id, "Set requested month:\n"
-                                            "/this_month\n\n"
-                                            "/next_month\n\n"
-                                            "custom date in format: YYYY-MM")
+    return await reply_text(message, "Set requested month:\n"
+                                     "/this_month\n\n"
+                                     "/next_month\n\n"
+                                     "custom date in format: YYYY-MM")
 
 
 @dp.message_handler(content_types=["any"], state=StatesMoonCalendar.question_of_date)
-@admin_check(ADMINS_IDS)
 async def query_moon_calendar(message: types.Message, state: FSMContext, **kwargs):
     if image_output:
         try:
-            image_path = await moon_calendar_creator(message.text)
-        except Exception as e:
-            await message.answer("Calendar not created. Something wrong... Possible fix:\n"
-                                 "sudo apt install poppler-utils")
+            moon_calendar_config = config_data.get("moon_calendar", {})
+            image = await moon_calendar_creator(message.text,
+                                                renderer=moon_calendar_config.get("renderer", "pil"),
+                                                engine=moon_calendar_config.get("engine", "conway"),
+                                                hemisphere=moon_calendar_config.get("hemisphere", "north"),
+                                                first_weekday=moon_calendar_config.get("first_weekday", 0))
+        except RenderQueueFull:
+            await message.answer("Bot is busy with other images, try again later")
+            await state.finish()
+            return
+        except UnsupportedYear as e:
+            await message.answer(str(e))
+            await state.finish()
+            return
+        except PdfRendererUnavailable as e:
+            await message.answer(f"Calendar not created. Possible fix:\n{e}")
+            await state.finish()
+            return
+        except Exception:
+            logging.exception("moon calendar is not created")
+            await message.answer("Calendar not created. Something wrong...")
             await state.finish()
             return
-        if image_path:
-            with open(image_path, "rb") as image:
-                await message.reply_photo(image.read())
+        if image:
+            await reply_photo_cached(message, image)
         else:
             await message.answer("Image not created. Something wrong...")
     else:
@@ -158,8 +208,53 @@ async def query_moon_calendar(message: types.Message, state: FSMContext, **kwarg
     await state.finish()
 
 
+@dp.message_handler(commands=["moon_year"], state=None)
+async def query_moon_year(message: types.Message, **kwargs):
+    await StatesMoonYear.question_of_year.set()
+    return await reply_text(message, "Set requested year:\n"
+                                     "/this_year\n\n"
+                                     "/next_year\n\n"
+                                     "custom year in format: YYYY")
+
+
+@dp.message_handler(content_types=["any"], state=StatesMoonYear.question_of_year)
+async def query_moon_year(message: types.Message, state: FSMContext, **kwargs):
+    await state.finish()
+    if not image_output:
+        await message.answer("Moon data is not provided for the answer in text format")
+        return
+    try:
+        requested_year(message.text)
+    except UnsupportedYear as e:
+        await message.answer(str(e))
+        return
+    moon_calendar_config = config_data.get("moon_calendar", {})
+    await message.answer("Calendars are rendering, please wait...")
+    try:
+        images, mosaic = await moon_year_creator(
+            message.text,
+            mosaic=config_data.get("moon_year", {}).get("mosaic", False),
+            workers=config_data.get("moon_year", {}).get("workers"),
+            renderer=moon_calendar_config.get("renderer", "pil"),
+            engine=moon_calendar_config.get("engine", "conway"),
+            hemisphere=moon_calendar_config.get("hemisphere", "north"),
+            first_weekday=moon_calendar_config.get("first_weekday", 0))
+    except RenderQueueFull:
+        await message.answer("Bot is busy with other images, try again later")
+        return
+    except PdfRendererUnavailable as e:
+        await message.answer(f"Calendars not created. Possible fix:\n{e}")
+        return
+    except Exception:
+        logging.exception("moon year calendars are not created")
+        await message.answer("Calendars not created. Something wrong...")
+        return
+    await reply_media_group_cached(message, images)
+    if mosaic:
+        await reply_photo_cached(message, mosaic)
+
+
 @dp.message_handler(content_types=["any"], state=StatesWeather.query)
-@admin_check(ADMINS_IDS)
 async def location(message: types.Message, state: FSMContext, **kwargs):
     if message.location is not None:
         weather_api = config_data["api_openweather"]
@@ -174,18 +269,16 @@ async def location(message: types.Message, state: FSMContext, **kwargs):
         await message.answer(weather_message)
     else:
         await state.finish()
-        await send_help(message)
+        return await send_help(message)
 
 
 @dp.message_handler(commands=["geoposition"], state=None)
-@admin_check(ADMINS_IDS)
 async def send_location(message: types.Message, state: FSMContext, **kwargs):
     await Geoposition.position.set()
     await bot.send_message(message.chat.id, "Push the button and send geoposition", reply_markup=gps_keyboard)
 
 
 @dp.message_handler(content_types=["any"], state=Geoposition.position)
-@admin_check(ADMINS_IDS)
 async def location(message: types.Message, state: FSMContext, **kwargs):
     if message.location is not None:
         gps_latitude = str(message.location.latitude)
@@ -194,40 +287,74 @@ async def location(message: types.Message, state: FSMContext, **kwargs):
         await state.finish()
     else:
         await state.finish()
-        await send_help(message)
+        return await send_help(message)
 
 
 @dp.message_handler(commands=["bot"], state=None)
-@admin_check(ADMINS_IDS)
 async def technical_actions(message: types.Message, **kwargs):
     await BotTechnical.query.set()
-    await bot.send_message(message.chat.id, "Set the action\n"
-                                            "/info - information about bot\n\n"
-                                            "/stop_functionality - stop functionality\n\n"
-                                            "/future - other future actions")
+    return await reply_text(message, "Set the action\n"
+                                     "/info - information about bot\n\n"
+                                     "/profile - sampling profile of the bot, "
+                                     "/profile 60 - for 60 seconds\n\n"
+                                     "/stop_functionality - stop functionality\n\n"
+                                     "/future - other future actions")
 
 
 @dp.message_handler(commands=["info"], state=BotTechnical.query)
-@admin_check(ADMINS_IDS)
 async def data_platform(message: types.Message, state: FSMContext, **kwargs):
     await state.finish()
-    info_message = await all_messages_text()
+    info_message = await all_messages_text(dp)
     await bot.send_message(message.chat.id, info_message, parse_mode="html")
 
 
+# Running "/profile" deliveries, a reference keeps the task alive until the document is sent:
+profile_deliveries = set()
+
+
+async def send_profile(message: types.Message, profiling: asyncio.Future):
+    """
+    Wait for the profiling session out of the update handler and send its result
+    """
+    try:
+        result = await profiling
+    except Exception as e:
+        await message.answer(f"Profile not created. Something wrong...\n\n{e!r}")
+        return
+    await message.answer_document(profile_input_file(result),
+                                  caption=f"{result.samples} samples of {result.threads} threads "
+                                          f"in {result.seconds:.0f}s, collapsed stacks for flamegraph.pl "
+                                          f"or speedscope.app")
+
+
+@dp.message_handler(commands=["profile"], state=BotTechnical.query)
+async def profile_action(message: types.Message, state: FSMContext, **kwargs):
+    await state.finish()
+    profiler_config = dict(config_data.get("profiler", {}))
+    if message.get_args().isdigit():
+        profiler_config["seconds"] = int(message.get_args())
+    try:
+        profiling = start_profile(**profiler_config)
+    except ProfilerBusy:
+        return await reply_text(message, "Profiler is already running, wait for its result")
+    # The handler returns now: command latency and webhook request don't include the profiling time:
+    delivery = asyncio.ensure_future(send_profile(message, profiling))
+    profile_deliveries.add(delivery)
+    delivery.add_done_callback(profile_deliveries.discard)
+    return await reply_text(message, "Profiling is started, bot works as usual. The result will be sent as a file")
+
+
 @dp.message_handler(commands=["stop_functionality"], state=BotTechnical.query)
-@admin_check(ADMINS_IDS)
 async def stop_bot_question(message: types.Message, state: FSMContext, **kwargs):
     await BotTechnical.confirm_query.set()
-    await bot.send_message(message.chat.id, "You really sure?\n"
-                                            "/stop_bot - stop bot process\n\n"
-                                            "/stop_camera - stop camera process\n\n"
-                                            "/stop_inet_check - stop inet access check process\n\n"
-                                            "/back - back to previous menu")
+    return await reply_text(message, "You really sure?\n"
+                                     "/stop_bot - stop bot process\n\n"
+                                     "/stop_camera - stop camera process\n\n"
+                                     "/stop_inet_check - stop inet access check process\n\n"
+                                     "/back - back to previous menu")
 
 
 @dp.message_handler(commands=["stop_bot"], state=BotTechnical.confirm_query)
-@admin_check(ADMINS_IDS)
 async def stop_bot_action(message: types.Message, state: FSMContext, **kwargs):
     await bot.send_message(message.chat.id, "⛔⛔⛔\n"
                                             "At this moment, python telegram bot stopping with sys.exit()\n"
@@ -236,7 +363,6 @@ async def stop_bot_action(message: types.Message, state: FSMContext, **kwargs):
 
 
 @dp.message_handler(commands=["stop_camera"], state=BotTechnical.confirm_query)
-@admin_check(ADMINS_IDS)
 async def stop_camera_action(message: types.Message, state: FSMContext, **kwargs):
     await state.finish()
     # attribute it is a keyword for find PID process in the system:
@@ -260,7 +386,6 @@ async def stop_camera_action(message: types.Message, state: FSMContext, **kwargs
 
 
 @dp.message_handler(commands=["stop_inet_check"], state=BotTechnical.confirm_query)
-@admin_check(ADMINS_IDS)
 async def stop_inet_check_action(message: types.Message, state: FSMContext, **kwargs):
     await state.finish()
     # attribute it is a keyword for find PID process in the system:
@@ -284,14 +409,12 @@ async def stop_inet_check_action(message: types.Message, state: FSMContext, **kw
 
 
 @dp.message_handler(commands=["back"], state=BotTechnical.confirm_query)
-@admin_check(ADMINS_IDS)
 async def back_to_technical_actions(message: types.Message, state: FSMContext, **kwargs):
     await state.finish()
-    await technical_actions(message)
+    return await technical_actions(message)
 
 
 @dp.message_handler(commands=["future"], state=BotTechnical.query)
-@admin_check(ADMINS_IDS)
 async def future_command(message: types.Message, state: FSMContext, **kwargs):
     await state.finish()
     await bot.send_message(message.chat.id, "About future functions, see:\n"
@@ -301,9 +424,13 @@ async def future_command(message: types.Message, state: FSMContext, **kwargs):
 
 @dp.message_handler()
 async def send_help(message: types.Message):
-    await message.reply(start_string)
+    return await reply_text(message, start_string, reply_to_message_id=message.message_id)
 
 
 if __name__ == "__main__":
-    from lib.hendlers import send_to_admin
-    executor.start_polling(dp, on_startup=send_to_admin)
+    from lib.hendlers import on_startup, on_shutdown
+    if config_data.get("mode", "polling") == "webhook":
+        from lib.webhook import run_webhook
+        run_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown, **config_data.get("webhook", {}))
+    else:
+        executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown)
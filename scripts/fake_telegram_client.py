@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Local fake Telegram client for webhook mode: posts updates to the bot the same way Telegram does.
+Set "mode: webhook" and "webhook.set_webhook: false" in data.yaml, start main.py and run:
+
+    python scripts/fake_telegram_client.py --chat-id 3 /start /bot /info
+    python scripts/fake_telegram_client.py --url https://127.0.0.1:8443/webhook --insecure /privat
+
+Every text is sent as a separate update, direct webhook replies are printed.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import ssl
+import time
+import aiohttp
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+_update_ids = itertools.count(int(time.time()))
+
+
+def make_update(chat_id: int, text: str) -> dict:
+    """
+    :return: {'update_id': 1700000000, 'message': {'message_id': 1, 'chat': {...}, 'text': '/start', ...}}
+    """
+    update_id = next(_update_ids)
+    user = {"id": chat_id, "is_bot": False, "first_name": "Fake", "username": "fake_client"}
+    message = {"message_id": update_id,
+               "from": user,
+               "chat": {"id": chat_id, "type": "private", "first_name": "Fake", "username": "fake_client"},
+               "date": int(time.time()),
+               "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def send_updates(url: str, secret_token: str, chat_id: int, texts: list, insecure: bool):
+    ssl_context = None
+    if insecure:
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    async with aiohttp.ClientSession(headers={SECRET_TOKEN_HEADER: secret_token}) as session:
+        for text in texts:
+            started = time.monotonic()
+            async with session.post(url, json=make_update(chat_id, text), ssl=ssl_context) as response:
+                body = await response.text()
+            elapsed = (time.monotonic() - started) * 1000
+            print(f"{text!r}: HTTP {response.status}, {elapsed:.0f} ms")
+            try:
+                print(json.dumps(json.loads(body), indent=2, ensure_ascii=False))
+            except ValueError:
+                print(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts", nargs="+", help="message texts, one update per text")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/webhook")
+    parser.add_argument("--secret-token", default="change-me")
+    parser.add_argument("--chat-id", type=int, default=3, help="admin id from data.yaml")
+    parser.add_argument("--insecure", action="store_true", help="don't verify self-signed TLS certificate")
+    args = parser.parse_args()
+    asyncio.run(send_updates(args.url, args.secret_token, args.chat_id, args.texts, args.insecure))
+
+
+if __name__ == "__main__":
+    main()
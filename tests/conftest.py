@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import pytest
+import yaml
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+TEST_CHAT_ID = 424242
+
+
+def _write_test_config() -> str:
+    """
+    Project config with a well-formed fake token, test admin and temporary files, main.py reads it on import
+    """
+    work_dir = tempfile.mkdtemp(prefix="tbot-tests-")
+    with open(os.path.join(PROJECT_DIR, "data.yaml")) as config_file:
+        config = yaml.safe_load(config_file)
+    config.update(api_telegram_token="123456:TEST-token",
+                  api_openweather="test",
+                  admins_ids=[{"test": TEST_CHAT_ID}])
+    config["fsm_storage"] = {**config.get("fsm_storage", {}), "path": os.path.join(work_dir, "fsm.sqlite3")}
+    config["file_id_cache"] = {**config.get("file_id_cache", {}), "path": os.path.join(work_dir, "file_ids.json")}
+    config["calendar_cache"] = {**config.get("calendar_cache", {}), "path": os.path.join(work_dir, "calendars")}
+    path = os.path.join(work_dir, "data.yaml")
+    with open(path, "w") as config_file:
+        yaml.safe_dump(config, config_file)
+    return path
+
+
+@pytest.fixture(scope="session")
+def bot_main():
+    """
+    main.py module with dispatcher and handlers, nothing is sent to Telegram on import.
+    Dispatcher keeps memory FSM storage, SQLite storage is created by the startup hook only
+    """
+    os.environ["TBOT_CONFIG"] = _write_test_config()
+    import main
+    return main
@@ -0,0 +1,43 @@
+import os
+import pytest
+from conftest import PROJECT_DIR
+from lib import assets, calendar_cache, moon_calendar
+
+
+@pytest.fixture
+def cached_calendar(tmp_path, monkeypatch):
+    monkeypatch.chdir(PROJECT_DIR)
+    assets.load_assets()
+    calendar_cache.configure_calendar_cache(str(tmp_path / "calendars"))
+    key = calendar_cache.calendar_key(2024, 6, "north", 0, "pil", 1, "conway")
+    rendered_path = calendar_cache.new_calendar_tmp_path(key)
+    with open(rendered_path, "wb") as f:
+        f.write(b"png")
+    moon_calendar._skeletons["test"] = object()
+    yield key, calendar_cache.store_calendar(key, rendered_path)
+    moon_calendar.clear_calendar_skeletons()
+
+
+def _touch(path: str):
+    # Loaded version looks older than the file:
+    assets._mtimes[path] -= 1
+
+
+@pytest.mark.parametrize("path", [f"{assets.TEMPLATES_DIR}/{assets.CALENDAR_TEMPLATE}",
+                                  assets.FONT_PATH,
+                                  f"{assets.MOON_DIR}/full_moon.png"])
+def test_calendar_asset_change_drops_calendars(cached_calendar, path):
+    key, calendar_path = cached_calendar
+    _touch(path)
+    assert assets.reload_changed_assets() == [path]
+    assert calendar_cache.get_cached_calendar(key) is None
+    assert not os.path.exists(calendar_path)
+    assert moon_calendar.get_skeleton_stats()["size"] == 0
+
+
+def test_other_asset_change_keeps_calendars(cached_calendar):
+    key, calendar_path = cached_calendar
+    _touch(f"{assets.TEMPLATES_DIR}/usd.png")
+    assets.reload_changed_assets()
+    assert calendar_cache.get_cached_calendar(key) == calendar_path
+    assert moon_calendar.get_skeleton_stats()["size"] == 1
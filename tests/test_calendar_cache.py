@@ -0,0 +1,41 @@
+import asyncio
+import os
+from lib import calendar_cache, moon_calendar
+
+
+def _store(key: str) -> str:
+    rendered_path = calendar_cache.new_calendar_tmp_path(key)
+    with open(rendered_path, "wb") as f:
+        f.write(key.encode())
+    return calendar_cache.store_calendar(key, rendered_path)
+
+
+def test_stored_calendar_is_never_evicted(tmp_path):
+    calendar_cache.configure_calendar_cache(str(tmp_path), max_size=0)
+    first_path = _store("first")
+    assert os.path.exists(first_path)
+    second_path = _store("second")
+    assert os.path.exists(second_path)
+    assert not os.path.exists(first_path)
+    assert calendar_cache.get_cached_calendar("second") == second_path
+
+
+def test_evicted_calendar_is_rendered_again(tmp_path, monkeypatch):
+    calendar_cache.configure_calendar_cache(str(tmp_path))
+    calls = []
+
+    async def main(requested_datetime, **kwargs):
+        calls.append(requested_datetime)
+        path = _store("2024_06")
+        if len(calls) == 1:
+            # Concurrent render took the place in the cache:
+            os.remove(path)
+        return path
+
+    monkeypatch.setattr(moon_calendar, "main", main)
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(moon_calendar.read_month_calendar("2024-6")) == b"2024_06"
+    finally:
+        loop.close()
+    assert calls == ["2024-6", "2024-6"]
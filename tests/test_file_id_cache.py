@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+from lib import file_id_cache
+
+
+def _uploaded(file_id: str):
+    return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+
+def test_uploads_are_saved_together(tmp_path):
+    path = str(tmp_path / "file_ids.json")
+    file_id_cache.load_file_id_cache(path, save_interval=0.1)
+
+    async def scenario():
+        file_id_cache._remember_file_ids(["a"], [_uploaded("id-a")])
+        file_id_cache._remember_file_ids(["b"], [_uploaded("id-b")])
+        # Handlers don't write the file:
+        assert not os.path.exists(path)
+        await asyncio.sleep(0.3)
+        with open(path) as f:
+            assert json.load(f) == {"a": "id-a", "b": "id-b"}
+
+        file_id_cache._remember_file_ids(["c"], [_uploaded("id-c")])
+        await file_id_cache.close_file_id_cache()
+        with open(path) as f:
+            assert json.load(f) == {"a": "id-a", "b": "id-b", "c": "id-c"}
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    file_id_cache._file_ids.clear()
+
+
+def test_close_waits_for_running_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "file_ids.json")
+    file_id_cache.load_file_id_cache(path, save_interval=0.01)
+    write = file_id_cache._write_file_id_cache
+    writes = []
+
+    def slow_write(path, content):
+        writes.append(json.loads(content))
+        time.sleep(0.2)
+        write(path, content)
+
+    monkeypatch.setattr(file_id_cache, "_write_file_id_cache", slow_write)
+
+    async def scenario():
+        file_id_cache._remember_file_ids(["a"], [_uploaded("id-a")])
+        # Delayed write is running in the executor:
+        await asyncio.sleep(0.05)
+        file_id_cache._remember_file_ids(["b"], [_uploaded("id-b")])
+        await file_id_cache.close_file_id_cache()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    file_id_cache._file_ids.clear()
+    assert writes == [{"a": "id-a"}, {"a": "id-a", "b": "id-b"}]
+    with open(path) as f:
+        assert json.load(f) == {"a": "id-a", "b": "id-b"}
+    assert os.listdir(tmp_path) == ["file_ids.json"]
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+from lib.fsm_storage import SQLiteStorage
+
+
+@pytest.fixture
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+async def _reopen(storage: SQLiteStorage, **kwargs) -> SQLiteStorage:
+    await storage.close()
+    await storage.wait_closed()
+    return SQLiteStorage(storage.path, **kwargs)
+
+
+def _rows(path: str) -> list:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT chat, user, state FROM fsm ORDER BY chat").fetchall()
+
+
+def test_conversation_is_restored_after_reopen(tmp_path, run):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        await storage.update_data(chat=1, user=1, data={"weather_date": "/today"})
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        await storage.set_bucket(chat=2, user=2, bucket={"calls": 3})
+        storage = await _reopen(storage)
+        assert await storage.get_state(chat=1, user=1) == "StatesWeather:query"
+        assert await storage.get_data(chat=1, user=1) == {"weather_date": "/today"}
+        assert await storage.get_bucket(chat=2, user=2) == {"calls": 3}
+        await storage.close()
+        await storage.wait_closed()
+
+    run(scenario())
+
+
+def test_changes_are_flushed_in_background(tmp_path, run):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), flush_interval=0.05)
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        assert _rows(storage.path) == []
+        await asyncio.sleep(0.2)
+        assert _rows(storage.path) == [("1", "1", "StatesWeather:query")]
+        await storage.close()
+        await storage.wait_closed()
+
+    run(scenario())
+
+
+def test_reset_record_is_deleted(tmp_path, run):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        await storage.set_state(chat=2, user=2, state="StatesWeather:query")
+        await storage.flush()
+        await storage.reset_state(chat=1, user=1)
+        storage = await _reopen(storage)
+        assert _rows(storage.path) == [("2", "2", "StatesWeather:query")]
+        assert storage.get_stats()["records"] == 1
+        await storage.close()
+        await storage.wait_closed()
+
+    run(scenario())
+
+
+def test_abandoned_conversation_expires(tmp_path, run, monkeypatch):
+    now = time.time()
+
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=60)
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        await storage.set_state(chat=2, user=2, state="StatesWeather:query")
+        await storage.flush()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        # Expired in the memory on access and on the disk by the next flush:
+        assert await storage.get_state(chat=1, user=1) is None
+        await storage.flush()
+        assert storage.get_stats()["expired"] == 2
+        assert _rows(storage.path) == []
+        await storage.close()
+        await storage.wait_closed()
+
+    run(scenario())
+
+
+def test_expired_conversation_is_not_restored(tmp_path, run, monkeypatch):
+    now = time.time()
+
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=60)
+        await storage.set_state(chat=1, user=1, state="StatesWeather:query")
+        await storage.close()
+        await storage.wait_closed()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        storage = SQLiteStorage(storage.path, ttl=60)
+        assert storage.get_stats()["records"] == 0
+        assert _rows(storage.path) == []
+        await storage.close()
+        await storage.wait_closed()
+
+    run(scenario())
@@ -0,0 +1,17 @@
+from lib import exmo, privat
+from lib.help_functions import configure_http_cache, get_cache_ttl
+
+
+def test_ttl_comes_from_config_only():
+    configure_http_cache()
+    assert get_cache_ttl(exmo.url_exmo) == 0
+    assert get_cache_ttl(privat.url_privatbank_private) == 0
+
+    configure_http_cache(ttl={"https://api.exmo.com/v1.1/ticker": 30, "https://api.privatbank.ua/": 300})
+    assert get_cache_ttl(exmo.url_exmo) == 30
+    assert get_cache_ttl(privat.url_privatbank_private) == 300
+
+    # TTL removed from the config turns the cache off:
+    configure_http_cache(ttl={"https://api.privatbank.ua/": 300})
+    assert get_cache_ttl(exmo.url_exmo) == 0
+    configure_http_cache()
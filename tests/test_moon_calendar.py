@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import pytest
+from lib import moon_calendar
+from lib.moon_calendar import PdfRendererUnavailable, UnsupportedYear, requested_month, requested_year
+
+
+def test_requested_year():
+    this_year = datetime.date.today().year
+    assert requested_year("2024") == 2024
+    assert requested_year("/next_year") == this_year + 1
+    assert requested_year("not a year") == this_year
+    assert requested_year("1700") == 1700
+    assert requested_year("3099") == 3099
+
+
+@pytest.mark.parametrize("text", ["1500", "1699", "3100", "9999"])
+def test_requested_year_out_of_range(text):
+    with pytest.raises(UnsupportedYear, match="1700-3099"):
+        requested_year(text)
+
+
+def test_requested_month():
+    this_month = datetime.date.today().replace(day=1)
+    assert requested_month("2024-6") == datetime.date(2024, 6, 1)
+    assert requested_month("2024-13") == this_month
+    assert requested_month("/this_month") == this_month
+
+
+@pytest.mark.parametrize("text", ["1500-1", "3100-12"])
+def test_requested_month_out_of_range(text):
+    with pytest.raises(UnsupportedYear):
+        requested_month(text)
+
+
+@pytest.mark.skipif(moon_calendar.convert_from_path is None, reason="pdf2image is not installed")
+def test_missing_poppler_is_reported(monkeypatch):
+    from pdf2image.exceptions import PDFInfoNotInstalledError
+
+    def convert_from_path(pdf_file):
+        raise PDFInfoNotInstalledError("Unable to get page count. Is poppler installed and in PATH?")
+
+    monkeypatch.setattr(moon_calendar, "convert_from_path", convert_from_path)
+    with pytest.raises(PdfRendererUnavailable, match="poppler-utils"):
+        moon_calendar.pdf_to_png_converter("calendar.pdf")
+
+
+@pytest.mark.skipif(moon_calendar.convert_from_path is None, reason="pdf2image is not installed")
+def test_other_pdf_errors_are_not_reported_as_missing_poppler(monkeypatch):
+    from pdf2image.exceptions import PDFSyntaxError
+
+    def convert_from_path(pdf_file):
+        raise PDFSyntaxError("broken PDF")
+
+    monkeypatch.setattr(moon_calendar, "convert_from_path", convert_from_path)
+    with pytest.raises(PDFSyntaxError):
+        moon_calendar.pdf_to_png_converter("calendar.pdf")
+
+
+def test_year_is_rendered_in_batch_pool(tmp_path, monkeypatch):
+    from conftest import PROJECT_DIR
+    from lib.calendar_cache import configure_calendar_cache
+    monkeypatch.chdir(PROJECT_DIR)
+    configure_calendar_cache(str(tmp_path))
+    renders = moon_calendar.get_calendar_render_stats()["renders"]
+    loop = asyncio.new_event_loop()
+    try:
+        months, mosaic = loop.run_until_complete(moon_calendar.read_year_calendars("2024", mosaic=True, workers=2))
+    finally:
+        loop.close()
+    assert len(months) == 12 and all(month.startswith(b"\x89PNG") for month in months)
+    assert mosaic.startswith(b"\x89PNG")
+    assert moon_calendar.get_calendar_render_stats()["renders"] - renders == 12
+
+
+def test_skeleton_cache_holds_all_layouts():
+    layouts = {moon_calendar.month_layout(datetime.date(year, month, 1))
+               for year in range(2000, 2030) for month in range(1, 13)}
+    assert len(layouts) == moon_calendar.SKELETON_CACHE_SIZE
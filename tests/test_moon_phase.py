@@ -0,0 +1,67 @@
+import datetime
+import json
+import os
+import pytest
+from lib import moon_phase
+from lib.moon_calendar import moonphase
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "benchmarks", "fixtures", "moon_phases_2024.json")
+# Whole span of Conway's century correction table:
+FIRST_DAY = datetime.date(moon_phase.FIRST_CENTURY * 100, 1, 1)
+END_DAY = datetime.date(moon_phase.LAST_CENTURY * 100 + 100, 1, 1)
+# Meeus engine is within a minute of the published times, 5 minutes leaves room for ΔT:
+MEEUS_TOLERANCE_MINUTES = 5
+
+
+@pytest.fixture(scope="module")
+def per_day_phases():
+    return [moonphase(FIRST_DAY + datetime.timedelta(days=offset)) for offset in range((END_DAY - FIRST_DAY).days)]
+
+
+def test_conway_python_equals_moonphase(per_day_phases):
+    assert moon_phase._conway_python(FIRST_DAY, END_DAY) == per_day_phases
+
+
+@pytest.mark.skipif(moon_phase.numpy is None, reason="numpy is not installed")
+def test_conway_numpy_equals_moonphase(per_day_phases):
+    assert moon_phase._conway_numpy(FIRST_DAY, END_DAY).tolist() == per_day_phases
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_conway_phases_month_and_year(per_day_phases, monkeypatch, use_numpy):
+    if use_numpy and moon_phase.numpy is None:
+        pytest.skip("numpy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(moon_phase, "numpy", None)
+    for start, end in ((datetime.date(2024, 6, 15), datetime.date(2024, 7, 1)),
+                       (datetime.date(1799, 12, 1), datetime.date(1800, 3, 1)),
+                       (datetime.date(3099, 1, 1), END_DAY)):
+        offset = (start - FIRST_DAY).days
+        assert moon_phase.conway_phases(start, end) == per_day_phases[offset:offset + (end - start).days]
+
+
+@pytest.mark.parametrize("start, end", [(datetime.date(1699, 12, 31), datetime.date(1700, 1, 2)),
+                                        (datetime.date(3099, 12, 31), datetime.date(3100, 1, 2))])
+def test_conway_phases_out_of_range(start, end):
+    with pytest.raises(ValueError):
+        moon_phase.conway_phases(start, end)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_meeus_new_full_moons_match_reference(monkeypatch, use_numpy):
+    if use_numpy and moon_phase.numpy is None:
+        pytest.skip("numpy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(moon_phase, "numpy", None)
+    with open(FIXTURE_PATH) as f:
+        reference = [(datetime.datetime.strptime(moment, "%Y-%m-%d %H:%M"), kind) for moment, kind in json.load(f)]
+    instants = moon_phase.new_full_moons(datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))
+    assert [kind for _, kind in instants] == [kind for _, kind in reference]
+    for (instant, _), (moment, kind) in zip(instants, reference):
+        assert abs((instant - moment).total_seconds()) / 60 <= MEEUS_TOLERANCE_MINUTES, (moment, kind)
+
+    phases = moon_phase.meeus_phases(datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))
+    for moment, kind in reference:
+        expected = moon_phase.NEW_MOON_AGE if kind == "new" else moon_phase.FULL_MOON_AGE
+        assert phases[moment.timetuple().tm_yday - 1] == expected, (moment, kind)
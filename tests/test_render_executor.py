@@ -0,0 +1,45 @@
+import asyncio
+import os
+import time
+from lib.render_executor import batch_render_pool, run_render, run_render_in, start_render_executor, \
+    stop_render_executor
+
+
+def test_stop_waits_for_renders_without_blocking_loop():
+    async def scenario():
+        start_render_executor(workers=1)
+        render = asyncio.ensure_future(run_render(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beating = asyncio.ensure_future(heartbeat())
+        await stop_render_executor()
+        beating.cancel()
+        await render
+        return ticks
+
+    # Own loop, the current one is used by main.py:
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(scenario()) > 5
+    finally:
+        loop.close()
+
+
+def test_batch_pool_renders_in_other_processes():
+    async def scenario():
+        async with batch_render_pool(2) as pool:
+            return await asyncio.gather(*[run_render_in(pool, os.getpid) for _ in range(4)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        pids = loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+    assert os.getpid() not in pids
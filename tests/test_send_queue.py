@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from aiogram.utils.exceptions import RetryAfter
+from lib import send_queue
+
+
+def run(scenario):
+    # Own loop, the current one is used by main.py:
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+def start(**kwargs):
+    params = dict(global_rate=1000, chat_rate=1000, chat_burst=1000, workers=4)
+    params.update(kwargs)
+    send_queue.start_send_queue(None, **params)
+
+
+def test_messages_keep_order_within_chat():
+    sent = []
+
+    def sender(chat_id, number):
+        async def call():
+            # Later messages finish faster, order must come from the queue:
+            await asyncio.sleep(0.01 * (5 - number))
+            sent.append((chat_id, number))
+            return number
+        return call
+
+    async def scenario():
+        start()
+        try:
+            futures = [send_queue.enqueue(chat_id, sender(chat_id, number))
+                       for number in range(5) for chat_id in (1, 2, 3)]
+            return await asyncio.gather(*futures)
+        finally:
+            await send_queue.stop_send_queue()
+
+    assert run(scenario) == [number for number in range(5) for _ in (1, 2, 3)]
+    for chat_id in (1, 2, 3):
+        assert [number for chat, number in sent if chat == chat_id] == list(range(5))
+
+
+def test_retry_after_is_retried_then_sent():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return "sent"
+
+    async def scenario():
+        start()
+        try:
+            return await send_queue.enqueue(1, call)
+        finally:
+            await send_queue.stop_send_queue()
+
+    retried = send_queue.get_send_queue_stats()["retried"]
+    assert run(scenario) == "sent"
+    assert len(attempts) == 2
+    assert send_queue.get_send_queue_stats()["retried"] == retried + 1
+
+
+def test_retry_after_fails_after_max_retries():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise RetryAfter(0)
+
+    async def scenario():
+        start()
+        try:
+            with pytest.raises(RetryAfter):
+                await send_queue.enqueue(1, call)
+        finally:
+            await send_queue.stop_send_queue()
+
+    failed = send_queue.get_send_queue_stats()["failed"]
+    run(scenario)
+    assert len(attempts) == send_queue.MAX_RETRIES + 1
+    assert send_queue.get_send_queue_stats()["failed"] == failed + 1
+
+
+def test_full_queue_rejects_and_stop_cancels_waiting():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+
+        start(queue_size=2)
+        futures = [send_queue.enqueue(1, call), send_queue.enqueue(2, call)]
+        with pytest.raises(send_queue.SendQueueFull):
+            send_queue.enqueue(3, call)
+        await asyncio.sleep(0.01)
+        await send_queue.stop_send_queue(drain_timeout=0)
+        return futures
+
+    futures = run(scenario)
+    assert all(future.cancelled() for future in futures)
+    assert send_queue.get_send_queue_stats()["queued"] == 0
+
+
+def test_idle_chat_buckets_are_dropped(monkeypatch):
+    monkeypatch.setattr(send_queue, "BUCKET_PRUNE_INTERVAL", 0)
+
+    async def call():
+        return None
+
+    async def scenario():
+        start(chat_rate=100, chat_burst=1)
+        try:
+            await send_queue.enqueue(1, call)
+            assert 1 in send_queue._chat_buckets
+            # Bucket of chat 1 is full again after 1/100 s:
+            await asyncio.sleep(0.05)
+            await send_queue.enqueue(2, call)
+            return set(send_queue._chat_buckets)
+        finally:
+            await send_queue.stop_send_queue()
+
+    assert run(scenario) == {2}
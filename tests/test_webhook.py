@@ -0,0 +1,72 @@
+import asyncio
+import json
+import time
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY
+from lib.states import BotTechnical, Geoposition, StatesWeather
+from lib.webhook import SECRET_TOKEN_HEADER, SecretTokenRequestHandler
+from conftest import TEST_CHAT_ID
+
+SECRET_TOKEN = "test-secret"
+
+
+def make_update(update_id: int, text: str) -> dict:
+    user = {"id": TEST_CHAT_ID, "is_bot": False, "first_name": "Test"}
+    return {"update_id": update_id,
+            "message": {"message_id": update_id,
+                        "from": user,
+                        "chat": {"id": TEST_CHAT_ID, "type": "private"},
+                        "date": int(time.time()),
+                        "text": text}}
+
+
+async def post_update(dp, update: dict, secret_token: str = SECRET_TOKEN):
+    app = web.Application()
+    app[BOT_DISPATCHER_KEY] = dp
+    app["SECRET_TOKEN"] = SECRET_TOKEN
+    app.router.add_route("*", "/webhook", SecretTokenRequestHandler)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/webhook", json=update, headers={SECRET_TOKEN_HEADER: secret_token})
+        return response.status, await response.text()
+
+
+def test_wrong_secret_token_is_rejected(bot_main):
+    status, _ = bot_main.loop.run_until_complete(post_update(bot_main.dp, make_update(1, "/start"), "wrong"))
+    assert status == 401
+
+
+def test_help_from_helper_is_returned_in_webhook_response(bot_main):
+    """
+    Handlers which answer through send_help() have to return its SendMessage, otherwise the reply is lost
+    """
+    dp = bot_main.dp
+    for update_id, state in enumerate((Geoposition.position, StatesWeather.query), 2):
+        bot_main.loop.run_until_complete(dp.storage.set_state(chat=TEST_CHAT_ID, user=TEST_CHAT_ID, state=state))
+        status, body = bot_main.loop.run_until_complete(post_update(dp, make_update(update_id, "not a location")))
+        assert status == 200
+        reply = json.loads(body)
+        assert reply["method"] == "sendMessage"
+        assert reply["chat_id"] == TEST_CHAT_ID
+        assert reply["text"] == bot_main.start_string
+        assert bot_main.loop.run_until_complete(dp.storage.get_state(chat=TEST_CHAT_ID, user=TEST_CHAT_ID)) is None
+
+
+def test_profile_command_returns_before_profiling_ends(bot_main):
+    """
+    /profile answers at once, the profiling session doesn't hold the update and its webhook request
+    """
+    dp = bot_main.dp
+    loop = bot_main.loop
+    loop.run_until_complete(dp.storage.set_state(chat=TEST_CHAT_ID, user=TEST_CHAT_ID, state=BotTechnical.query))
+    started = time.monotonic()
+    status, body = loop.run_until_complete(post_update(dp, make_update(10, "/profile 30")))
+    assert time.monotonic() - started < 5
+    assert status == 200
+    assert json.loads(body)["text"].startswith("Profiling is started")
+    deliveries = list(bot_main.profile_deliveries)
+    assert len(deliveries) == 1
+    # Nothing is sent to Telegram, sampling thread is stopped:
+    for delivery in deliveries:
+        delivery.cancel()
+    loop.run_until_complete(asyncio.gather(*deliveries, return_exceptions=True))